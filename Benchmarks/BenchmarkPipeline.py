@@ -0,0 +1,200 @@
+# Benchmarks of the data-to-map pipeline on synthetic data, run with: python -m Benchmarks.BenchmarkPipeline
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import contextlib
+import numpy as np
+import pandas as pd
+import folium
+from core.infrastructure.methods import preprop_lstat, preprop_resid, count_plz_occurrences, merge_geo_dataframes
+from core.infrastructure.PipelineCache import get_pipeline_cache, set_pipeline_cache
+from core.domain.demand_methods.DemandMethods import DemandMethod
+from core.application.presentation.MapStreamlitMethods import create_residents_layer, create_charging_stations_layer, \
+    create_demand_layer
+from core.application.presentation.MapArtifactCache import render_map_html
+from core.infrastructure.SyntheticData import synthetic_plz_polygons, synthetic_residents, synthetic_register
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Number of PLZ polygons and register rows per scale, Germany has about 8200 PLZ
+SCALES = {
+    'berlin': {'polygons': 190, 'stations': 3000},
+    'germany': {'polygons': 8200, 'stations': 100000},
+    'germany_x10': {'polygons': 8200, 'stations': 1000000},
+    'europe': {'polygons': 40000, 'stations': 2000000}
+}
+
+# A latency or memory measurement above baseline * (1 + tolerance) is a regression
+DEFAULT_TOLERANCE = 0.5
+
+PARAMDICT = {'geocode': 'PLZ', 'region': 'Deutschland'}
+
+
+# -----------------------------------------------------------------------------
+def _layer(create_layer, df, **kwargs):
+    '''Builds one layer and serializes the map, as the app does'''
+    folium_map = folium.Map(location=[51.1, 10.4], zoom_start=6)
+    color_map, folium_map = create_layer(df, folium_map, **kwargs)
+    color_map.add_to(folium_map)
+    return render_map_html(folium_map)
+
+
+def pipeline_stages(df_register, df_residents, gdf_geo):
+    '''
+    Lists the benchmarked stages in pipeline order
+    Inputs: the synthetic register, residents and polygons
+    Outputs: A list of (name, rows, function) tuples, each function runs the stage on the outputs of the earlier stages
+    Postconditions: None
+    '''
+    state = {}
+
+    def run(name, func):
+        def stage():
+            state[name] = func()
+            return state[name]
+        return stage
+
+    return [
+        ('preprop_lstat', len(df_register), run('lstat', lambda: preprop_lstat(df_register, gdf_geo, PARAMDICT))),
+        ('count_plz_occurrences', len(df_register), run('counts', lambda: count_plz_occurrences(state['lstat']))),
+        ('preprop_resid', len(df_residents), run('resid', lambda: preprop_resid(df_residents, gdf_geo, PARAMDICT))),
+        ('merge_geo_dataframes', len(gdf_geo), run('merged', lambda: merge_geo_dataframes(state['counts'].copy(), state['resid']))),
+        ('robert_demands', len(gdf_geo), run('demand', lambda: DemandMethod().robert_demands(state['merged']['Einwohner'], state['merged']['Number']))),
+        ('residents_layer', len(gdf_geo), run('residents_layer', lambda: _layer(create_residents_layer, state['resid']))),
+        ('charging_stations_layer', len(gdf_geo), run('stations_layer', lambda: _layer(create_charging_stations_layer, state['merged']))),
+        ('demand_layer', len(gdf_geo), run('demand_layer', lambda: _layer(create_demand_layer, state['merged'].copy(), write_formula=False)))
+    ]
+
+
+def measure(func, repeat):
+    '''
+    Measures a stage
+    Inputs:
+        - func: the stage, called without arguments
+        - repeat: number of timed runs
+    Outputs: The latencies in seconds and the peak traced memory in bytes of one additional run
+    Postconditions: The timer output of the stages is suppressed, memory is traced separately so it does not slow the timed runs
+    '''
+    latencies = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return latencies, peak
+
+
+def run_benchmark(scale, repeat=5, seed=0):
+    '''
+    Runs every stage on synthetic data of a scale
+    Inputs:
+        - scale: a key of SCALES or a dictionary with the keys polygons and stations
+        - repeat: number of timed runs per stage
+        - seed: seed of the data generators
+    Outputs: A dictionary per stage with rows, p50_ms, p95_ms, max_ms, rows_per_sec and peak_mb
+    Postconditions: The pipeline cache is disabled while the stages run, otherwise only the first run of a stage would
+        be measured. The previously active cache is restored afterwards
+    '''
+    sizes = SCALES[scale] if isinstance(scale, str) else scale
+    gdf_geo = synthetic_plz_polygons(sizes['polygons'], seed=seed)
+    df_residents = synthetic_residents(gdf_geo, seed)
+    df_register = synthetic_register(gdf_geo, df_residents, sizes['stations'], seed)
+
+    previous_cache = get_pipeline_cache()
+    set_pipeline_cache(None)
+    results = {}
+    try:
+        for name, rows, stage in pipeline_stages(df_register, df_residents, gdf_geo):
+            latencies, peak = measure(stage, repeat)
+            p50 = float(np.percentile(latencies, 50))
+            results[name] = {
+                'rows': rows,
+                'p50_ms': p50 * 1000,
+                'p95_ms': float(np.percentile(latencies, 95)) * 1000,
+                'max_ms': max(latencies) * 1000,
+                'rows_per_sec': rows / p50 if p50 > 0 else float('inf'),
+                'peak_mb': peak / 1024 ** 2
+            }
+    finally:
+        set_pipeline_cache(previous_cache)
+    return results
+
+
+# -----------------------------------------------------------------------------
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    '''
+    Compares benchmark results to a stored baseline
+    Inputs:
+        - results: results of run_benchmark
+        - baseline: results of an earlier run of the same scale
+        - tolerance: relative slowdown (or memory growth) that is still accepted
+    Outputs: A list of regression messages, empty if there are none
+    Postconditions: Stages missing in the baseline are not compared
+    '''
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        for metric in ('p50_ms', 'peak_mb'):
+            limit = baseline[stage][metric] * (1 + tolerance)
+            if result[metric] > limit:
+                regressions.append(f"{stage}: {metric} {result[metric]:.2f} > {limit:.2f} "
+                                   f"(baseline {baseline[stage][metric]:.2f})")
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(baseline, path=BASELINE_FILE):
+    with open(path, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the data-to-map pipeline on synthetic data")
+    parser.add_argument('--scale', nargs='+', default=['berlin'], choices=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    regressions = []
+    for scale in args.scale:
+        results = run_benchmark(scale, args.repeat)
+        print(f"\nScale {scale}: {SCALES[scale]}")
+        print(pd.DataFrame(results).T.round(2).to_string())
+
+        if args.save_baseline:
+            baseline[scale] = results
+        elif scale in baseline:
+            regressions += [f"{scale} {message}" for message in compare_to_baseline(results, baseline[scale], args.tolerance)]
+
+    if args.save_baseline:
+        save_baseline(baseline, args.baseline)
+        print(f"\nBaseline written to {args.baseline}")
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
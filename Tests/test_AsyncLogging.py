@@ -0,0 +1,75 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+from core.infrastructure.AsyncLogging import summarize, configure_call_logging, setup_async_logging, \
+    stop_async_logging, DEFAULT_MAX_CHARS
+from core.infrastructure.HelperTools import logger_decorator
+
+
+@logger_decorator
+def identity(x):
+    return x
+
+
+class TestAsyncLogging(unittest.TestCase):
+    """Test the compact summaries and the background logging thread"""
+
+    def tearDown(self):
+        configure_call_logging()
+
+    def test_small_objects_keep_their_repr(self):
+        self.assertEqual(summarize((10, 5)), "(10, 5)")
+        self.assertEqual(summarize((10,)), "(10,)")
+        self.assertEqual(summarize({'region': 'Berlin'}), "{'region': 'Berlin'}")
+        self.assertEqual(summarize(5.0), "5.0")
+
+    def test_frames_are_summarized(self):
+        gdf = gpd.GeoDataFrame({'PLZ': np.arange(1000)}, geometry=[Point(0, 0)] * 1000)
+        text = summarize(gdf)
+
+        self.assertTrue(text.startswith("<GeoDataFrame 1000x2 [PLZ: int64, geometry: geometry]"))
+        self.assertNotIn('POINT', text)
+        self.assertTrue(summarize(gdf['PLZ']).startswith("<Series PLZ 1000 int64"))
+        self.assertEqual(summarize(np.zeros((2, 3))), "<ndarray (2, 3) float64 48 B>")
+
+    def test_size_limit(self):
+        self.assertLessEqual(len(summarize('x' * 10000)), DEFAULT_MAX_CHARS + 30)
+        self.assertLessEqual(len(summarize(list(range(10000)))), DEFAULT_MAX_CHARS + 30)
+
+    @patch('logging.info')
+    def test_sampling(self, mock_info):
+        configure_call_logging(sample_rate=0.0)
+        identity(1)
+        mock_info.assert_not_called()
+
+        configure_call_logging(sample_rate=1.0)
+        identity(pd.DataFrame({'a': [1]}))
+        self.assertTrue(mock_info.call_args.args[0].startswith("identity returned <DataFrame 1x1 [a: int64] "))
+
+    def test_background_thread_writes_the_file(self):
+        directory = tempfile.mkdtemp()
+        root = logging.getLogger()
+        level, handlers = root.level, list(root.handlers)
+        try:
+            filename = os.path.join(directory, 'app.log')
+            setup_async_logging(filename)
+            logging.info("queued message")
+            stop_async_logging()
+
+            with open(filename) as file:
+                self.assertIn("INFO - queued message", file.read())
+            self.assertEqual(root.handlers, handlers)
+        finally:
+            root.setLevel(level)
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
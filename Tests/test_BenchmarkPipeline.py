@@ -0,0 +1,39 @@
+import unittest
+from Benchmarks.BenchmarkPipeline import run_benchmark, compare_to_baseline
+from core.infrastructure.PipelineCache import PipelineCache, get_pipeline_cache, set_pipeline_cache
+
+
+class TestBenchmarkPipeline(unittest.TestCase):
+    """Test the benchmark harness on a tiny scale"""
+
+    def test_run_benchmark(self):
+        results = run_benchmark({'polygons': 4, 'stations': 50}, repeat=2)
+
+        self.assertEqual(list(results), ['preprop_lstat', 'count_plz_occurrences', 'preprop_resid', 'merge_geo_dataframes',
+                                         'robert_demands', 'residents_layer', 'charging_stations_layer', 'demand_layer'])
+        self.assertEqual(results['preprop_lstat']['rows'], 50)
+        self.assertLessEqual(results['preprop_lstat']['p50_ms'], results['preprop_lstat']['max_ms'])
+        self.assertGreater(results['residents_layer']['peak_mb'], 0)
+
+    def test_pipeline_cache_is_restored(self):
+        previous_cache = get_pipeline_cache()
+        cache = PipelineCache(None)
+        set_pipeline_cache(cache)
+        try:
+            run_benchmark({'polygons': 4, 'stations': 50}, repeat=1)
+            self.assertIs(get_pipeline_cache(), cache)
+        finally:
+            set_pipeline_cache(previous_cache)
+
+    def test_compare_to_baseline(self):
+        baseline = {'preprop_lstat': {'p50_ms': 10.0, 'peak_mb': 1.0}}
+
+        self.assertEqual(compare_to_baseline({'preprop_lstat': {'p50_ms': 14.0, 'peak_mb': 1.0}}, baseline), [])
+        regressions = compare_to_baseline({'preprop_lstat': {'p50_ms': 16.0, 'peak_mb': 1.0},
+                                           'new_stage': {'p50_ms': 1.0, 'peak_mb': 1.0}}, baseline)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('preprop_lstat: p50_ms'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+from core.infrastructure.Coverage import nearest_station_distances, grid_points, plz_coverage, EARTH_RADIUS_KM
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great circle distance in km, computed pairwise for the brute force comparison"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class TestCoverage(unittest.TestCase):
+    """Test the distances to the nearest charging stations"""
+
+    def test_distances_match_brute_force(self):
+        rng = np.random.default_rng(0)
+        lat, lon = rng.uniform(52.3, 52.7, 500), rng.uniform(13.1, 13.7, 500)
+        station_lat, station_lon = rng.uniform(52.3, 52.7, 200), rng.uniform(13.1, 13.7, 200)
+
+        distances = nearest_station_distances(lat, lon, station_lat, station_lon, k=3, batch_size=64)
+        expected = np.sort(haversine(lat[:, None], lon[:, None], station_lat[None, :], station_lon[None, :]), axis=1)[:, :3]
+        np.testing.assert_allclose(distances, expected, rtol=1e-9)
+
+    def test_missing_stations(self):
+        distances = nearest_station_distances([52.5], [13.4], [52.5, np.nan], [13.5, 13.4], k=2)
+        self.assertAlmostEqual(distances[0, 0], haversine(52.5, 13.4, 52.5, 13.5))
+        self.assertEqual(distances[0, 1], np.inf)
+
+    def test_grid_points(self):
+        lat, lon = grid_points((13.0, 52.0, 14.0, 53.0), 10)
+
+        # About 111 km north to south and 68 km west to east at 52.5 degrees
+        self.assertEqual(len(np.unique(lat)), 11)
+        self.assertEqual(len(np.unique(lon)), 7)
+        self.assertAlmostEqual(haversine(lat[0], lon[0], lat[1], lon[1]), 10, delta=0.1)
+
+    def test_plz_coverage(self):
+        df_population = gpd.GeoDataFrame({
+            'PLZ': [10115, 10117],
+            'Breitengrad': ['52.5', '52.5'],
+            'Längengrad': ['13.35', '13.45'],
+            'geometry': [box(13.3, 52.45, 13.4, 52.55), box(13.4, 52.45, 13.5, 52.55)]
+        }, geometry='geometry')
+        df_stations = pd.DataFrame({'Breitengrad': ['52,5', '52,5'], 'Längengrad': ['13,35', '13,25']})
+
+        centre = plz_coverage(df_population, df_stations, k=1)
+        self.assertEqual(list(centre['Nearest']), [0.0, round(haversine(52.5, 13.45, 52.5, 13.35), 2)])
+
+        # Averaged over a grid the first PLZ is no longer at distance 0, the order of the PLZ stays
+        grid = plz_coverage(df_population, df_stations, k=2, grid_km=0.5)
+        self.assertGreater(grid['Nearest'].iloc[0], 0)
+        self.assertLess(grid['Nearest'].iloc[0], grid['Nearest'].iloc[1])
+        self.assertTrue((grid['Distance'] >= grid['Nearest']).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+from core.infrastructure.Crosswalk import build_crosswalk, district_rollup
+from core.domain.demand_methods.DemandMethods import scenario_demands
+
+
+class TestCrosswalk(unittest.TestCase):
+    """Test the PLZ to district crosswalk"""
+
+    def setUp(self):
+        # 10115 and 10117 lie in Mitte and Pankow, 10119 is split in half by the border
+        self.df_plz_geo = gpd.GeoDataFrame({
+            'PLZ': [10115, 10117, 10119],
+            'geometry': [box(13.30, 52.50, 13.40, 52.55), box(13.50, 52.50, 13.60, 52.55), box(13.40, 52.50, 13.50, 52.55)]
+        }, geometry='geometry', crs='EPSG:4326')
+        self.df_districts = gpd.GeoDataFrame({
+            'Bezirk': ['Mitte', 'Pankow'],
+            'geometry': [box(13.30, 52.50, 13.45, 52.55), box(13.45, 52.50, 13.60, 52.55)]
+        }, geometry='geometry', crs='EPSG:4326')
+        self.df_merged = pd.DataFrame({
+            'PLZ': [10119, 10115, 10117, 99999],
+            'Einwohner': [20000, 10000, 30000, 5000],
+            'Number': [4, 2, 6, 1],
+            'KW': [88.0, 44.0, 132.0, 22.0]
+        })
+
+    def test_area_weights(self):
+        crosswalk = build_crosswalk(self.df_plz_geo, self.df_districts)
+        weights = crosswalk.weights.toarray()
+
+        # The straight box edges bend slightly in the equal area projection
+        np.testing.assert_allclose(weights.sum(axis=0), 1, atol=1e-3)
+        np.testing.assert_allclose(weights[:, 0], [1, 0], atol=1e-3)
+        np.testing.assert_allclose(weights[:, 2], [0.5, 0.5], atol=1e-3)
+
+    def test_rollup(self):
+        crosswalk = build_crosswalk(self.df_plz_geo, self.df_districts)
+        rolled = crosswalk.rollup(self.df_merged, ['Einwohner', 'Number'])
+
+        # The PLZ unknown to the crosswalk is ignored
+        np.testing.assert_allclose(rolled.loc['Mitte'], [20000, 4], rtol=1e-3)
+        np.testing.assert_allclose(rolled.loc['Pankow'], [40000, 8], rtol=1e-3)
+
+        # The station formula is linear, so the demand rolls up like its inputs
+        demand = scenario_demands(self.df_merged['Einwohner'], self.df_merged['Number'])
+        rolled_demand = crosswalk.rollup(self.df_merged.assign(Demand=demand), ['Demand'])['Demand']
+        np.testing.assert_allclose(rolled_demand, scenario_demands(rolled['Einwohner'], rolled['Number']), atol=1)
+
+    def test_district_rollup(self):
+        crosswalk = build_crosswalk(self.df_plz_geo, self.df_districts)
+        result = district_rollup(crosswalk, self.df_merged, self.df_districts)
+
+        self.assertEqual(list(result['Bezirk']), ['Mitte', 'Pankow'])
+        np.testing.assert_allclose(result['Einwohner'], [20000, 40000], rtol=1e-3)
+        self.assertAlmostEqual(result['KW'].sum(), 264.0, delta=0.3)
+        self.assertTrue((result['qkm'] > 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
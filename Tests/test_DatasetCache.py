@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+import geopandas as gpd
+from core.infrastructure.DatasetCache import load_dataset_cache, read_manifest, CACHE_VERSION
+
+PARAMDICT = {
+    "file_lstations": "Ladesaeulenregister.csv",
+    "file_residents": "plz_einwohner.csv",
+    "file_geodat_plz": "geodata_berlin_plz.csv"
+}
+
+LSTAT_CSV = (
+    "Betreiber;Postleitzahl;Bundesland;Breitengrad;Längengrad;Nennleistung Ladeeinrichtung [kW]\n"
+    "A;10115;Berlin;52,5321;13,3849;22\n"
+    "B;10117;Berlin;52,5170;13,3889;11,5\n"
+    "C;80331;Bayern;48,1371;11,5754;50\n"
+)
+RESIDENTS_CSV = (
+    "plz,note,einwohner,qkm,lat,lon\n"
+    "10115,10115 Berlin,5000,2.4,52.5321,13.3849\n"
+    "10117,10117 Berlin,12000,1.1,52.5170,13.3889\n"
+)
+GEODAT_CSV = (
+    "PLZ;geometry\n"
+    "10115;POLYGON ((13.3 52.5, 13.4 52.5, 13.4 52.6, 13.3 52.6, 13.3 52.5))\n"
+    "10117;POLYGON ((13.4 52.5, 13.5 52.5, 13.5 52.6, 13.4 52.6, 13.4 52.5))\n"
+)
+
+
+DISTRICTS_CSV = (
+    "Bezirk;geometry\n"
+    "Mitte;POLYGON ((13.3 52.5, 13.5 52.5, 13.5 52.6, 13.3 52.6, 13.3 52.5))\n"
+)
+
+
+class TestDatasetCache(unittest.TestCase):
+    """Test building, loading and invalidating the columnar dataset cache"""
+
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.source_dir, "cache")
+        for name, content in [(PARAMDICT["file_lstations"], LSTAT_CSV),
+                              (PARAMDICT["file_residents"], RESIDENTS_CSV),
+                              (PARAMDICT["file_geodat_plz"], GEODAT_CSV)]:
+            with open(os.path.join(self.source_dir, name), "w") as file:
+                file.write(content)
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+
+    def test_districts_are_loaded_if_enabled(self):
+        self.assertNotIn('geodat_dis', load_dataset_cache(self.source_dir, self.cache_dir, PARAMDICT))
+
+        with open(os.path.join(self.source_dir, "geodata_berlin_dis.csv"), "w") as file:
+            file.write(DISTRICTS_CSV)
+        paramdict = dict(PARAMDICT, districts=True, file_geodat_dis="geodata_berlin_dis.csv")
+        datasets = load_dataset_cache(self.source_dir, self.cache_dir, paramdict)
+        self.assertEqual(list(datasets['geodat_dis']['Bezirk']), ['Mitte'])
+        self.assertIsInstance(datasets['geodat_dis'], gpd.GeoDataFrame)
+
+    def test_missing_plz_polygons_fail_early(self):
+        paramdict = dict(PARAMDICT, region='Bayern', file_geodat_plz="geodata_plz.csv")
+        with self.assertRaisesRegex(FileNotFoundError, "region 'Bayern'.*geodata_plz.csv"):
+            load_dataset_cache(self.source_dir, self.cache_dir, paramdict)
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+    def test_load_builds_typed_cache(self):
+        datasets = load_dataset_cache(self.source_dir, self.cache_dir, PARAMDICT)
+
+        # Geometry is parsed and the decimal commas are converted
+        self.assertIsInstance(datasets['geodat_plz'], gpd.GeoDataFrame)
+        self.assertEqual(datasets['geodat_plz'].geometry.iloc[0].geom_type, "Polygon")
+        self.assertAlmostEqual(datasets['lstat']['Breitengrad'].iloc[0], 52.5321)
+        self.assertAlmostEqual(datasets['lstat']['Nennleistung Ladeeinrichtung [kW]'].iloc[1], 11.5)
+        self.assertNotIn('Betreiber', datasets['lstat'].columns)
+        self.assertEqual(list(datasets['residents']['plz']), [10115, 10117])
+
+        manifest = read_manifest(self.cache_dir)
+        self.assertEqual(manifest['version'], CACHE_VERSION)
+        self.assertEqual(datasets['residents'].attrs['source_hash'], manifest['sources']['residents']['sha256'])
+
+    def test_register_is_reduced_to_the_region(self):
+        # Berlin is the default region, its stations are cached alone
+        datasets = load_dataset_cache(self.source_dir, self.cache_dir, PARAMDICT)
+        self.assertEqual(list(datasets['lstat']['Bundesland']), ['Berlin', 'Berlin'])
+        berlin_hash = datasets['lstat'].attrs['source_hash']
+
+        # Another region rebuilds the cache, Germany keeps every station
+        datasets = load_dataset_cache(self.source_dir, self.cache_dir, dict(PARAMDICT, region='Deutschland'))
+        self.assertEqual(len(datasets['lstat']), 3)
+        self.assertIsNone(read_manifest(self.cache_dir)['region'])
+        self.assertNotEqual(datasets['lstat'].attrs['source_hash'], berlin_hash)
+
+    def test_cache_is_rebuilt_when_source_changes(self):
+        load_dataset_cache(self.source_dir, self.cache_dir, PARAMDICT)
+        old_hash = read_manifest(self.cache_dir)['sources']['residents']['sha256']
+
+        with open(os.path.join(self.source_dir, PARAMDICT["file_residents"]), "a") as file:
+            file.write("10119,10119 Berlin,8000,1.6,52.5300,13.4050\n")
+
+        datasets = load_dataset_cache(self.source_dir, self.cache_dir, PARAMDICT)
+        self.assertEqual(len(datasets['residents']), 3)
+        self.assertNotEqual(read_manifest(self.cache_dir)['sources']['residents']['sha256'], old_hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
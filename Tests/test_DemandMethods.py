@@ -1,7 +1,8 @@
 import unittest
 # from demand_file import calculate_demand
+import numpy as np
 import pandas as pd
-from core.domain.demand_methods.DemandMethods import DemandMethod
+from core.domain.demand_methods.DemandMethods import DemandMethod, scenario_demands
 
 dm = DemandMethod()
 
@@ -65,6 +66,57 @@ class TestDemandFunction(unittest.TestCase):
         self.assertRaises(ValueError, dm.robert_demands, pd.DataFrame([[10]]), pd.DataFrame([[-10]]))
 
 
+    def test_demand_missing_input(self):
+
+        # Make sure missing residents or stations lead to an exception instead of a wrapped around integer
+
+        self.assertRaises(ValueError, dm.robert_demands, pd.Series([np.nan, 31379.0]), pd.Series([0, 16]))
+        self.assertRaises(ValueError, dm.robert_demands, pd.Series([10049, 31379]), pd.Series([23], index=[1]))
+        self.assertRaises(ValueError, scenario_demands, np.array([np.inf]), np.array([0]))
+
+
+    def test_demand_aligns_on_index(self):
+
+        # Make sure the stations are matched to the residents by postal code, not by position
+
+        residents = pd.Series([10049, 31379], index=[14109, 13125])
+        stations = pd.Series([16, 23], index=[13125, 14109])
+        demand = dm.robert_demands(residents, stations)
+
+        self.assertEqual(demand[14109], -13)
+        self.assertEqual(demand[13125], 15)
+
+
+    def test_demand_parameters(self):
+
+        # 31379 inhabitants with 0.02 electric vehicles per resident and 5 per charging station need 126 stations
+
+        residents = pd.Series([10049, 31379], index=[14109, 13125])
+        stations = pd.Series([23, 16], index=[14109, 13125])
+        demand = DemandMethod(0.02, 5).robert_demands(residents, stations)
+
+        self.assertEqual(list(demand), [17, 110])
+        self.assertEqual(list(demand.index), [14109, 13125])
+        self.assertRaises(ValueError, DemandMethod, 0.01, 0)
+
+
+    def test_scenario_demands(self):
+
+        # Every scenario equals the demand computed with its own parameters
+
+        residents = np.array([10049, 31379, 0])
+        stations = np.array([23, 16, 10])
+        ev_per_resident, ev_per_charging_station = np.meshgrid([0.01, 0.02, 0.05], [5, 10])
+        demands = scenario_demands(residents, stations, ev_per_resident, ev_per_charging_station)
+
+        self.assertEqual(demands.shape, (2, 3, 3))
+        for i, j in np.ndindex(2, 3):
+            expected = DemandMethod(ev_per_resident[i, j], ev_per_charging_station[i, j]).robert_demands(
+                pd.Series(residents), pd.Series(stations))
+            np.testing.assert_array_equal(demands[i, j], expected.to_numpy())
+        self.assertEqual(scenario_demands(residents, stations).shape, (3,))
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import box
+from core.domain.demand_methods.DemandMethods import DemandMethod
+from core.domain.demand_methods.DemandModels import DEMAND_MODELS, DEFAULT_DEMAND_MODEL, compute_demand
+from core.infrastructure.PipelineCache import configure_pipeline_cache, get_pipeline_cache
+
+
+class TestDemandModels(unittest.TestCase):
+    """Test the registered demand models"""
+
+    def setUp(self):
+        # Two neighbouring PLZ in Berlin and one in Munich, all with the same population density
+        self.df_merged = gpd.GeoDataFrame({
+            'PLZ': [10115, 10117, 80331],
+            'Einwohner': [20000, 30000, 40000],
+            'qkm': [2.0, 3.0, 4.0],
+            'Number': [5.0, 0.0, 10.0],
+            'KW': [110.0, 0.0, 500.0],
+            'geometry': [box(13.37, 52.52, 13.39, 52.54), box(13.39, 52.52, 13.41, 52.54), box(11.56, 48.13, 11.58, 48.15)]
+        }, geometry='geometry')
+        self.robert = DemandMethod().robert_demands(self.df_merged['Einwohner'], self.df_merged['Number']).to_numpy()
+
+    def test_station_model_is_the_robert_formula(self):
+        np.testing.assert_array_equal(compute_demand(DEFAULT_DEMAND_MODEL, self.df_merged).to_numpy(), self.robert)
+
+    def test_capacity_model(self):
+        # 110 kW are 5 standard charging points, 500 kW are about 23
+        demand = compute_demand("Charging capacity (kW)", self.df_merged)
+        np.testing.assert_array_equal(demand.to_numpy(), [15, 30, 17])
+
+    def test_density_model(self):
+        # Equal densities keep the original demand
+        np.testing.assert_array_equal(compute_demand("Population density", self.df_merged).to_numpy(), self.robert)
+
+        denser = self.df_merged.assign(qkm=[0.5, 3.0, 4.0])
+        self.assertGreater(compute_demand("Population density", denser).iloc[0], self.robert[0])
+
+    def test_distance_decay_model(self):
+        demand = compute_demand("Distance decay", self.df_merged).to_numpy()
+
+        # The stations of 10115 cover part of the demand of its neighbour, Munich is too far away
+        self.assertEqual(demand[0], self.robert[0])
+        self.assertLess(demand[1], self.robert[1])
+        self.assertEqual(demand[2], self.robert[2])
+
+    def test_unknown_model(self):
+        self.assertRaises(ValueError, compute_demand, "Unknown", self.df_merged)
+
+    def test_results_are_cached_per_model(self):
+        directory = tempfile.mkdtemp()
+        try:
+            configure_pipeline_cache(directory, {'pipeline_cache': True})
+            for model in DEMAND_MODELS:
+                compute_demand(model, self.df_merged, DemandMethod(0.02, 5))
+            misses = get_pipeline_cache().stats['misses']
+            for model in DEMAND_MODELS:
+                compute_demand(model, self.df_merged, DemandMethod(0.02, 5))
+            self.assertEqual(get_pipeline_cache().stats['misses'], misses)
+            self.assertEqual(get_pipeline_cache().stats['memory_hits'], len(DEMAND_MODELS))
+        finally:
+            configure_pipeline_cache(None, {'pipeline_cache': False})
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import shapely
+import geopandas as gpd
+from shapely.geometry import Polygon
+from core.infrastructure.GeometryPyramid import build_simplification_pyramid, geometry_for_zoom, finest_level, \
+    apply_geometry_level, benchmark_pyramid
+
+
+def wiggly_border(n):
+    '''Points of a zigzag line from (0, 0) to (0, 1) shared by the two test polygons'''
+    return [(0.0000001 * (i % 2), i / n) for i in range(n + 1)]
+
+
+class TestGeometryPyramid(unittest.TestCase):
+    """Test the simplification pyramid keeps shared borders consistent"""
+
+    def setUp(self):
+        border = wiggly_border(200)
+        left = Polygon([(-1, 1), (-1, 0)] + border)
+        right = Polygon(border[::-1] + [(1, 0), (1, 1)])
+        self.gdf = gpd.GeoDataFrame({'PLZ': [10115, 10117], 'geometry': [left, right]}, geometry='geometry')
+
+    def test_levels_are_decimated_and_gap_free(self):
+        pyramid = build_simplification_pyramid(self.gdf, zoom_levels=(8, 12))
+        full_vertices = shapely.get_num_coordinates(self.gdf.geometry.to_numpy()).sum()
+
+        for zoom in (8, 12):
+            level = pyramid[zoom]
+            self.assertLess(shapely.get_num_coordinates(level.geometry.to_numpy()).sum(), full_vertices)
+
+            # Both polygons still share their border exactly: no gaps and no overlaps
+            self.assertTrue(shapely.coverage_is_valid(level.geometry.to_numpy()))
+            self.assertAlmostEqual(level.geometry.iloc[0].intersection(level.geometry.iloc[1]).area, 0.0)
+            self.assertAlmostEqual(level.geometry.union_all().area, self.gdf.geometry.union_all().area, places=4)
+
+    def test_geometry_for_zoom(self):
+        pyramid = build_simplification_pyramid(self.gdf, zoom_levels=(8, 12))
+
+        self.assertIs(geometry_for_zoom(pyramid, 5), pyramid[8])
+        self.assertIs(geometry_for_zoom(pyramid, 10), pyramid[12])
+        self.assertIs(geometry_for_zoom(pyramid, 16), pyramid[None])
+
+    def test_finest_level(self):
+        pyramid = build_simplification_pyramid(self.gdf, zoom_levels=(8, 12))
+        self.assertIs(finest_level(pyramid), pyramid[12])
+        self.assertIs(finest_level(build_simplification_pyramid(self.gdf, zoom_levels=())), self.gdf)
+
+    def test_apply_geometry_level(self):
+        pyramid = build_simplification_pyramid(self.gdf, zoom_levels=(8,))
+        df = gpd.GeoDataFrame({'PLZ': [10117], 'Einwohner': [1000], 'geometry': [self.gdf.geometry.iloc[1]]})
+
+        result = apply_geometry_level(df, pyramid[8])
+        self.assertTrue(result.geometry.iloc[0].equals(pyramid[8].geometry.iloc[1]))
+        self.assertEqual(result['Einwohner'].iloc[0], 1000)
+
+    def test_benchmark_reports_every_level(self):
+        pyramid = build_simplification_pyramid(self.gdf, zoom_levels=(8,))
+        report = benchmark_pyramid(pyramid, repeat=1)
+
+        self.assertEqual(list(report['zoom']), [8, 'full'])
+        self.assertLess(report['bytes'].iloc[0], report['bytes'].iloc[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely.geometry import box
+from core.infrastructure.HexGrid import hex_axial, hex_polygons, hex_level, build_hex_hierarchy
+
+
+class TestHexGrid(unittest.TestCase):
+    """Test the hexagon aggregation"""
+
+    def setUp(self):
+        self.df_population = gpd.GeoDataFrame({
+            'PLZ': [10115, 10117],
+            'Einwohner': [10000, 30000],
+            'geometry': [box(13.30, 52.45, 13.40, 52.55), box(13.40, 52.45, 13.50, 52.55)]
+        }, geometry='geometry', crs='EPSG:4326')
+        self.df_stations = pd.DataFrame({
+            'Breitengrad': ['52,50', '52,50', '52,51', '60,00'],
+            'Längengrad': ['13,35', '13,35', '13,45', '13,45'],
+            'Nennleistung Ladeeinrichtung [kW]': [22.0, 11.0, 50.0, 22.0]
+        })
+
+    def test_points_lie_in_their_hexagon(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(-50000, 50000, 2000), rng.uniform(-50000, 50000, 2000)
+        q, r = hex_axial(x, y, 1000)
+        polygons = hex_polygons(q, r, 1000)
+        self.assertTrue(shapely.covers(shapely.buffer(polygons, 1e-6), shapely.points(x, y)).all())
+
+    def test_residents_and_stations_are_conserved(self):
+        level = hex_level(self.df_population, self.df_stations, 2)
+
+        self.assertAlmostEqual(level['Einwohner'].sum(), 40000, delta=len(level))
+        self.assertEqual(level['Number'].sum(), 3)
+        self.assertEqual(level['KW'].sum(), 83)
+        self.assertAlmostEqual(level['qkm'].sum(), self.df_population.to_crs('EPSG:3035').area.sum() / 1e6)
+        self.assertEqual(set(level['PLZ']), {10115, 10117})
+
+        # Hexagons inside the second PLZ have three times the residents of those inside the first
+        polygons = self.df_population.set_index('PLZ').geometry
+        inside = shapely.within(level.geometry.values, polygons.reindex(level['PLZ']).values)
+        density = level[inside].groupby('PLZ')['Einwohner'].mean()
+        self.assertAlmostEqual(density[10117] / density[10115], 3, delta=0.05)
+
+    def test_population_without_crs(self):
+        # The residents of the app carry no crs, their coordinates are EPSG:4326
+        naive = gpd.GeoDataFrame(self.df_population.drop(columns='geometry'), geometry=self.df_population.geometry.to_numpy())
+        self.assertIsNone(naive.crs)
+
+        level = hex_level(naive, self.df_stations, 2)
+        expected = hex_level(self.df_population, self.df_stations, 2)
+        pd.testing.assert_frame_equal(level.drop(columns='geometry'), expected.drop(columns='geometry'))
+
+    def test_hierarchy(self):
+        hierarchy = build_hex_hierarchy(self.df_population, self.df_stations, (4, 2, 1))
+        self.assertEqual(list(hierarchy), [4, 2, 1])
+        self.assertLess(len(hierarchy[4]), len(hierarchy[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
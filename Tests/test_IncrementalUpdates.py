@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from core.infrastructure.IncrementalUpdates import register_snapshot, diff_snapshots, build_plz_state, \
+    update_register_state, station_counts
+
+
+def make_register(rows):
+    return pd.DataFrame(rows, columns=['Postleitzahl', 'Bundesland', 'Breitengrad', 'Längengrad',
+                                       'Nennleistung Ladeeinrichtung [kW]'])
+
+
+class TestIncrementalUpdates(unittest.TestCase):
+    """Test the incremental update of the per PLZ state"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.old_register = make_register([
+            (10117, 'Berlin', 52.517, 13.388, 22.0),
+            (10117, 'Berlin', 52.517, 13.388, 22.0),
+            (10178, 'Berlin', 52.523, 13.410, 50.0),
+            (10245, 'Berlin', 52.500, 13.450, 11.0)
+        ])
+        # One duplicate in 10117 removed, 10178 changed its power, 10315 added, 10245 untouched
+        self.new_register = make_register([
+            (10117, 'Berlin', 52.517, 13.388, 22.0),
+            (10178, 'Berlin', 52.523, 13.410, 150.0),
+            (10245, 'Berlin', 52.500, 13.450, 11.0),
+            (10315, 'Berlin', 52.510, 13.520, 75.0)
+        ])
+        self.df_residents = pd.DataFrame({'PLZ': [10117, 10178, 10245, 10315], 'Einwohner': [5000, 20000, 3000, 1000]})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_diff_snapshots(self):
+        delta = diff_snapshots(register_snapshot(self.old_register), register_snapshot(self.new_register))
+
+        self.assertEqual(list(delta.index), [10117, 10178, 10315])
+        self.assertEqual(list(delta['Number']), [-1, 0, 1])
+        self.assertEqual(list(delta['KW']), [-22.0, 100.0, 75.0])
+
+    def test_incremental_update_equals_full_recomputation(self):
+        first = update_register_state(self.old_register, self.df_residents, self.directory)
+        self.assertTrue(first['full'])
+
+        second = update_register_state(self.new_register, self.df_residents, self.directory)
+        self.assertFalse(second['full'])
+        self.assertEqual(list(second['affected']), [10117, 10178, 10315])
+
+        expected = build_plz_state(register_snapshot(self.new_register), self.df_residents)
+        pd.testing.assert_frame_equal(second['state'], expected, check_freq=False)
+
+        # An unchanged register affects nothing
+        third = update_register_state(self.new_register, self.df_residents, self.directory)
+        self.assertEqual(len(third['affected']), 0)
+
+    def test_changed_residents_are_affected(self):
+        update_register_state(self.old_register, self.df_residents, self.directory)
+
+        df_residents = self.df_residents.assign(Einwohner=[5000, 20000, 9000, 1000])
+        result = update_register_state(self.old_register, df_residents, self.directory)
+        self.assertEqual(list(result['affected']), [10245])
+        self.assertEqual(result['state'].loc[10245, 'Einwohner'], 9000)
+
+    def test_station_counts(self):
+        update_register_state(self.old_register, self.df_residents, self.directory)
+        result = update_register_state(self.new_register, self.df_residents, self.directory)
+
+        counts = station_counts(result['state'])
+        self.assertEqual(list(counts['PLZ']), [10117, 10178, 10245, 10315])
+        self.assertEqual(list(counts['Number']), [1, 1, 1, 1])
+        self.assertEqual(list(counts['KW']), [22.0, 150.0, 11.0, 75.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
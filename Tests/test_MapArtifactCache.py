@@ -0,0 +1,57 @@
+import unittest
+import folium
+import pandas as pd
+from core.application.presentation.MapArtifactCache import MapArtifactCache, map_artifact_key, render_map_html
+
+
+class TestMapArtifactCache(unittest.TestCase):
+    """Test the cache of rendered map layers"""
+
+    def setUp(self):
+        self.df = pd.DataFrame({'PLZ': [10115, 10117], 'Number': [1, 2]})
+        self.renders = []
+
+    def render(self, html):
+        def render():
+            self.renders.append(html)
+            return html
+        return render
+
+    def test_layers_are_rendered_once(self):
+        cache = MapArtifactCache()
+        key = map_artifact_key('Residents', self.df, zoom=10)
+
+        self.assertEqual(cache.get_or_render(key, self.render('a')), 'a')
+        self.assertEqual(cache.get_or_render(key, self.render('b')), 'a')
+        self.assertEqual(self.renders, ['a'])
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_keys_depend_on_layer_data_and_parameters(self):
+        key = map_artifact_key('Demand', self.df, zoom=10)
+        self.assertEqual(key, map_artifact_key('Demand', self.df.copy(), zoom=10))
+        self.assertNotEqual(key, map_artifact_key('Charging Stations', self.df, zoom=10))
+        self.assertNotEqual(key, map_artifact_key('Demand', self.df, zoom=12))
+        self.assertNotEqual(key, map_artifact_key('Demand', self.df.assign(Number=[1, 3]), zoom=10))
+
+    def test_eviction(self):
+        cache = MapArtifactCache(max_entries=2)
+        for html in ['a', 'b', 'c']:
+            cache.get_or_render(html, self.render(html))
+
+        # 'a' was evicted, 'c' is still cached
+        cache.get_or_render('c', self.render('c'))
+        cache.get_or_render('a', self.render('a'))
+        self.assertEqual(self.renders, ['a', 'b', 'c', 'a'])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_render_map_html(self):
+        html = render_map_html(folium.Map(location=[52.52, 13.40], zoom_start=10))
+        self.assertIn('<html>', html)
+        self.assertIn('L.map', html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ import folium
 from shapely.geometry import Polygon
 from branca.colormap import LinearColormap
 from core.application.presentation.MapStreamlitMethods import create_residents_layer,\
-    create_charging_stations_layer
+    create_charging_stations_layer, create_suggestions_layer, colormap_hex_colors
 
 
 class TestMapStreamLitMethods(unittest.TestCase):
@@ -65,3 +65,32 @@ class TestMapStreamLitMethods(unittest.TestCase):
         self.assertEqual(color_map.vmin, self.df_merged['Number'].min())
         self.assertEqual(color_map.vmax, self.df_merged['Number'].max())
 
+
+    def test_create_suggestions_layer(self):
+        # Call the function
+        color_map, result_map = create_suggestions_layer(self.df_population.assign(Suggestions=[0, 4]),
+                                                         self.folium_map)
+
+        # Assert that the result is a folium Map object
+        self.assertIsInstance(result_map, folium.Map)
+
+        # The color map starts at no suggestions and ends at the largest count, at least 1
+        self.assertEqual((color_map.vmin, color_map.vmax), (0, 4))
+        color_map, _ = create_suggestions_layer(self.df_population.assign(Suggestions=[0, 0]), self.folium_map)
+        self.assertEqual(color_map.vmax, 1)
+
+
+    def test_colormap_hex_colors_matches_colormap(self):
+        color_map = LinearColormap(colors=['blue', 'green', 'yellow', 'red'], vmin=0, vmax=300)
+        values = [-5, 0, 17.5, 150, 299, 300, 1000]
+
+        # The vectorized colors are identical to evaluating the colormap value by value
+        self.assertEqual(list(colormap_hex_colors(color_map, values)), [color_map(v) for v in values])
+
+    def test_residents_layer_is_single_geojson(self):
+        _, result_map = create_residents_layer(self.df_population, self.folium_map)
+
+        # All PLZ polygons end up in one GeoJson layer
+        geojson_layers = [child for child in result_map._children.values() if isinstance(child, folium.GeoJson)]
+        self.assertEqual(len(geojson_layers), 1)
+        self.assertEqual(len(geojson_layers[0].data['features']), len(self.df_population))
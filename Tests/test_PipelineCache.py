@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+import core.infrastructure.PipelineCache as pc
+from core.infrastructure.PipelineCache import PipelineCache, fingerprint, stamp, unstamp, pipeline_stage, configure_pipeline_cache
+
+
+calls = []
+
+
+@pipeline_stage('double')
+def double(df, factor=2):
+    calls.append(len(df))
+    return df * factor
+
+
+class TestPipelineCache(unittest.TestCase):
+    """Test the content addressed cache of the pipeline stages"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.df = pd.DataFrame({'PLZ': [10115, 10117], 'Number': [1, 2]})
+        calls.clear()
+
+    def tearDown(self):
+        configure_pipeline_cache(None, {'pipeline_cache': False})
+        shutil.rmtree(self.directory)
+
+    def test_fingerprint_follows_content(self):
+        self.assertEqual(fingerprint(self.df), fingerprint(self.df.copy()))
+        self.assertNotEqual(fingerprint(self.df), fingerprint(self.df.assign(Number=[1, 3])))
+        self.assertNotEqual(fingerprint({'region': 'Berlin'}), fingerprint({'region': 'Bayern'}))
+
+        gdf = gpd.GeoDataFrame({'PLZ': [1]}, geometry=[Point(0, 0)])
+        self.assertNotEqual(fingerprint(gdf), fingerprint(gpd.GeoDataFrame({'PLZ': [1]}, geometry=[Point(0, 1)])))
+
+    def test_stamp_is_bound_to_the_frame(self):
+        stamp(self.df, 'source')
+        self.assertEqual(fingerprint(self.df), 'source')
+
+        # Copies and slices don't inherit the stamp, replaced or added columns invalidate it
+        self.assertNotEqual(fingerprint(self.df.copy()), 'source')
+        self.assertNotEqual(fingerprint(self.df[['PLZ']]), 'source')
+        self.df['PLZ'] = self.df['PLZ'].astype(str)
+        self.assertNotEqual(fingerprint(self.df), 'source')
+        stamp(self.df, 'source')
+        self.df['KW'] = 0.0
+        self.assertNotEqual(fingerprint(self.df), 'source')
+
+    def test_unstamp_after_modifying_values(self):
+        stamp(self.df, 'source')
+        self.df.loc[0, 'Number'] = 5
+        self.assertEqual(fingerprint(unstamp(self.df)), fingerprint(self.df.copy()))
+        self.assertNotEqual(fingerprint(self.df), 'source')
+
+    def test_stamp_does_not_outlive_the_frame(self):
+        for _ in range(100):
+            stamp(pd.DataFrame({'PLZ': [10115, 10117], 'Number': [1, 2]}), 'source')
+        self.assertNotEqual(fingerprint(pd.DataFrame({'PLZ': [10115, 10117], 'Number': [1, 2]})), 'source')
+        self.assertLessEqual(len(pc._stamps), 50)
+
+    def test_stage_is_computed_once(self):
+        configure_pipeline_cache(None, {})
+
+        first = double(self.df)
+        second = double(self.df.copy())
+        self.assertEqual(calls, [2])
+        pd.testing.assert_frame_equal(first, second)
+
+        # Results are copies, modifying them does not change the cache
+        second['Number'] = 0
+        self.assertEqual(list(double(self.df)['Number']), [2, 4])
+
+        double(self.df, factor=3)
+        self.assertEqual(calls, [2, 2])
+
+    def test_disk_level_is_shared(self):
+        cache = PipelineCache(self.directory)
+        cache.call('double', double.__wrapped__, (self.df,), {})
+
+        # A second process only sees the directory
+        other = PipelineCache(self.directory)
+        result = other.call('double', double.__wrapped__, (self.df,), {})
+        self.assertEqual(calls, [2])
+        self.assertEqual(other.stats['disk_hits'], 1)
+        self.assertEqual(list(result['Number']), [2, 4])
+
+    def test_eviction(self):
+        cache = PipelineCache(self.directory, max_entries=1, max_bytes=0)
+        cache.call('double', double.__wrapped__, (self.df,), {})
+        cache.call('double', double.__wrapped__, (self.df, 3), {})
+
+        self.assertEqual(len(cache.memory), 1)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.pkl')], [])
+
+    def test_disabled_cache(self):
+        self.assertIsNone(configure_pipeline_cache(self.directory, {'pipeline_cache': False}))
+        double(self.df)
+        double(self.df)
+        self.assertEqual(calls, [2, 2])
+        self.assertIsNone(pc.get_pipeline_cache())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import sparse
+from shapely.geometry import box
+from core.infrastructure.Placement import lazy_greedy_placement, service_matrix, propose_stations, _gain
+
+
+def naive_greedy(weights, unmet, n_stations):
+    """Evaluates every candidate in every round"""
+    served = np.zeros(len(unmet))
+    placed = []
+    for _ in range(n_stations):
+        gains = [_gain(weights, candidate, unmet, served) for candidate in range(weights.shape[0])]
+        best = int(np.argmax(gains))
+        if gains[best] <= 0:
+            break
+        served[weights.indices[weights.indptr[best]:weights.indptr[best + 1]]] += \
+            weights.data[weights.indptr[best]:weights.indptr[best + 1]]
+        placed.append((best, gains[best]))
+    return placed
+
+
+class TestPlacement(unittest.TestCase):
+    """Test the placement of new charging stations"""
+
+    def test_lazy_greedy_matches_naive_greedy(self):
+        rng = np.random.default_rng(0)
+        weights = sparse.random(300, 200, density=0.05, random_state=0, format='csr')
+        unmet = rng.uniform(0, 3, 200)
+
+        lazy = lazy_greedy_placement(weights, unmet, 25)
+        naive = naive_greedy(weights, unmet, 25)
+        self.assertEqual([candidate for candidate, _ in lazy], [candidate for candidate, _ in naive])
+        np.testing.assert_allclose([gain for _, gain in lazy], [gain for _, gain in naive])
+
+    def test_gains_decrease_and_stop_when_all_demand_is_served(self):
+        weights = sparse.csr_matrix(np.array([[1.0, 0.0], [0.5, 0.5]]))
+        placed = lazy_greedy_placement(weights, np.array([2.0, 0.5]), 10)
+
+        gains = [gain for _, gain in placed]
+        self.assertEqual(gains, sorted(gains, reverse=True))
+        self.assertAlmostEqual(sum(gains), 2.5)
+
+    def test_service_matrix(self):
+        # 0.009 degrees latitude are about 1 km
+        weights = service_matrix(np.array([52.5]), np.array([13.4]), np.array([52.5, 52.509, 52.6]), np.array([13.4, 13.4, 13.4]))
+        self.assertEqual(weights.shape, (1, 3))
+        self.assertAlmostEqual(weights[0, 1] / weights[0, 0], np.exp(-1.0), places=2)
+        self.assertEqual(weights[0, 2], 0)
+
+        # A station replaces at most one missing station
+        self.assertAlmostEqual(weights.sum(), 1.0)
+
+    def test_propose_stations(self):
+        df_merged = gpd.GeoDataFrame({
+            'PLZ': [10115, 10117],
+            'Breitengrad': ['52.5', '52.5'],
+            'Längengrad': ['13.35', '13.45'],
+            'geometry': [box(13.3, 52.45, 13.4, 52.55), box(13.4, 52.45, 13.5, 52.55)]
+        }, geometry='geometry')
+
+        proposals = propose_stations(df_merged, pd.Series([0, 4]), 3)
+        self.assertEqual(list(proposals['Rank']), [1, 2, 3])
+        self.assertEqual(set(proposals['PLZ']), {10117})
+        self.assertTrue((proposals['Served'].diff().dropna() > 0).all())
+        self.assertTrue(propose_stations(df_merged, pd.Series([0, 0]), 3).empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
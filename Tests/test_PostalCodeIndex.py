@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+import pandas as pd
+from core.domain.suggestions_methods.PostalCodeIndex import PostalCodeIndex, get_postal_code_index, postal_code_strings
+
+
+class TestPostalCodeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PostalCodeIndex([10115, 10117, 10119, 13055, 13086, 1067, 10117])
+
+    def test_membership(self):
+        '''Postal codes are compared as strings, duplicates are dropped'''
+        self.assertIn("10115", self.index)
+        self.assertIn(" 13055 ", self.index)
+        self.assertIn(1067, self.index)
+        self.assertNotIn("99999", self.index)
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(list(self.index), sorted(["10115", "10117", "10119", "13055", "13086", "01067"]))
+
+    def test_numeric_codes_keep_their_leading_zero(self):
+        '''01067 read from an integer column is stored and looked up as "01067", not "1067"'''
+        index = get_postal_code_index(pd.DataFrame({'PLZ': [1067, 10115]}))
+        self.assertIn("01067", index)
+        self.assertIn(1067, index)
+        self.assertNotIn("1067", index)
+        np.testing.assert_array_equal(index.contains(np.array([1067, 1068])), [True, False])
+        self.assertEqual(index.nearest("1067"), ["01067"])
+        self.assertEqual(postal_code_strings(pd.Series([1067, 10115], index=[3, 4])).to_dict(), {3: "01067", 4: "10115"})
+        self.assertEqual(postal_code_strings([1067.0, " 01067 "]).tolist(), ["01067", "01067"])
+
+    def test_index_is_immutable(self):
+        with self.assertRaises(ValueError):
+            self.index.codes[0] = "00000"
+
+    def test_contains_is_vectorized(self):
+        '''The batch lookup agrees with the membership test'''
+        values = ["10115", "10116", "13086", "99999", "00000", "01067", ""]
+        np.testing.assert_array_equal(self.index.contains(values), [value in self.index for value in values])
+        np.testing.assert_array_equal(PostalCodeIndex([]).contains(["10115"]), [False])
+
+    def test_nearest_prefers_one_typo(self):
+        '''A wrong, swapped, missing or extra digit is corrected'''
+        self.assertEqual(self.index.nearest("10118"), ["10117", "10119", "10115"])
+        self.assertEqual(self.index.nearest("13068"), ["13086"])
+        self.assertEqual(self.index.nearest("1305"), ["13055"])
+        self.assertEqual(self.index.nearest("130555"), ["13055"])
+        self.assertEqual(self.index.nearest("10118", n=1), ["10117"])
+
+    def test_nearest_falls_back_to_numeric_distance(self):
+        '''Without a postal code one typo away the numerically closest are proposed'''
+        self.assertEqual(self.index.nearest("12000"), ["13055", "13086", "10119"])
+        self.assertEqual(self.index.nearest("99999", n=1), ["13086"])
+        self.assertEqual(self.index.nearest("abc"), [])
+
+    def test_nearest_handles_non_ascii_digits(self):
+        '''Digits int() can't parse are no numbers, only typo corrections are proposed'''
+        self.assertEqual(self.index.nearest("1011\u00b2"), ["10115", "10117", "10119"])
+        self.assertEqual(self.index.nearest("\u00b2\u00b2\u00b2\u00b2\u00b2"), [])
+        self.assertEqual(self.index.nearest("\uff11\uff10\uff11\uff11\uff15"), [])
+        self.assertIn("1011\u00b2", PostalCodeIndex(["1011\u00b2", "10115"]))
+        self.assertEqual(PostalCodeIndex(["1011\u00b2", "10115"]).nearest("99999"), ["10115"])
+
+    def test_index_is_shared_per_dataset_version(self):
+        '''The index is only rebuilt when the dataset changes'''
+        df = pd.DataFrame({'PLZ': [10115, 10117]})
+        self.assertIs(get_postal_code_index(df), get_postal_code_index(df))
+
+        changed = pd.DataFrame({'PLZ': [10115, 10119]})
+        self.assertNotIn("10117", get_postal_code_index(changed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import pandas as pd
+from core.infrastructure.Regions import get_region, filter_register_by_region, filter_residents_by_region, \
+    plz_bundesland_lookup, resident_bundesland_lookup, partition_regions, REGION_GERMANY, BUNDESLAENDER
+
+
+class TestRegions(unittest.TestCase):
+    """Test the region selection of the pipeline"""
+
+    def setUp(self):
+        self.df_register = pd.DataFrame({
+                'PLZ': [10115, 10117, 14199, 14469, 80331],
+                'Bundesland': ['Berlin', 'Berlin', 'Berlin', 'Brandenburg', 'Bayern']
+        })
+        self.df_residents = pd.DataFrame({
+                'PLZ': [9999, 10115, 14199, 14469, 80331]
+        })
+
+    def test_get_region(self):
+        self.assertEqual(get_region({}), 'Berlin')
+        self.assertEqual(get_region({'region': REGION_GERMANY}), REGION_GERMANY)
+        self.assertRaises(ValueError, get_region, {'region': 'Atlantis'})
+
+    def test_berlin_keeps_the_historic_plz_windows(self):
+        result = filter_register_by_region(self.df_register, 'Berlin', {})
+        self.assertEqual(list(result['PLZ']), [10117, 14199])
+
+        result = filter_residents_by_region(self.df_residents, 'Berlin', {})
+        self.assertEqual(list(result['PLZ']), [10115, 14199])
+
+    def test_other_regions(self):
+        result = filter_register_by_region(self.df_register, 'Bayern', {})
+        self.assertEqual(list(result['PLZ']), [80331])
+
+        # Germany keeps everything
+        self.assertEqual(len(filter_register_by_region(self.df_register, REGION_GERMANY, {})), 5)
+        self.assertEqual(len(filter_residents_by_region(self.df_residents, REGION_GERMANY, {})), 5)
+
+    def test_plz_bundesland_lookup(self):
+        df_raw = pd.DataFrame({
+                'Postleitzahl': [14469, 14469, 14469, 80331],
+                'Bundesland': ['Brandenburg', 'Brandenburg', 'Berlin', 'Bayern']
+        })
+        lookup = plz_bundesland_lookup(df_raw)
+        self.assertEqual(lookup[14469], 'Brandenburg')
+        self.assertEqual(lookup[80331], 'Bayern')
+
+    def test_resident_bundesland_lookup(self):
+        # 01067 has no stations and lies closest to the station in Dresden, 99999 has no coordinates
+        df_raw = pd.DataFrame({
+                'Postleitzahl': [1069, 80331],
+                'Bundesland': ['Sachsen', 'Bayern'],
+                'Breitengrad': ['51,0382', '48,1371'],
+                'Längengrad': ['13,7334', '11,5754']
+        })
+        df_residents = pd.DataFrame({
+                'plz': [1067, 1069, 99999],
+                'lat': [51.0602, 51.0382, None],
+                'lon': [13.7112, 13.7334, None]
+        })
+        lookup = resident_bundesland_lookup(df_raw, df_residents)
+        self.assertEqual(lookup[1067], 'Sachsen')
+        self.assertEqual(lookup[80331], 'Bayern')
+        self.assertNotIn(99999, lookup.index)
+
+    def test_partition_regions(self):
+        self.assertEqual(partition_regions('Berlin'), ['Berlin'])
+        self.assertEqual(partition_regions(REGION_GERMANY), BUNDESLAENDER)
+
+
+if __name__ == '__main__':
+    unittest.main()
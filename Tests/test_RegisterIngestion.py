@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import geopandas as gpd
+from shapely.geometry import Polygon
+from core.infrastructure.RegisterIngestion import read_register_chunks, stream_register, counts_with_geometry
+
+REGISTER_CSV = (
+    "Betreiber;Postleitzahl;Bundesland;Breitengrad;Längengrad;Nennleistung Ladeeinrichtung [kW];Steckertypen1\n"
+    "A;10117;Berlin;52,5170;13,3889;22;Typ 2\n"
+    "B;10117;Berlin;52,5171;13,3890;11,5;Typ 2\n"
+    "C;10178;Berlin;52,5234;13,4105;50;CCS\n"
+    "D;80331;Bayern;48,1371;11,5754;150;CCS\n"
+    "E;ohne;Berlin;52,5234;13,4105;50;CCS\n"
+)
+
+
+class TestRegisterIngestion(unittest.TestCase):
+    """Test the chunked ingestion of the charging station register"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "Ladesaeulenregister.csv")
+        with open(self.path, "w") as file:
+            file.write(REGISTER_CSV)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_chunks_are_typed(self):
+        chunks = list(read_register_chunks(self.path, chunksize=2))
+        self.assertEqual(len(chunks), 3)
+
+        chunk = chunks[0]
+        self.assertNotIn('Steckertypen1', chunk.columns)
+        self.assertEqual(chunk['Breitengrad'].dtype, 'float64')
+        self.assertAlmostEqual(chunk['Nennleistung Ladeeinrichtung [kW]'].iloc[1], 11.5)
+
+        # The row without a numeric PLZ is dropped
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 4)
+
+    def test_malformed_numbers_become_nan(self):
+        with open(self.path, "a") as file:
+            file.write("F;10178;Berlin;52,52x;13,4105;unbekannt;CCS\n")
+
+        chunk = next(read_register_chunks(self.path))
+        self.assertEqual(len(chunk), 5)
+        self.assertTrue(chunk['Breitengrad'].isna().iloc[-1])
+        self.assertTrue(chunk['Nennleistung Ladeeinrichtung [kW]'].isna().iloc[-1])
+        self.assertAlmostEqual(chunk['Längengrad'].iloc[-1], 13.4105)
+
+    def test_only_the_malformed_chunk_is_read_again(self):
+        with open(self.path, "a") as file:
+            file.write("F;10178;Berlin;52,52x;13,4105;unbekannt;CCS\n")
+            file.write("G;10115;Berlin;52,5321;13,3849;7,4;CCS\n")
+
+        chunks = list(read_register_chunks(self.path, chunksize=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1, 1])
+        self.assertTrue(chunks[2]['Breitengrad'].isna().iloc[0])
+        self.assertAlmostEqual(chunks[3]['Nennleistung Ladeeinrichtung [kW]'].iloc[0], 7.4)
+        self.assertTrue(all(chunk['Breitengrad'].dtype == 'float64' for chunk in chunks))
+
+    def test_counts_are_aggregated_over_chunks(self):
+        result = stream_register(self.path, {}, region='Berlin', chunksize=1)
+
+        self.assertEqual(list(result['counts']['PLZ']), [10117, 10178])
+        self.assertEqual(list(result['counts']['Number']), [2, 1])
+        self.assertEqual(list(result['counts']['KW']), [33.5, 50.0])
+        self.assertEqual(len(result['stations']), 3)
+
+    def test_aggregates_only(self):
+        result = stream_register(self.path, {}, keep_stations=False, chunksize=2)
+
+        self.assertIsNone(result['stations'])
+        self.assertEqual(list(result['counts']['Number']), [2, 1, 1])
+
+    def test_counts_with_geometry(self):
+        df_geo = gpd.GeoDataFrame({
+                'PLZ': [10117],
+                'geometry': [Polygon([(13.3, 52.5), (13.4, 52.5), (13.4, 52.6), (13.3, 52.6)])]
+        })
+        counts = stream_register(self.path, {}, keep_stations=False)['counts']
+
+        result = counts_with_geometry(counts, df_geo, {'geocode': 'PLZ'})
+        self.assertIsInstance(result, gpd.GeoDataFrame)
+        self.assertEqual(list(result.columns), ['PLZ', 'Number', 'geometry', 'KW'])
+        self.assertEqual(list(result['PLZ']), [10117])
+
+
+if __name__ == '__main__':
+    unittest.main()
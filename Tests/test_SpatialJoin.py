@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Polygon
+from core.infrastructure.SpatialJoin import to_numeric_coordinates, points_in_polygons, assign_stations_to_plz
+
+
+class TestSpatialJoin(unittest.TestCase):
+    """Test the coordinate based assignment of charging stations to PLZ polygons"""
+
+    def setUp(self):
+        self.df_geo = gpd.GeoDataFrame({
+                'PLZ': [10115, 10117],
+                'geometry': [Polygon([(13.0, 52.5), (13.1, 52.5), (13.1, 52.6), (13.0, 52.6)]),
+                             Polygon([(13.1, 52.5), (13.2, 52.5), (13.2, 52.6), (13.1, 52.6)])]
+        })
+
+        # Stated PLZ correct, stated PLZ wrong, outside of all polygons, unparsable coordinates
+        self.df_stations = pd.DataFrame({
+                'Postleitzahl': [10115, 10115, 10117, 10117],
+                'Bundesland': ['Berlin'] * 4,
+                'Breitengrad': ['52,55', '52,55', '48,13', 'unbekannt'],
+                'Längengrad': ['13,05', '13,15', '11,57', '13,15']
+        })
+
+    def test_to_numeric_coordinates(self):
+        result = to_numeric_coordinates(self.df_stations['Breitengrad'])
+        np.testing.assert_array_equal(result[:3], [52.55, 52.55, 48.13])
+        self.assertTrue(np.isnan(result[3]))
+
+    def test_points_in_polygons(self):
+        lon = np.array([13.05, 13.15, 11.57, np.nan])
+        lat = np.array([52.55, 52.55, 48.13, 52.55])
+
+        result = points_in_polygons(lon, lat, self.df_geo.geometry.to_numpy())
+        np.testing.assert_array_equal(result, [0, 1, -1, -1])
+
+    def test_points_on_shared_borders(self):
+        # (1.0, 0.5) lies on the border of both unit boxes and goes to the first, (2.0, 1.0) on the outer corner
+        polygons = np.array([Polygon([(0, 0), (1, 0), (1, 1), (0, 1)]), Polygon([(1, 0), (2, 0), (2, 1), (1, 1)])])
+        result = points_in_polygons(np.array([1.0, 2.0, 2.5]), np.array([0.5, 1.0, 0.5]), polygons)
+        np.testing.assert_array_equal(result, [0, 1, -1])
+
+        result = points_in_polygons(np.array([1.0]), np.array([0.5]), polygons[::-1].copy())
+        np.testing.assert_array_equal(result, [0])
+
+    def test_assign_stations_flags_mismatches(self):
+        result = assign_stations_to_plz(self.df_stations, self.df_geo, {'geocode': 'PLZ', 'plz_assignment': 'register'})
+
+        self.assertEqual(list(result['PLZ_geo'].astype(object).where(result['PLZ_geo'].notna(), None)),
+                         [10115, 10117, None, None])
+        self.assertEqual(list(result['PLZ_mismatch']), [False, True, True, True])
+
+        # The stated PLZ is kept in register mode
+        self.assertEqual(list(result['Postleitzahl']), [10115, 10115, 10117, 10117])
+
+    def test_assign_stations_spatial_mode(self):
+        result = assign_stations_to_plz(self.df_stations, self.df_geo, {'geocode': 'PLZ', 'plz_assignment': 'spatial'})
+
+        # Located stations get the PLZ of their polygon, the others keep the stated one
+        self.assertEqual(list(result['Postleitzahl']), [10115, 10117, 10117, 10117])
+
+
+if __name__ == '__main__':
+    unittest.main()
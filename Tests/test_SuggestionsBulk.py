@@ -0,0 +1,79 @@
+import unittest
+import json
+import os
+import tempfile
+from core.domain.suggestions_methods.SuggestionsStore import SuggestionsStore
+from core.domain.suggestions_methods.PostalCodeIndex import PostalCodeIndex
+from core.domain.suggestions_methods.SuggestionsBulk import import_suggestions, export_suggestions, read_suggestion_batches
+
+
+class TestSuggestionsBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SuggestionsStore(os.path.join(self.directory.name, "suggestions.db"))
+        self.postal_codes = PostalCodeIndex(["10115", "10117", "13055"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_csv_import_validates_and_deduplicates(self):
+        '''Invalid PLZ, empty texts and repeated suggestions are skipped'''
+        with open(self.path("suggestions.csv"), "w") as file:
+            file.write("PLZ,Text,Author\n"
+                       "10115,More chargers,a\n"
+                       "99999,Wrong PLZ,b\n"
+                       "10117,,c\n"
+                       "10115,  more   CHARGERS ,d\n"
+                       "13055,\"Fast chargers, please\",e\n")
+
+        stats = import_suggestions(self.path("suggestions.csv"), self.store, self.postal_codes, batch_size=2)
+
+        self.assertEqual(stats, {'read': 5, 'invalid': 2, 'duplicates': 1, 'imported': 2})
+        self.assertEqual(self.store.suggestions(), [{"Text": "More chargers", "PLZ": "10115"},
+                                                    {"Text": "Fast chargers, please", "PLZ": "13055"}])
+        self.assertEqual(self.store.plz_counts().to_dict("list"), {"PLZ": ["10115", "13055"], "Suggestions": [1, 1]})
+
+    def test_jsonl_import_skips_stored_suggestions(self):
+        '''Suggestions submitted before and broken lines are not imported'''
+        self.store.append("More chargers", "10115")
+        with open(self.path("suggestions.jsonl"), "w") as file:
+            file.write(json.dumps({"Text": "More chargers", "PLZ": "10115"}) + "\n")
+            file.write("not json\n")
+            file.write(json.dumps({"Text": "Chargers at the station", "PLZ": 10117}) + "\n")
+            file.write(json.dumps(["Text", "PLZ"]) + "\n")
+
+        stats = import_suggestions(self.path("suggestions.jsonl"), self.store)
+
+        self.assertEqual(stats, {'read': 4, 'invalid': 2, 'duplicates': 1, 'imported': 1})
+        self.assertEqual(self.store.count(), 2)
+        self.assertEqual(self.store.query(text="station")[0], [{"Text": "Chargers at the station", "PLZ": "10117"}])
+
+    def test_export_round_trip(self):
+        '''Exported files import into an identical store, in both formats'''
+        for i in range(25):
+            self.store.append(f"Suggestion {i}, with a comma\nand a new line", ["10115", "13055"][i % 2])
+
+        for name in ["export.csv", "export.jsonl"]:
+            self.assertEqual(export_suggestions(self.store, self.path(name), batch_size=10), 25)
+
+            other = SuggestionsStore(self.path(f"{name}.db"))
+            stats = import_suggestions(self.path(name), other, self.postal_codes, batch_size=7)
+            self.assertEqual(stats['imported'], 25)
+            self.assertEqual(other.suggestions(), self.store.suggestions())
+
+    def test_files_are_read_in_batches(self):
+        with open(self.path("suggestions.jsonl"), "w") as file:
+            for i in range(10):
+                file.write(json.dumps({"Text": f"Suggestion {i}", "PLZ": "10115"}) + "\n")
+
+        self.assertEqual([len(batch) for batch in read_suggestion_batches(self.path("suggestions.jsonl"), batch_size=4)], [4, 4, 2])
+        with self.assertRaises(ValueError):
+            list(read_suggestion_batches(self.path("suggestions.txt")))
+
+
+if __name__ == '__main__':
+    unittest.main()
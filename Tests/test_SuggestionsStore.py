@@ -0,0 +1,217 @@
+import unittest
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from core.domain.suggestions_methods.SuggestionsStore import SuggestionsStore, open_suggestions_store, content_hash
+from core.domain.suggestions_methods.SuggestionsMethods import clear_suggestions_file
+
+
+class TestSuggestionsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "suggestions.db")
+        self.legacy_file = os.path.join(self.directory.name, "suggestions.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_load(self):
+        '''Suggestions are loaded in the order they were submitted'''
+        store = SuggestionsStore(self.path)
+        store.append("More chargers", "10115")
+        store.append("Fast chargers please", "10117")
+
+        self.assertEqual(store.suggestions(), [{"Text": "More chargers", "PLZ": "10115"},
+                                               {"Text": "Fast chargers please", "PLZ": "10117"}])
+        self.assertEqual(store.count(), 2)
+
+    def test_suggestions_persist_and_database_uses_wal(self):
+        '''A reopened store sees the committed suggestions'''
+        SuggestionsStore(self.path).append("More chargers", "10115")
+
+        self.assertEqual(SuggestionsStore(self.path).suggestions(), [{"Text": "More chargers", "PLZ": "10115"}])
+        connection = sqlite3.connect(self.path)
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        connection.close()
+
+    def test_concurrent_submitters_lose_no_writes(self):
+        '''Every thread has its own store like every streamlit session'''
+        SuggestionsStore(self.path)
+
+        def submit(thread):
+            store = SuggestionsStore(self.path)
+            for i in range(25):
+                store.append(f"Suggestion {thread}-{i}", f"{10115 + thread}")
+
+        threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        suggestions = SuggestionsStore(self.path).suggestions()
+        self.assertEqual(len(suggestions), 200)
+        self.assertEqual(len({s["Text"] for s in suggestions}), 200)
+
+    def test_legacy_file_is_imported_once(self):
+        '''The suggestions of suggestions.json are copied into a new database only'''
+        with open(self.legacy_file, "w") as file:
+            json.dump([{"Text": "Old suggestion", "PLZ": "10115"}, "not a suggestion"], file)
+
+        store = SuggestionsStore(self.path, legacy_file=self.legacy_file)
+        self.assertEqual(store.suggestions(), [{"Text": "Old suggestion", "PLZ": "10115"}])
+
+        store.clear()
+        self.assertEqual(SuggestionsStore(self.path, legacy_file=self.legacy_file).suggestions(), [])
+
+    def test_clear_with_password(self):
+        '''The store is only cleared with the correct password'''
+        store = SuggestionsStore(self.path)
+        store.append("More chargers", "10115")
+
+        clear_suggestions_file("wrong_password", store=store)
+        self.assertEqual(store.count(), 1)
+        clear_suggestions_file("12345", store=store)
+        self.assertEqual(store.count(), 0)
+
+    def test_query_pages_through_suggestions_sorted_by_plz(self):
+        '''Following the cursors visits every suggestion once, sorted by PLZ'''
+        store = SuggestionsStore(self.path)
+        for i in range(45):
+            store.append(f"Suggestion {i}", f"{10115 + i % 7}")
+
+        pages, cursor = [], None
+        while True:
+            page, cursor = store.query(after=cursor, limit=10)
+            pages.append(page)
+            if cursor is None:
+                break
+
+        suggestions = [s for page in pages for s in page]
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 10, 5])
+        self.assertEqual(sorted(s["Text"] for s in suggestions), sorted(f"Suggestion {i}" for i in range(45)))
+        self.assertEqual([s["PLZ"] for s in suggestions], sorted(s["PLZ"] for s in suggestions))
+
+    def test_query_filters_by_plz_and_prefix(self):
+        '''A PLZ matches exactly, a trailing * matches the prefix'''
+        store = SuggestionsStore(self.path)
+        for plz in ["13055", "13086", "10115", "13199", "14050"]:
+            store.append("More chargers", plz)
+
+        self.assertEqual([s["PLZ"] for s in store.query("13086")[0]], ["13086"])
+        self.assertEqual([s["PLZ"] for s in store.query("130*")[0]], ["13055", "13086"])
+        self.assertEqual([s["PLZ"] for s in store.query("1*")[0]], ["10115", "13055", "13086", "13199", "14050"])
+        self.assertEqual(store.count("13*"), 3)
+
+    def test_query_searches_text(self):
+        '''All words must occur, the last one may be incomplete, FTS syntax is ignored and cleared suggestions aren't found'''
+        store = SuggestionsStore(self.path)
+        store.append("Fast chargers near the park", "10115")
+        store.append("Slow chargers are enough", "10117")
+        store.append("A fast charger at the station", "10119")
+        store.clear()
+        store.append("Fast chargers near the park", "10115")
+        store.append("Slow chargers are enough", "10117")
+        store.append("A fast charger at the station", "13055")
+
+        self.assertEqual([s["PLZ"] for s in store.query(text="fast charg")[0]], ["10115", "13055"])
+        self.assertEqual([s["PLZ"] for s in store.query(text="chargers")[0]], ["10115", "10117"])
+        self.assertEqual([s["PLZ"] for s in store.query("101*", text="fast")[0]], ["10115"])
+        self.assertEqual(store.query(text='park" OR "slow')[0], [])
+        self.assertEqual(store.count(text="charg"), 3)
+
+    def test_database_of_first_version_is_migrated(self):
+        '''Suggestions stored before the indexes existed can be searched'''
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE suggestions (id INTEGER PRIMARY KEY AUTOINCREMENT, plz TEXT NOT NULL, "
+                           "text TEXT NOT NULL, created REAL NOT NULL)")
+        connection.execute("INSERT INTO suggestions (plz, text, created) VALUES ('10115', 'Fast chargers', 0)")
+        connection.execute("PRAGMA user_version = 1")
+        connection.commit()
+        connection.close()
+
+        store = SuggestionsStore(self.path)
+        self.assertEqual(store.query(text="fast")[0], [{"Text": "Fast chargers", "PLZ": "10115"}])
+
+    def test_plz_counts_are_maintained_on_append_and_clear(self):
+        '''The materialized counts follow every insert and delete'''
+        store = SuggestionsStore(self.path)
+        self.assertTrue(store.plz_counts().empty)
+        for plz in ["10117", "10115", "10117"]:
+            store.append("More chargers", plz)
+
+        counts = store.plz_counts()
+        self.assertEqual(counts.to_dict("list"), {"PLZ": ["10115", "10117"], "Suggestions": [1, 2]})
+        self.assertEqual(store.total(), 3)
+
+        store.clear()
+        self.assertTrue(store.plz_counts().empty)
+        self.assertEqual(store.total(), 0)
+
+    def test_numeric_plz_keep_their_leading_zero(self):
+        '''A PLZ passed as number is stored like the string of the PostalCodeIndex'''
+        store = SuggestionsStore(self.path)
+        store.append("More chargers", 1067)
+        store.append_many([("More chargers", "01067"), ("Fast chargers", 1067)])
+
+        self.assertEqual(store.plz_counts().to_dict("list"), {"PLZ": ["01067"], "Suggestions": [2]})
+        self.assertEqual(store.count("01067"), 2)
+
+    def test_plz_counts_are_built_for_existing_suggestions(self):
+        '''A database of an older version gets the counts of its suggestions'''
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE suggestions (id INTEGER PRIMARY KEY AUTOINCREMENT, plz TEXT NOT NULL, "
+                           "text TEXT NOT NULL, created REAL NOT NULL)")
+        connection.executemany("INSERT INTO suggestions (plz, text, created) VALUES (?, 'More chargers', 0)",
+                               [("13055",), ("13055",), ("10115",)])
+        connection.execute("PRAGMA user_version = 1")
+        connection.commit()
+        connection.close()
+
+        counts = SuggestionsStore(self.path).plz_counts()
+        self.assertEqual(counts.to_dict("list"), {"PLZ": ["10115", "13055"], "Suggestions": [1, 2]})
+
+    def test_append_many_skips_duplicate_content(self):
+        '''Suggestions differing only in case and whitespace are stored once'''
+        store = SuggestionsStore(self.path)
+        store.append("More chargers", "10115")
+
+        added = store.append_many([("more  chargers", "10115"), ("More chargers", "10117"), ("Fast", "10115"), ("fast", "10115")])
+
+        self.assertEqual(added, 2)
+        self.assertEqual(store.suggestions(), [{"Text": "More chargers", "PLZ": "10115"}, {"Text": "More chargers", "PLZ": "10117"},
+                                               {"Text": "Fast", "PLZ": "10115"}])
+        self.assertEqual(content_hash(" More\nchargers ", "10115"), content_hash("more chargers", "10115"))
+        self.assertNotEqual(content_hash("More chargers", "10115"), content_hash("More chargers", "10117"))
+
+    def test_iter_batches(self):
+        store = SuggestionsStore(self.path)
+        for i in range(7):
+            store.append(f"Suggestion {i}", "10115")
+
+        batches = list(store.iter_batches(3))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual([s for batch in batches for s in batch], store.suggestions())
+
+    def test_content_hashes_are_built_for_existing_suggestions(self):
+        '''Suggestions stored before the content hash existed are deduplicated against'''
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE suggestions (id INTEGER PRIMARY KEY AUTOINCREMENT, plz TEXT NOT NULL, "
+                           "text TEXT NOT NULL, created REAL NOT NULL)")
+        connection.execute("INSERT INTO suggestions (plz, text, created) VALUES ('10115', 'More chargers', 0)")
+        connection.execute("PRAGMA user_version = 1")
+        connection.commit()
+        connection.close()
+
+        self.assertEqual(SuggestionsStore(self.path).append_many([("More chargers", "10115")]), 0)
+
+    def test_open_store_is_shared(self):
+        '''Reruns of the app get the same store'''
+        self.assertIs(open_suggestions_store(self.path), open_suggestions_store(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
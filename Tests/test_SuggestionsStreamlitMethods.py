@@ -1,6 +1,9 @@
 import unittest
-from unittest.mock import patch
-from core.application.presentation.SuggestionsStreamlitMethods import submit_a_suggestion
+import os
+import tempfile
+from unittest.mock import patch, MagicMock
+from core.domain.suggestions_methods.SuggestionsStore import SuggestionsStore
+from core.application.presentation.SuggestionsStreamlitMethods import submit_a_suggestion, view_suggestions
 
 class TestSubmitSuggestion(unittest.TestCase):
     """Test behaviour for incorrectly submitted postal codes"""
@@ -26,6 +29,9 @@ class TestSubmitSuggestion(unittest.TestCase):
         # Ensure an error message was displayed
         mock_sidebar.error.assert_called_once_with("Invalid PLZ.")
 
+        # The nearest valid postal code is proposed
+        mock_sidebar.info.assert_called_once_with("Did you mean 10119 or 10117 or 10115?")
+
     @patch("streamlit.sidebar")
     @patch("streamlit.session_state", new_callable = dict)
     def test_empty_suggestion_or_postal_code(self, mock_session_state,
@@ -48,3 +54,63 @@ class TestSubmitSuggestion(unittest.TestCase):
         mock_sidebar.warning.assert_called_once_with(
             "Suggestion and PLZ cannot be empty.")
 
+    @patch("streamlit.sidebar")
+    def test_valid_suggestion_is_appended_to_store(self, mock_sidebar):
+        # Mocking inputs
+        mock_sidebar.text_input.return_value = "10115"
+        mock_sidebar.text_area.return_value = "This is a test suggestion"
+        mock_sidebar.button.return_value = True
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = SuggestionsStore(os.path.join(directory, "suggestions.db"))
+
+            # Call the function
+            submit_a_suggestion(["10115", "10117", "10119"], store)
+
+            # Check that the suggestion was stored
+            self.assertEqual(store.suggestions(), [{"Text": "This is a test suggestion", "PLZ": "10115"}])
+            mock_sidebar.success.assert_called_once_with("Thank you for your suggestion!")
+
+    @patch("streamlit.sidebar")
+    @patch("streamlit.session_state", new_callable = dict)
+    def test_view_shows_one_page(self, mock_session_state, mock_sidebar):
+        # Mocking inputs, no page navigation
+        mock_sidebar.text_input.side_effect = ["101*", ""]
+        previous_column, next_column = MagicMock(), MagicMock()
+        previous_column.button.return_value = next_column.button.return_value = False
+        mock_sidebar.columns.return_value = (previous_column, next_column)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = SuggestionsStore(os.path.join(directory, "suggestions.db"))
+            for i in range(30):
+                store.append(f"Suggestion {i}", "10115")
+            store.append("Other suggestion", "13055")
+
+            # Call the function
+            view_suggestions(store)
+
+        # Only the first page of the matching suggestions is written
+        self.assertEqual(mock_sidebar.write.call_count, 20)
+        mock_sidebar.caption.assert_called_once_with("Suggestions 1 to 20 of 30")
+        self.assertEqual(mock_session_state["suggestions_cursors"], [None])
+        next_column.button.assert_called_once_with("Next", disabled = False)
+
+    @patch("streamlit.sidebar")
+    @patch("streamlit.session_state", new_callable = dict)
+    def test_view_without_filter_reads_the_materialized_total(self, mock_session_state, mock_sidebar):
+        # Mocking inputs, no filter and no page navigation
+        mock_sidebar.text_input.side_effect = ["", ""]
+        previous_column, next_column = MagicMock(), MagicMock()
+        previous_column.button.return_value = next_column.button.return_value = False
+        mock_sidebar.columns.return_value = (previous_column, next_column)
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = SuggestionsStore(os.path.join(directory, "suggestions.db"))
+            store.append_many([(f"Suggestion {i}", plz) for i in range(5) for plz in ("10115", "13055")])
+
+            # The suggestions are not counted, the total comes from the counts per PLZ
+            with patch.object(store, "count", wraps = store.count) as count:
+                view_suggestions(store)
+            count.assert_not_called()
+
+        mock_sidebar.caption.assert_called_once_with("Suggestions 1 to 10 of 10")
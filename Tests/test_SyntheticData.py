@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import shapely
+from core.infrastructure.SyntheticData import synthetic_plz_polygons, synthetic_residents, synthetic_register, \
+    write_synthetic_datasets, PLZ_RANGES
+from core.infrastructure.RegisterIngestion import stream_register
+from core.infrastructure.DatasetCache import _compile_geodat_plz, _compile_residents
+from core.infrastructure.methods import preprop_lstat
+
+
+class TestSyntheticData(unittest.TestCase):
+    """Test the synthetic datasets for load tests"""
+
+    def setUp(self):
+        self.gdf_geo = synthetic_plz_polygons(300, vertices=40, seed=1)
+        self.df_residents = synthetic_residents(self.gdf_geo, seed=1)
+
+    def test_polygons(self):
+        self.assertEqual(len(self.gdf_geo), 300)
+        self.assertTrue(self.gdf_geo['PLZ'].is_unique)
+        self.assertTrue(self.gdf_geo.geometry.is_valid.all())
+        self.assertGreaterEqual(shapely.get_num_coordinates(self.gdf_geo.geometry.values).mean(), 30)
+
+        # The PLZ of every Bundesland lie in its range
+        for state, (start, end) in PLZ_RANGES.items():
+            plz = self.gdf_geo.loc[self.gdf_geo['Bundesland'] == state, 'PLZ']
+            self.assertTrue(plz.between(start, end).all(), state)
+
+    def test_register_schema(self):
+        df_register = synthetic_register(self.gdf_geo, self.df_residents, 500, seed=1)
+
+        self.assertEqual(len(df_register), 500)
+        self.assertIn(',', df_register['Breitengrad'].iloc[0])
+
+        # Every station lies in the polygon of its PLZ
+        geometry = self.gdf_geo.set_index('PLZ').geometry.reindex(df_register['Postleitzahl']).values
+        lon = df_register['Längengrad'].str.replace(',', '.').astype(float).to_numpy()
+        lat = df_register['Breitengrad'].str.replace(',', '.').astype(float).to_numpy()
+        self.assertTrue(shapely.contains_xy(geometry, lon, lat).all())
+
+        # The register can be preprocessed like the real one
+        result = preprop_lstat(df_register, self.gdf_geo[['PLZ', 'geometry']], {'geocode': 'PLZ', 'region': 'Deutschland'})
+        self.assertEqual(len(result), 500)
+
+    def test_written_files_are_read_by_the_loaders(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paramdict = {'file_geodat_plz': 'geodata_plz.csv', 'file_residents': 'plz_einwohner.csv',
+                         'file_lstations': 'Ladesaeulenregister.csv'}
+            paths = write_synthetic_datasets(directory, 50, 250, paramdict, vertices=20)
+
+            counts = stream_register(paths['lstat'], {}, keep_stations=False, chunksize=100)['counts']
+            self.assertEqual(counts['Number'].sum(), 250)
+            self.assertEqual(len(_compile_geodat_plz(paths['geodat_plz'])), 50)
+            np.testing.assert_array_equal(_compile_residents(paths['residents'])['plz'].to_numpy(),
+                                          np.sort(_compile_geodat_plz(paths['geodat_plz'])['PLZ'].to_numpy()))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
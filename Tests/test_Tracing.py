@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import tracemalloc
+from core.infrastructure.Tracing import Tracer, spans_to_frame, to_chrome_trace, export_trace, get_tracer, traced
+from core.infrastructure.HelperTools import timer
+
+
+@timer
+def timed_stage():
+    """Stage used to test the timer"""
+    return 42
+
+
+class TestTracing(unittest.TestCase):
+    """Test the nested spans of the tracer"""
+
+    def test_nested_spans(self):
+        tracer = Tracer()
+        with tracer.span('main'):
+            with tracer.span('preprocessing'):
+                tracer.record_cache('pipeline', False)
+            with tracer.span('demand'):
+                tracer.record_cache('pipeline', True)
+
+        spans = tracer.current_trace()
+        self.assertEqual([record['name'] for record in spans], ['preprocessing', 'demand', 'main'])
+        self.assertEqual([record['depth'] for record in spans], [1, 1, 0])
+        self.assertEqual(spans[0]['parent'], 'main')
+        self.assertEqual(spans[0]['cache']['pipeline_misses'], 1)
+        self.assertEqual(spans[1]['cache']['pipeline_hits'], 1)
+        self.assertGreaterEqual(spans[2]['wall'], spans[0]['wall'] + spans[1]['wall'])
+
+        df = spans_to_frame(spans)
+        self.assertEqual(list(df['span']), ['main', '  preprocessing', '  demand'])
+
+    def test_new_trace_per_root_span(self):
+        tracer = Tracer()
+        with tracer.span('first'):
+            pass
+        with tracer.span('second'):
+            pass
+        self.assertEqual([record['name'] for record in tracer.current_trace()], ['second'])
+
+    def test_span_is_recorded_on_exceptions(self):
+        tracer = Tracer()
+        with self.assertRaises(ValueError):
+            with tracer.span('failing'):
+                raise ValueError
+        self.assertEqual(tracer.current_trace()[0]['name'], 'failing')
+
+    def test_peak_memory(self):
+        tracer = Tracer(memory=True)
+        tracemalloc.start()
+        try:
+            with tracer.span('outer'):
+                with tracer.span('inner'):
+                    data = bytearray(10 ** 6)
+                    del data
+        finally:
+            tracemalloc.stop()
+
+        inner, outer = tracer.current_trace()
+        self.assertGreaterEqual(inner['peak_memory'], 10 ** 6)
+        self.assertGreaterEqual(outer['peak_memory'], inner['peak_memory'])
+
+    def test_timer_and_traced_record_spans(self):
+        @traced('stage')
+        def stage():
+            return timed_stage()
+
+        self.assertEqual(stage(), 42)
+        names = [record['name'] for record in get_tracer().current_trace()]
+        self.assertEqual(names, ['timed_stage', 'stage'])
+
+    def test_chrome_trace_export(self):
+        tracer = Tracer()
+        with tracer.span('main', region='Berlin'):
+            pass
+
+        trace = to_chrome_trace(tracer.current_trace())
+        event = trace['traceEvents'][0]
+        self.assertEqual((event['name'], event['ph'], event['args']['region']), ('main', 'X', 'Berlin'))
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'trace.json')
+            export_trace(tracer.current_trace(), path)
+            with open(path) as file:
+                self.assertEqual(json.load(file), trace)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
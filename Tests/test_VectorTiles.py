@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+import urllib.request
+import mapbox_vector_tile
+import shapely
+import geopandas as gpd
+from shapely.geometry import Polygon, shape
+from core.infrastructure.VectorTiles import tile_bounds, VectorTileServer, MERCATOR_ORIGIN
+
+
+class TestVectorTiles(unittest.TestCase):
+    """Test tile generation, the disk cache and the local tile server"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.gdf = gpd.GeoDataFrame({
+                'PLZ': [10115, 10117],
+                'Einwohner': [1000, 2000],
+                'geometry': [Polygon([(13.40, 52.50), (13.45, 52.50), (13.45, 52.55), (13.40, 52.55)]),
+                             Polygon([(13.45, 52.50), (13.50, 52.50), (13.50, 52.55), (13.45, 52.55)])]
+        }, crs="EPSG:4326")
+        self.server = VectorTileServer(self.cache_dir, port=0)
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.cache_dir)
+
+    def test_tile_bounds(self):
+        self.assertEqual(tile_bounds(0, 0, 0), (-MERCATOR_ORIGIN, -MERCATOR_ORIGIN, MERCATOR_ORIGIN, MERCATOR_ORIGIN))
+        minx, miny, maxx, maxy = tile_bounds(1, 1, 0)
+        self.assertAlmostEqual(minx, 0.0)
+        self.assertAlmostEqual(miny, 0.0)
+
+    def test_tile_contains_visible_features_and_is_cached(self):
+        layer_id, _ = self.server.register('Einwohner', self.gdf, ['PLZ', 'Einwohner'])
+        source = self.server.sources[layer_id]
+
+        # Tile 10/550/335 covers central Berlin
+        decoded = mapbox_vector_tile.decode(source.get_tile(10, 550, 335))
+        plz = sorted(feature['properties']['PLZ'] for feature in decoded['Einwohner']['features'])
+        self.assertEqual(plz, [10115, 10117])
+        self.assertTrue(os.path.exists(source.tile_path(10, 550, 335)))
+
+        # A tile far away from Berlin contains no features
+        decoded = mapbox_vector_tile.decode(source.get_tile(10, 0, 0))
+        self.assertEqual(decoded.get('Einwohner', {'features': []})['features'], [])
+
+    def test_layer_id_follows_the_geometry(self):
+        # Moved polygons and reordered rows are new layers
+        layer_id, _ = self.server.register('Einwohner', self.gdf, ['PLZ', 'Einwohner'])
+        moved = self.gdf.copy()
+        moved['geometry'] = moved.translate(0.1, 0)
+
+        self.assertEqual(self.server.register('Einwohner', self.gdf.copy(), ['PLZ', 'Einwohner'])[0], layer_id)
+        self.assertNotEqual(self.server.register('Einwohner', moved, ['PLZ', 'Einwohner'])[0], layer_id)
+        self.assertNotEqual(self.server.register('Einwohner', self.gdf.iloc[::-1], ['PLZ', 'Einwohner'])[0], layer_id)
+
+    def test_least_recently_registered_layers_are_evicted(self):
+        server = VectorTileServer(self.cache_dir, port=0, max_sources=2)
+        first, _ = server.register('Einwohner', self.gdf, ['PLZ'])
+        server.sources[first].get_tile(10, 550, 335)
+        second, _ = server.register('Einwohner', self.gdf, ['Einwohner'])
+        server.sources[second].get_tile(10, 550, 335)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, second)))
+        server.register('Einwohner', self.gdf, ['PLZ'])
+        third, _ = server.register('Einwohner', self.gdf, ['PLZ', 'Einwohner'])
+
+        self.assertEqual(list(server.sources), [first, third])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, second)))
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, first)))
+        self.assertIsNone(server.handle_request(f"/{second}/10/550/335.pbf"))
+
+    def test_tiles_are_cut_from_the_pyramid_level_of_their_zoom(self):
+        # Level 8 moves PLZ 10117 away from Berlin, so it is only missing from the coarse tile
+        level = self.gdf.copy()
+        level['geometry'] = level.geometry.where(level['PLZ'] != 10117, level.translate(5, 0))
+        self.server.set_geometry_pyramid({None: self.gdf, 8: level})
+        layer_id, _ = self.server.register('Einwohner', self.gdf, ['PLZ', 'Einwohner'])
+        source = self.server.sources[layer_id]
+
+        decoded = mapbox_vector_tile.decode(source.get_tile(8, 137, 83))
+        self.assertEqual([feature['properties']['PLZ'] for feature in decoded['Einwohner']['features']], [10115])
+        decoded = mapbox_vector_tile.decode(source.get_tile(10, 550, 335))
+        self.assertEqual(len(decoded['Einwohner']['features']), 2)
+
+        # Layers with other polygons, eg. hexagons carrying their dominant PLZ, keep their own geometry
+        hexagons = self.gdf.copy()
+        hexagons['geometry'] = hexagons.scale(0.5, 0.5)
+        hexagon_id, _ = self.server.register('Einwohner', hexagons, ['PLZ', 'Einwohner'])
+        self.assertEqual(list(self.server.sources[hexagon_id].levels), [None])
+
+    def test_shared_borders_stay_shared(self):
+        # Two polygons split by a border with many vertices below the tile resolution, the rings start at different
+        # vertices of the border, so simplifying each polygon on its own would not remove the same vertices
+        border = [(13.45 + 0.0001 * ((i * 7) % 5) / 4, 52.50 + 0.05 * i / 50) for i in range(51)]
+        gdf = gpd.GeoDataFrame({
+                'PLZ': [10115, 10117],
+                'geometry': [Polygon(border[16:] + [(13.40, 52.55), (13.40, 52.50)] + border[:16]),
+                             Polygon([(13.50, 52.50)] + border + [(13.50, 52.55)])]
+        }, crs="EPSG:4326")
+        layer_id, _ = self.server.register('PLZ', gdf, ['PLZ'])
+
+        decoded = mapbox_vector_tile.decode(self.server.sources[layer_id].get_tile(10, 550, 335))
+        polygons = [shape(feature['geometry']) for feature in decoded['PLZ']['features']]
+        self.assertEqual(len(polygons), 2)
+        self.assertTrue(shapely.coverage_is_valid(polygons))
+        self.assertAlmostEqual(shapely.union_all(polygons).area, polygons[0].area + polygons[1].area)
+        self.assertEqual(shapely.union_all(polygons).geom_type, 'Polygon')
+
+    def test_server_answers_tile_requests(self):
+        self.server.start()
+        _, url = self.server.register('Einwohner', self.gdf, ['PLZ', 'Einwohner'])
+
+        with urllib.request.urlopen(url.format(z=10, x=550, y=335)) as response:
+            self.assertEqual(response.headers['Content-Type'], "application/x-protobuf")
+            self.assertIn('Einwohner', mapbox_vector_tile.decode(response.read()))
+
+        with self.assertRaises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://localhost:{self.server.port}/unknown/10/550/335.pbf")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,15 @@
 from unittest import TestCase
 from core.infrastructure.methods import preprop_lstat, sort_by_plz_add_geometry, \
     count_plz_occurrences, preprop_resid, \
-    merge_geo_dataframes
+    merge_geo_dataframes, process_regions, process_regions_incremental, map_view_for_bounds
 import pandas as pd
 import os
+import shutil
+import tempfile
 from pandas.testing import assert_frame_equal
 from config import pdict
 from geopandas.testing import assert_geodataframe_equal
+from core.infrastructure.PipelineCache import PipelineCache, get_pipeline_cache, set_pipeline_cache
 import geopandas as gpd
 
 
@@ -30,11 +33,8 @@ class TestMethods(TestCase):
         dframe2 = df_lstat.loc[:, ['Postleitzahl', 'Bundesland', 'Breitengrad', 'Längengrad', 'Nennleistung Ladeeinrichtung [kW]']]
         dframe2.rename(columns={"Nennleistung Ladeeinrichtung [kW]": "KW", "Postleitzahl": "PLZ"}, inplace=True)
 
-        dframe2['Breitengrad'] = dframe2['Breitengrad'].astype(str)
-        dframe2['Längengrad'] = dframe2['Längengrad'].astype(str)
-        
-        dframe2['Breitengrad'] = dframe2['Breitengrad'].str.replace(',', '.')
-        dframe2['Längengrad'] = dframe2['Längengrad'].str.replace(',', '.')
+        dframe2['Breitengrad'] = pd.to_numeric(dframe2['Breitengrad'].str.replace(',', '.'), errors='coerce')
+        dframe2['Längengrad'] = pd.to_numeric(dframe2['Längengrad'].str.replace(',', '.'), errors='coerce')
 
         dframe3 = dframe2[(dframe2["Bundesland"] == 'Berlin') & 
                       (dframe2["PLZ"] > 10115) &  
@@ -67,6 +67,22 @@ class TestMethods(TestCase):
         result_df = count_plz_occurrences(df)
         assert_frame_equal(result_df, expected_df)
 
+    def test_count_plz_occurences_sums_power(self):
+        """ The power of the stations is summed in the same aggregation """
+        df = pd.DataFrame({
+                'PLZ': [10010, 10010, 10020],
+                'KW': [22.0, 50.0, 11.0],
+                'geometry': ['geom1', 'geom1', 'geom2']
+        })
+        expected_df = pd.DataFrame({
+                'PLZ': [10010, 10020],
+                'Number': [2, 1],
+                'geometry': ['geom1', 'geom2'],
+                'KW': [72.0, 11.0]
+        })
+
+        assert_frame_equal(count_plz_occurrences(df), expected_df)
+
     def test_count_plz_occurences_empty_dataframe(self):
         """Test that no error is thrown with an empty df"""
 
@@ -140,6 +156,16 @@ class TestMethods(TestCase):
         result = merge_geo_dataframes(self.df_charging_stations, self.df_population)
         assert_frame_equal(result, self.expected_output)
 
+    def test_merge_keeps_power_and_area(self):
+        # The demand models need the summed power of the stations and the area of the PLZ
+        dfr = self.dfr.assign(qkm=[1.5, 2.0, 3.5, 8.0])
+        result = preprop_resid(dfr, self.dfg, self.paramdict)
+        self.assertEqual(list(result['qkm']), [1.5, 2.0, 3.5])
+
+        df_charging_stations = self.df_charging_stations.assign(KW=[220.0, 50.0])
+        result = merge_geo_dataframes(df_charging_stations, self.df_population)
+        self.assertEqual(list(result['KW']), [220.0, 50.0, 0.0])
+
     def test_merge_with_empty_charging_stations(self):
         # Case where df_charging_stations is empty
         empty_charging_stations = pd.DataFrame(columns=['PLZ', 'Number'])
@@ -149,6 +175,13 @@ class TestMethods(TestCase):
         result = merge_geo_dataframes(empty_charging_stations, self.df_population)
         assert_frame_equal(result, expected_output)
 
+    def test_merge_does_not_modify_inputs(self):
+        df_charging_stations = self.df_charging_stations.assign(PLZ=self.df_charging_stations['PLZ'].astype(float))
+        expected = df_charging_stations.copy()
+
+        merge_geo_dataframes(df_charging_stations, self.df_population)
+        assert_frame_equal(df_charging_stations, expected)
+
     def test_merge_with_empty_population(self):
         # Case where df_population is empty
         empty_population = pd.DataFrame(columns=['PLZ', 'Population'])
@@ -157,3 +190,108 @@ class TestMethods(TestCase):
 
         result = merge_geo_dataframes(self.df_charging_stations, empty_population)
         assert_frame_equal(result, expected_output)
+
+    def test_process_regions_germany(self):
+        # One station in Berlin, two in Bayern, residents in Berlin, Bayern and a PLZ without stations
+        df_lstat = pd.DataFrame({
+                'Postleitzahl': [10178, 80331, 80331],
+                'Bundesland': ['Berlin', 'Bayern', 'Bayern'],
+                'Breitengrad': ['52,5234', '48,1371', '48,1372'],
+                'Längengrad': ['13,4105', '11,5754', '11,5755'],
+                'Nennleistung Ladeeinrichtung [kW]': [22, 50, 11]
+        })
+        df_residents = pd.DataFrame({
+                'plz': [10178, 80331, 1067],
+                'einwohner': [12000, 9000, 11957],
+                'lat': [52.5234, 48.1371, 51.0602],
+                'lon': [13.4105, 11.5754, 13.7112]
+        })
+        df_geo = pd.DataFrame({
+                'PLZ': [10178, 80331, 1067],
+                'geometry': ["POINT(13.4105 52.5234)", "POINT(11.5754 48.1371)", "POINT(13.7112 51.0602)"]
+        })
+
+        counts, residents = process_regions(df_lstat, df_residents, df_geo, {'geocode': 'PLZ', 'region': 'Deutschland'})
+
+        self.assertEqual(list(counts['PLZ']), [10178, 80331])
+        self.assertEqual(list(counts['Number']), [1, 2])
+        self.assertEqual(list(residents['PLZ']), [1067, 10178, 80331])
+
+        # Berlin only keeps its own PLZ
+        counts, residents = process_regions(df_lstat, df_residents, df_geo, {'geocode': 'PLZ', 'region': 'Berlin'})
+        self.assertEqual(list(counts['PLZ']), [10178])
+        self.assertEqual(list(residents['PLZ']), [10178])
+
+        # 01067 has no stations, its residents belong to Sachsen, the Bundesland of the closest station
+        df_lstat.loc[3] = [1069, 'Sachsen', '51,0382', '13,7334', 22]
+        df_geo.loc[3] = [1069, "POINT(13.7334 51.0382)"]
+        counts, residents = process_regions(df_lstat, df_residents, df_geo, {'geocode': 'PLZ', 'region': 'Sachsen'})
+        self.assertEqual(list(counts['PLZ']), [1069])
+        self.assertEqual(list(residents['PLZ']), [1067])
+
+    def test_process_regions_incremental(self):
+        df_lstat = pd.DataFrame({
+                'Postleitzahl': [10178, 10178, 80331],
+                'Bundesland': ['Berlin', 'Berlin', 'Bayern'],
+                'Breitengrad': [52.5234, 52.5235, 48.1371],
+                'Längengrad': [13.4105, 13.4106, 11.5754],
+                'Nennleistung Ladeeinrichtung [kW]': [22.0, 50.0, 11.0]
+        })
+        df_residents = pd.DataFrame({
+                'plz': [10178, 10245],
+                'einwohner': [12000, 9000],
+                'lat': [52.5234, 52.5000],
+                'lon': [13.4105, 13.4500]
+        })
+        df_geo = pd.DataFrame({
+                'PLZ': [10178, 10245],
+                'geometry': ["POINT(13.4105 52.5234)", "POINT(13.4500 52.5000)"]
+        })
+        cache_dir = tempfile.mkdtemp()
+        try:
+            counts, residents = process_regions_incremental(df_lstat, df_residents, df_geo, {'geocode': 'PLZ'}, cache_dir)
+            self.assertEqual(list(counts['PLZ']), [10178])
+            self.assertEqual(list(counts['Number']), [2])
+            self.assertEqual(list(residents['PLZ']), [10178, 10245])
+
+            # A new station in 10245 is added to the persisted state
+            df_lstat.loc[3] = [10245, 'Berlin', 52.5001, 13.4501, 11.0]
+            counts, _ = process_regions_incremental(df_lstat, df_residents, df_geo, {'geocode': 'PLZ'}, cache_dir)
+            self.assertEqual(list(counts['PLZ']), [10178, 10245])
+            self.assertEqual(list(counts['Number']), [2, 1])
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_process_regions_incremental_is_skipped_on_reruns(self):
+        df_lstat = pd.DataFrame({
+                'Postleitzahl': [10178],
+                'Bundesland': ['Berlin'],
+                'Breitengrad': [52.5234],
+                'Längengrad': [13.4105],
+                'Nennleistung Ladeeinrichtung [kW]': [22.0]
+        })
+        df_residents = pd.DataFrame({'plz': [10178], 'einwohner': [12000], 'lat': [52.5234], 'lon': [13.4105]})
+        df_geo = pd.DataFrame({'PLZ': [10178], 'geometry': ["POINT(13.4105 52.5234)"]})
+        cache_dir = tempfile.mkdtemp()
+        previous_cache = get_pipeline_cache()
+        set_pipeline_cache(PipelineCache(None))
+        try:
+            counts, _ = process_regions_incremental(df_lstat, df_residents, df_geo, {'geocode': 'PLZ'}, cache_dir)
+
+            # The unchanged register isn't diffed again, so the removed state isn't written again
+            shutil.rmtree(os.path.join(cache_dir, 'incremental'))
+            rerun, _ = process_regions_incremental(df_lstat, df_residents, df_geo, {'geocode': 'PLZ'}, cache_dir)
+            assert_geodataframe_equal(rerun, counts)
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, 'incremental')))
+        finally:
+            set_pipeline_cache(previous_cache)
+            shutil.rmtree(cache_dir)
+
+    def test_map_view_for_bounds(self):
+        # Berlin fits into the 800x600px map at zoom 10, Germany at zoom 6
+        location, zoom = map_view_for_bounds((13.09, 52.34, 13.76, 52.68))
+        self.assertEqual(zoom, 10)
+        self.assertAlmostEqual(location[0], 52.51)
+
+        _, zoom = map_view_for_bounds((5.87, 47.27, 15.04, 55.06))
+        self.assertEqual(zoom, 6)
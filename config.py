@@ -1,15 +1,63 @@
 p                           = dict()
 p['picklefolder']           = 'pickles'
+p['cachefolder']            = 'cache'
+
+# Content addressed cache of the pipeline stage results, shared by all sessions and worker processes
+p['pipeline_cache']         = True
+p['pipeline_cache_entries'] = 64
+p['pipeline_cache_bytes']   = 512 * 1024 ** 2
+# Number of rendered map layers (per layer and parameter set) kept in memory
+p['map_cache_entries']      = 16
+
+# Serve the map layers as vector tiles from a local tile server instead of inline GeoJson
+p['tile_server']            = False
+p['tile_server_port']       = 8765
+p['tilefolder']             = 'tiles'
 # -----------------------------------
 
+# Fraction of the function calls logged by the logger decorator (exceptions are always logged)
+# and the longest text logged per argument or result
+p['log_sample_rate']        = 1.0
+p['log_max_chars']          = 200
+
+# Show the recorded spans of every run in the sidebar, tracing memory (tracemalloc) slows the app down
+p['performance_panel']      = False
+p['trace_memory']           = False
+
 p['geocode']                = 'PLZ'
 
+# Region the pipeline runs for: a Bundesland (eg. 'Berlin', 'Bayern') or 'Deutschland' for all of Germany.
+# Only the Berlin PLZ polygons are shipped, other regions need datasets/geodata_plz.csv with the PLZ polygons covering
+# them, in the layout of geodata_berlin_plz.csv (';' separated, columns PLZ and geometry as WKT)
+p['region']                 = 'Berlin'
+
+# 'spatial': charging stations are assigned to the PLZ polygon containing their coordinates,
+# 'register': the Postleitzahl stated in the register is kept (mismatches are flagged either way)
+p['plz_assignment']         = 'spatial'
+
+# Diff a new register against the last ingested one and only recompute the PLZ that changed
+p['incremental_updates']    = False
+
+# Coverage layer: mean distance of the residents to their coverage_k nearest charging stations, averaged over a
+# grid of coverage_grid_km spacing inside each PLZ (None measures from the PLZ centre only)
+p['coverage_layer']         = True
+p['coverage_k']             = 3
+p['coverage_grid_km']       = 0.5
+
+# Aggregate the map on a hexagonal grid (circumradius in km per level) instead of the PLZ polygons,
+# residents are apportioned to the hexagons by area
+p['hex_grid']               = True
+p['hex_sizes_km']           = (8, 4, 2, 1, 0.5) if p['region'] == 'Berlin' else (16, 8, 4, 2)
+
+# Roll the map up to the Berlin districts (Bezirke) through a precomputed PLZ to district area crosswalk
+p['districts']              = p['region'] == 'Berlin'
+
 p["file_lstations"]         = "Ladesaeulenregister.csv"
 # p["file_buildings"]         = "gebaeude.csv"
 p["file_residents"]         = "plz_einwohner.csv"
 # p["file_amounttraf"]        = "Verkehrsaufkommen.csv"
 
-p["file_geodat_plz"]       = "geodata_berlin_plz.csv"
+p["file_geodat_plz"]       = "geodata_berlin_plz.csv" if p['region'] == 'Berlin' else "geodata_plz.csv"
 p["file_geodat_dis"]       = "geodata_berlin_dis.csv"
 
 # p["gebaeude_filter"]        = ["Freistehendes Einzelgebäude", "Doppelhaushälfte"]
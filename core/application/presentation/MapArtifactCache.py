@@ -0,0 +1,105 @@
+# Methods associated with caching the rendered html of the map layers
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+import folium
+import streamlit.components.v1 as components
+from core.infrastructure.PipelineCache import fingerprint
+from core.infrastructure.Tracing import traced, record_cache
+
+
+DEFAULT_MAX_ENTRIES = 16
+
+
+# ------------------------------------------------------------------------
+
+@traced('serialize_map')
+def render_map_html(folium_map):
+    '''
+    Renders a folium map to a standalone html document
+    Inputs: folium_map - the populated folium map
+    Outputs: The html string, identical to what folium_static sends to the browser
+    Postconditions: None
+    '''
+    return folium.Figure().add_child(folium_map).render()
+
+
+def show_map_html(html, width=800, height=600):
+    '''
+    Displays a rendered map in the streamlit app
+    Inputs:
+        - html: the html returned by render_map_html
+        - width, height: size of the map in pixels
+    Outputs: None
+    Postconditions: The map is drawn like folium_static draws it
+    '''
+    components.html(html, height=height + 10, width=width)
+
+
+def map_artifact_key(layer, frame, **params):
+    '''
+    Identifies a rendered layer
+    Inputs:
+        - layer: the name of the layer
+        - frame: the dataframe the layer is drawn from
+        - params: everything else the rendering depends on (map view, demand parameters, ...)
+    Outputs: A hex string
+    Postconditions: None
+    '''
+    return hashlib.sha256(f"{layer}|{fingerprint(frame)}|{fingerprint(params)}".encode()).hexdigest()
+
+
+# ------------------------------------------------------------------------
+
+class MapArtifactCache:
+    '''Bounded LRU cache of rendered map html, shared by all sessions of the process'''
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        '''
+        Looks up a rendered layer
+        Inputs:
+            - key: the key returned by map_artifact_key
+            - render: function without arguments returning the html, called on a miss
+        Outputs: The html of the layer
+        Postconditions: The least recently used layer is evicted once more than max_entries are cached
+        '''
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counts['hits'] += 1
+                record_cache('map', True)
+                return self.entries[key]
+            self.counts['misses'] += 1
+        record_cache('map', False)
+
+        html = render()
+        with self.lock:
+            self.entries[key] = html
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counts['evictions'] += 1
+        return html
+
+    def stats(self):
+        '''Hit/miss metrics: hits, misses, evictions, entries, bytes and hit_rate'''
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return {
+                'hits': self.counts['hits'],
+                'misses': self.counts['misses'],
+                'evictions': self.counts['evictions'],
+                'entries': len(self.entries),
+                'bytes': sum(len(html) for html in self.entries.values()),
+                'hit_rate': self.counts['hits'] / lookups if lookups else 0.0
+            }
+
+    def clear(self):
+        '''Drops every rendered layer, eg. after the data changed'''
+        with self.lock:
+            self.entries.clear()
@@ -6,15 +6,117 @@ import folium
 import streamlit as st
 from streamlit_folium import folium_static
 from branca.colormap import LinearColormap
+from folium.plugins import VectorGridProtobuf
+import numpy as np
 import geopandas as gpd
-from core.domain.demand_methods.DemandMethods import DemandMethod
+import pandas as pd
+from core.domain.demand_methods.DemandMethods import DemandMethod, scenario_demands, EV_PER_RESIDENT, EV_PER_CHARGING_STATION
+from core.domain.demand_methods.DemandModels import DEMAND_MODELS, DEFAULT_DEMAND_MODEL, compute_demand
 
-def create_residents_layer(df_population, folium_map):
+
+# Electric vehicles per resident of the scenario sweep below the demand map
+SCENARIO_EV_PER_RESIDENT = np.round(np.arange(0.005, 0.2001, 0.005), 3)
+
+
+def colormap_hex_colors(color_map, values):
+    '''
+    Evaluates a LinearColormap for a whole vector of values at once
+    Inputs:
+        - color_map: a branca LinearColormap
+        - values: array-like of numeric values
+    Outputs: A numpy array of "#RRGGBBAA" strings, identical to calling color_map(value) for each value
+    Postconditions: None
+    '''
+    values = np.asarray(values, dtype=float)
+    index = np.asarray(color_map.index, dtype=float)
+    colors = np.asarray(color_map.colors, dtype=float)
+
+    if index[0] == index[-1]:
+        rgba = np.repeat(colors[:1], len(values), axis=0)
+    else:
+        rgba = np.column_stack([np.interp(values, index, colors[:, channel]) for channel in range(4)])
+
+    rgba_bytes = (rgba * 255.9999).astype(int)
+    return np.array(["#%02x%02x%02x%02x" % tuple(row) for row in rgba_bytes])
+
+
+# ------------------------------------------------------------------------
+
+def area_key(gdf):
+    '''The column naming the areas of a layer frame: Bezirk for districts, PLZ otherwise (also for hexagons)'''
+    return 'Bezirk' if 'Bezirk' in gdf.columns else 'PLZ'
+
+
+def create_vector_tile_layer(features, value_column, folium_map, tile_server):
+    '''
+    Adds a geodataframe to the map as vector tile layer served by the local tile server
+    Inputs:
+        - features: a geodataframe with the area name (PLZ or Bezirk), value_column, fillColor and geometry
+        - value_column: the name of the column that determines the fill color
+        - folium_map: the folium_map to which the layer is added
+        - tile_server: a running VectorTileServer
+    Outputs: The folium_map with the layer added
+    Postconditions: The features are registered with the tile server, the browser only loads the visible tiles
+    '''
+    _, url = tile_server.register(value_column, features, [area_key(features), value_column, 'fillColor'])
+    options = """{
+        "interactive": true,
+        "vectorTileLayerStyles": {
+            "%s": function(properties, zoom) {
+                return {fill: true, fillColor: properties.fillColor.slice(0, 7), fillOpacity: 0.7, color: "black", weight: 1};
+            }
+        }
+    }""" % value_column
+    VectorGridProtobuf(url, name=value_column, options=options).add_to(folium_map)
+
+    return folium_map
+
+
+# ------------------------------------------------------------------------
+
+def create_choropleth_layer(gdf, value_column, color_map, folium_map, tile_server=None):
+    '''
+    Adds all polygons of a geodataframe to the map as a single GeoJson layer
+    Inputs:
+        - gdf: a geodataframe with the columns PLZ (or Bezirk), geometry and value_column
+        - value_column: the name of the column that determines the fill color
+        - color_map: the LinearColormap used to color the polygons
+        - folium_map: the folium_map to which the layer is added
+        - tile_server: optional running VectorTileServer, if given the polygons are served as vector tiles instead
+    Outputs: The folium_map with the layer added
+    Postconditions: One FeatureCollection is added to the map, the fill color of each feature is stored in
+        its properties and read by a single style function, the tooltip is built from the properties
+    '''
+    key = area_key(gdf)
+    features = gpd.GeoDataFrame(gdf[[key, value_column]].copy(), geometry=gdf['geometry'].values, crs='EPSG:4326')
+    features['fillColor'] = colormap_hex_colors(color_map, gdf[value_column].fillna(color_map.vmin))
+
+    if tile_server is not None:
+        return create_vector_tile_layer(features, value_column, folium_map, tile_server)
+
+    folium.GeoJson(
+        features,
+        style_function=lambda feature: {
+            'fillColor': feature['properties']['fillColor'],
+            'color': 'black',
+            'weight': 1,
+            'fillOpacity': 0.7
+        },
+        tooltip=folium.GeoJsonTooltip(fields=[key, value_column], aliases=[f'{key}:', f'{value_column}:'])
+    ).add_to(folium_map)
+
+    return folium_map
+
+
+# ------------------------------------------------------------------------
+
+def create_residents_layer(df_population, folium_map, tile_server=None):
     '''
     Creates the residents layer
     Inputs:
         - df_population: A geodataframe with location and population information
         - folium_map: The folium map on which to draw the desired population map
+        - tile_server: optional running VectorTileServer that serves the polygons as vector tiles
     Outputs:
         - color_map: a color_map to be added
         - folium_map: the folium_map to be drawn
@@ -24,17 +126,48 @@ def create_residents_layer(df_population, folium_map):
     color_map = LinearColormap(colors=['blue', 'green', 'yellow', 'red'], vmin=df_population['Einwohner'].min(), vmax=df_population['Einwohner'].max())
 
     # Add polygons to the map for Residents
-    for idx, row in df_population.iterrows():
-        folium.GeoJson(
-            row['geometry'],
-            style_function=lambda x, color=color_map(row['Einwohner']): {
-                'fillColor': color,
-                'color': 'black',
-                'weight': 1,
-                'fillOpacity': 0.7
-            },
-            tooltip=f"PLZ: {row['PLZ']}, Einwohner: {row['Einwohner']}"
-        ).add_to(folium_map)
+    folium_map = create_choropleth_layer(df_population, 'Einwohner', color_map, folium_map, tile_server)
+
+    return color_map, folium_map
+
+
+def create_coverage_layer(df_coverage, folium_map, tile_server=None):
+    '''
+    Creates the coverage layer
+    Inputs:
+        - df_coverage: a geodataframe with the PLZ polygons and the mean distance in km to the nearest charging stations (Distance)
+        - folium_map: the empty folium_map to be populated
+        - tile_server: optional running VectorTileServer that serves the polygons as vector tiles
+    Outputs:
+        - color_map: a color_map to be added
+        - folium_map: the folium_map to be drawn
+    Postconditions: The Coverage layer of the folium_map is created, PLZ far from any charging station are red
+    '''
+    distance = df_coverage['Distance'].replace(np.inf, np.nan)
+    color_map = LinearColormap(colors=['green', 'yellow', 'orange', 'red'], vmin=distance.min(), vmax=distance.max(),
+                               caption="Mean distance to the nearest charging stations [km]")
+
+    folium_map = create_choropleth_layer(df_coverage.assign(Distance=distance), 'Distance', color_map, folium_map, tile_server)
+
+    return color_map, folium_map
+
+
+def create_suggestions_layer(df_suggestions, folium_map, tile_server=None):
+    '''
+    Creates the suggestions layer
+    Inputs:
+        - df_suggestions: a geodataframe with the PLZ polygons and the number of submitted suggestions (Suggestions)
+        - folium_map: the empty folium_map to be populated
+        - tile_server: optional running VectorTileServer that serves the polygons as vector tiles
+    Outputs:
+        - color_map: a color_map to be added
+        - folium_map: the folium_map to be drawn
+    Postconditions: The Suggestions layer of the folium_map is created, PLZ with many suggestions are red
+    '''
+    color_map = LinearColormap(colors=['white', 'yellow', 'orange', 'red'], vmin=0, vmax=np.max(df_suggestions['Suggestions'].fillna(0).to_numpy(), initial=1),
+                               caption="Submitted suggestions")
+
+    folium_map = create_choropleth_layer(df_suggestions, 'Suggestions', color_map, folium_map, tile_server)
 
     return color_map, folium_map
 
@@ -56,25 +189,134 @@ def write_demand_formula_to_screen(formula, variables):
     st.latex(variables)
 
 
+def select_demand_parameters():
+    '''
+    Lets the user choose the parameters of the demand formula
+    Inputs: None
+    Outputs: A DemandMethod with the chosen electric vehicles per resident and per charging station
+    Postconditions: Two sliders are drawn in the sidebar
+    '''
+    ev_per_resident = st.sidebar.slider("Electric vehicles per resident", 0.005, 0.2, EV_PER_RESIDENT, step=0.005, format="%.3f")
+    ev_per_charging_station = st.sidebar.slider("Electric vehicles per charging station", 1, 50, EV_PER_CHARGING_STATION)
+    return DemandMethod(ev_per_resident, ev_per_charging_station)
+
+
+def select_aggregation(hex_hierarchy, districts=False):
+    '''
+    Lets the user choose between the PLZ polygons, the districts and the hexagon levels
+    Inputs:
+        - hex_hierarchy: the hierarchy returned by build_hex_hierarchy, None if there are no hexagons
+        - districts: True if the districts (Bezirke) can be chosen
+    Outputs: The chosen hexagon size in km, 'Bezirke' for the districts or None for the PLZ polygons
+    Postconditions: A selectbox is drawn in the sidebar, the PLZ are preselected so all layers are available
+    '''
+    options = [None] + (['Bezirke'] if districts else []) + sorted(hex_hierarchy or {}, reverse=True)
+    return st.sidebar.selectbox("Aggregation", options, index=0,
+                                format_func=lambda option: "PLZ" if option is None else
+                                option if isinstance(option, str) else f"Hexagons ({option:g} km)")
+
+
+def select_demand_model():
+    '''
+    Lets the user choose the demand model
+    Inputs: None
+    Outputs: The name of a model registered in DEMAND_MODELS
+    Postconditions: A selectbox is drawn in the sidebar
+    '''
+    models = list(DEMAND_MODELS)
+    return st.sidebar.selectbox("Demand model", models, index=models.index(DEFAULT_DEMAND_MODEL))
+
+
+def write_demand_model_to_screen(demand_model):
+    '''
+    Writes the description of the demand model below the demand formula
+    Inputs: demand_model - the name of a registered model
+    Outputs: None
+    Postconditions: The description is written to the screen
+    '''
+    st.caption(f"{demand_model}: {DEMAND_MODELS[demand_model]['description']}")
+
+
+def select_new_stations():
+    '''
+    Lets the user choose how many new charging stations are proposed
+    Inputs: None
+    Outputs: The number of new stations, 0 if none are proposed
+    Postconditions: A number input is drawn in the sidebar
+    '''
+    return st.sidebar.number_input("Propose new charging stations", min_value=0, max_value=1000, value=0, step=10)
+
+
+def create_proposals_layer(df_proposals, folium_map):
+    '''
+    Adds the proposed new charging stations to the map
+    Inputs:
+        - df_proposals: the proposals returned by propose_stations
+        - folium_map: the folium_map the markers are added to
+    Outputs: The folium_map with the markers added
+    Postconditions: One marker per proposed site, sites proposed more than once are drawn once with their count
+    '''
+    sites = df_proposals.groupby(['Breitengrad', 'Längengrad'], sort=False).agg(
+        Rank=('Rank', 'min'), Stations=('Rank', 'count'), PLZ=('PLZ', 'first')).reset_index()
+
+    layer = folium.FeatureGroup(name="Proposed charging stations")
+    for site in sites.itertuples(index=False):
+        folium.CircleMarker(
+            location=[site.Breitengrad, site.Längengrad],
+            radius=4 + 2 * min(site.Stations, 5),
+            color='black', weight=1, fill=True, fill_color='lime', fill_opacity=0.9,
+            tooltip=f"Rank {site.Rank}: {site.Stations} new station(s) in PLZ {site.PLZ}"
+        ).add_to(layer)
+    layer.add_to(folium_map)
+
+    return folium_map
+
+
+def show_demand_scenarios(df_merged, demander):
+    '''
+    Draws the missing charging stations for a sweep of electric vehicle adoption
+    Inputs:
+        - df_merged: a dataframe with the number of residents and charging stations per PLZ
+        - demander: the DemandMethod of the chosen parameters, its electric vehicles per charging station are kept
+    Outputs: None
+    Postconditions: A line chart is written to the screen, all scenarios are computed in one broadcast
+    '''
+    demands = scenario_demands(df_merged['Einwohner'].to_numpy(), df_merged['Number'].to_numpy(),
+                               SCENARIO_EV_PER_RESIDENT, demander.ev_per_charging_station)
+    missing = pd.Series(np.clip(demands, 0, None).sum(axis=1), index=SCENARIO_EV_PER_RESIDENT,
+                        name="Missing charging stations")
+    missing.index.name = "Electric vehicles per resident"
+
+    st.text(f"Missing charging stations by electric vehicles per resident "
+            f"({demander.ev_per_charging_station} electric vehicles per charging station)")
+    st.line_chart(missing)
+
+
 # ------------------------------------------------------------------------
 
-def create_demand_layer(df_merged, folium_map):
+def create_demand_layer(df_merged, folium_map, tile_server=None, write_formula=True, demander=None,
+                        demand_model=DEFAULT_DEMAND_MODEL):
     '''
     Creates the demand layer
     Inputs:
         - df_merged: a dataframe containing information about the number of residents and the number of charging stations
             In addition to the geographic data of Berlin
         - folium_map: the empty folium_map to be populated
+        - tile_server: optional running VectorTileServer that serves the polygons as vector tiles
+        - write_formula: if False the demand formula is not written, eg. when the layer is rendered for the map cache
+        - demander: optional DemandMethod with the parameters of the demand formula, by default the original ones
+        - demand_model: name of the model in DEMAND_MODELS the demand is computed with
     Outputs:
         - color_map: a color_map to be added
         - folium_map: the folium_map to be drawn
     Postconditions: The Demand layer of the folium_map is created
     '''
     # Create DemandMethod Object
-    demander = DemandMethod()
+    if demander is None:
+        demander = DemandMethod()
     
     # Implement Demand
-    df_merged['Demand'] = demander.robert_demands(df_merged['Einwohner'], df_merged['Number'])
+    df_merged['Demand'] = compute_demand(demand_model, df_merged, demander)
         
     # Create colormap for demand
     mininmum_demand = df_merged['Demand'].min()
@@ -87,32 +329,25 @@ def create_demand_layer(df_merged, folium_map):
     color_map = color_map.scale(vmin=mininmum_demand, vmax=maximum_demand)
 
     # Add polygons to the map for Demand
-    for idx, row in df_merged.iterrows():
-        folium.GeoJson(
-            row['geometry'],
-            style_function=lambda x, color=color_map(row['Demand']): {
-                'fillColor': color,
-                'color': 'black',
-                'weight': 1,
-                'fillOpacity': 0.7
-            },
-            tooltip=f"PLZ: {row['PLZ']}, Demand: {row['Demand']}"
-        ).add_to(folium_map)
+    folium_map = create_choropleth_layer(df_merged, 'Demand', color_map, folium_map, tile_server)
             
     # Write DemandMethod formula to screen
-    write_demand_formula_to_screen(demander.latex_formula, demander.latex_variables)
+    if write_formula:
+        write_demand_formula_to_screen(demander.latex_formula, demander.latex_variables)
+        write_demand_model_to_screen(demand_model)
 
     return color_map, folium_map
 
 # -----------------------------------------------------------------------
 
-def create_charging_stations_layer(df_merged, folium_map):
+def create_charging_stations_layer(df_merged, folium_map, tile_server=None):
     '''
     Creates the charging stations layer of the map
     Inputs: 
         - df_merged: a dataframe containing information about the number of residents and the number of charging stations
             in addition to the geographic data of Berlin
         - folium_map: the empty folium_map to be populated
+        - tile_server: optional running VectorTileServer that serves the polygons as vector tiles
     Outputs:
         - color_map: a color_map to be added
         - folium_map: the folium_map to be drawn
@@ -122,17 +357,7 @@ def create_charging_stations_layer(df_merged, folium_map):
     color_map = LinearColormap(colors=['blue', 'green', 'yellow', 'orange', 'red', 'magenta'], vmin=df_merged['Number'].min(), vmax=df_merged['Number'].max())
 
     # Add polygons to the map for Numbers
-    for idx, row in df_merged.iterrows():
-        folium.GeoJson(
-            row['geometry'],
-            style_function=lambda x, color=color_map(row['Number']): {
-                'fillColor': color,
-                'color': 'black',
-                'weight': 1,
-                'fillOpacity': 0.7
-            },
-            tooltip=f"PLZ: {row['PLZ']}, Number: {row['Number']}"
-        ).add_to(folium_map)
+    folium_map = create_choropleth_layer(df_merged, 'Number', color_map, folium_map, tile_server)
 
     return color_map, folium_map
 
@@ -0,0 +1,23 @@
+# Methods associated with the performance panel of the streamlit app
+import json
+import streamlit as st
+from core.infrastructure.Tracing import spans_to_frame, to_chrome_trace
+
+
+# ------------------------------------------------------------------------
+
+def show_performance_panel(tracer):
+    '''
+    Shows the spans of the current run in the sidebar
+    Inputs: tracer - the Tracer that recorded the run
+    Outputs: None
+    Postconditions: A table of the finished spans and a download of the Chrome trace are added to the sidebar
+    '''
+    spans = tracer.current_trace()
+    with st.sidebar.expander("Performance"):
+        if not spans:
+            st.text("No spans recorded yet.")
+            return
+        st.dataframe(spans_to_frame(spans), hide_index=True)
+        st.download_button("Download trace", json.dumps(to_chrome_trace(spans)),
+                           file_name="trace.json", mime="application/json")
@@ -1,15 +1,20 @@
 # Methods associated suggestions that help deploy the streamlit app
 
 import streamlit as st
-from core.domain.suggestions_methods.SuggestionsMethods import load_suggestions, save_suggestions, clear_suggestions_file
+from core.domain.suggestions_methods.SuggestionsMethods import clear_suggestions_file
+from core.domain.suggestions_methods.SuggestionsStore import open_suggestions_store, PAGE_SIZE
+from core.domain.suggestions_methods.PostalCodeIndex import PostalCodeIndex
 
 
-def submit_a_suggestion(VALID_POSTAL_CODES):
+def submit_a_suggestion(VALID_POSTAL_CODES, store = None):
     '''
-    Writes to the JSON file a suggestion that the user wants to submit
-    Inputs: VALID_POSTAL_CODES - a list of the postal codes contained in our data
+    Appends a suggestion that the user wants to submit to the suggestions store
+    Inputs:
+        - VALID_POSTAL_CODES - the PostalCodeIndex (or a list) of the postal codes contained in our data
+        - store: the SuggestionsStore, the default store is opened if None
     Outputs: None
-    Postcondition: The suggestion file is written and the streamlit app is deployed
+    Postcondition: The suggestion is appended to the store and the streamlit app is deployed,
+        the nearest valid postal codes are proposed for an invalid one
     '''
     st.sidebar.header("Submit Your Suggestion")
     
@@ -20,61 +25,79 @@ def submit_a_suggestion(VALID_POSTAL_CODES):
     # Button to submit the suggestion
     if st.sidebar.button("Submit Suggestion"):
         if suggestion.strip() and postal_code.strip():  # Check if the suggestion is not empty
+            if not isinstance(VALID_POSTAL_CODES, PostalCodeIndex):
+                VALID_POSTAL_CODES = PostalCodeIndex(VALID_POSTAL_CODES)
             if postal_code.strip() in VALID_POSTAL_CODES:
-                st.session_state["suggestions"].append({
-                    "Text": suggestion.strip(),
-                    "PLZ": postal_code.strip()})
-                save_suggestions(st.session_state["suggestions"])  # Save to file
+                store = store or open_suggestions_store()
+                store.append(suggestion.strip(), postal_code.strip())  # Append to the store
                 st.sidebar.success("Thank you for your suggestion!")
             else:
                 st.sidebar.error("Invalid PLZ.")
+                proposals = VALID_POSTAL_CODES.nearest(postal_code)
+                if proposals:
+                    st.sidebar.info(f"Did you mean {' or '.join(proposals)}?")
         else:
             st.sidebar.warning("Suggestion and PLZ cannot be empty.")
 
 
 # ----------------------------------------------------------------------
 
-def view_suggestions():
+def view_suggestions(store = None):
     '''
-    Allows the user to view suggestions and filter by PLZ
-    Inputs: None
+    Allows the user to view suggestions page by page, filter them by PLZ and search their text
+    Inputs: store - the SuggestionsStore, the default store is opened if None
     Outputs: None
-    Postconditions: The session state suggestions is read and the suggestions are displayed
-        with the option to filter by PLZ
+    Postconditions: One page of the suggestions matching the filters is read from the store and displayed,
+        the cursors of the visited pages are kept in the session state. The suggestions are only counted for a filter,
+        the total is read from the materialized counts per PLZ
     '''
     st.sidebar.header("Suggestions List")
+    store = store or open_suggestions_store()
+    total = store.total()
     
-    if st.session_state["suggestions"]:
-        # Input for filtering by postal code
-        filter_postal_code = st.sidebar.text_input("Filter by postal code")
- 
-        # Filter or sort suggestions based on postal code
-        filtered_suggestions = (
-            sorted(st.session_state["suggestions"], key = lambda x: x["PLZ"])
-            if not filter_postal_code
-            else [
-                s for s in st.session_state["suggestions"]
-                if s["PLZ"] == filter_postal_code.strip()
-            ]
-        )
+    if total:
+        # Inputs for filtering by postal code and searching the text
+        filter_postal_code = st.sidebar.text_input("Filter by postal code (eg. 10115 or 130*)").strip()
+        search_text = st.sidebar.text_input("Search suggestions").strip()
+
+        # A new query starts at the first page
+        query = (filter_postal_code, search_text)
+        if st.session_state.get("suggestions_query") != query:
+            st.session_state["suggestions_query"] = query
+            st.session_state["suggestions_cursors"] = [None]
+        cursors = st.session_state["suggestions_cursors"]
+
+        page, next_cursor = store.query(filter_postal_code, search_text, after = cursors[-1], limit = PAGE_SIZE)
             
-        # Display each suggestion
-        if filtered_suggestions:
-            for i, suggestion in enumerate(filtered_suggestions, 1):
+        # Display each suggestion of the page
+        if page:
+            first = (len(cursors) - 1) * PAGE_SIZE
+            matching = store.count(filter_postal_code, search_text) if filter_postal_code or search_text else total
+            st.sidebar.caption(f"Suggestions {first + 1} to {first + len(page)} of {matching}")
+            for i, suggestion in enumerate(page, first + 1):
                 st.sidebar.write(f"{i}. {suggestion['Text']} - PLZ: {suggestion['PLZ']}")
         else:
-            st.sidebar.info("No suggestions match the given postal code.")
+            st.sidebar.info("No suggestions match the given postal code or text.")
+
+        # Page navigation
+        previous_column, next_column = st.sidebar.columns(2)
+        if previous_column.button("Previous", disabled = len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if next_column.button("Next", disabled = next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
     else:
         st.sidebar.info("No suggestions have been submitted yet.")
 
 # -----------------------------------------------------------------------
 
-def clear_suggestions():
+def clear_suggestions(store = None):
     '''
-    Takes a user password, and when correct, wipes the JSON file storing suggestions
-    Inputs: None
+    Takes a user password, and when correct, wipes the store of the suggestions
+    Inputs: store - the SuggestionsStore, the default store is opened if None
     Outputs: None
-    Postconditions: The JSON file storing suggestions is cleared and the session state is updated if the password is correct
+    Postconditions: The suggestions store is cleared if the password is correct
     '''
     st.sidebar.header("Input the Admin Password To Clear Suggestions")
         
@@ -82,6 +105,5 @@ def clear_suggestions():
     password_input = str(st.sidebar.text_input("Password:", type="password").strip())
         
     # Clear suggestions & Update state
-    clear_suggestions_file(password_input)
+    clear_suggestions_file(password_input, store = store or open_suggestions_store())
     st.sidebar.empty()
-    st.session_state["suggestions"] = load_suggestions()
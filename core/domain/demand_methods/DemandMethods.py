@@ -1,8 +1,59 @@
 # Functions associated with the demand geovisualizer
+import numpy as np
+import pandas as pd
 from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.Tracing import traced
+
+
+# Electric vehicles per resident and electric vehicles per charging station of the original formula
+EV_PER_RESIDENT = 0.01
+EV_PER_CHARGING_STATION = 10
+
+
+def _as_counts(values):
+    '''
+    Converts residents or charging station counts to a float array
+    Inputs: values - array-like of counts
+    Outputs: A float numpy array
+    Postconditions: Raises a TypeError for non-numeric and a ValueError for missing, infinite or negative values.
+        A single min() replaces the elementwise comparison frames of the former check
+    '''
+    values = np.asarray(values)
+    if values.dtype.kind not in 'biuf':
+        raise TypeError(f"Incorrect input type: The number of residents and the number of charging stations "
+                        f"must be numeric, not {values.dtype}.")
+    if values.dtype.kind == 'f' and not np.isfinite(values).all():
+        raise ValueError("Incorrect input value: The number of residents and the number of "
+                         "charging stations must be finite numbers.")
+    if values.size and values.min() < 0:
+        raise ValueError("Incorrect input value: The number of residents and the number of "
+                         "charging stations must be be non-negative.")
+    return values.astype(float, copy=False)
+
+
+def scenario_demands(residents, stations, ev_per_resident=EV_PER_RESIDENT, ev_per_charging_station=EV_PER_CHARGING_STATION):
+    '''
+    Calculates the charging station demand of several scenarios at once
+    Inputs:
+        - residents: residents per postal code, array-like of length n
+        - stations: charging stations per postal code, array-like of length n
+        - ev_per_resident: electric vehicles per resident, a scalar or an array of scenarios
+        - ev_per_charging_station: electric vehicles per charging station, a scalar or an array of scenarios
+    Outputs: An integer array of shape (*scenarios, n), the scenario shape is the broadcast of both parameter shapes,
+        scalar parameters give an array of shape (n,)
+    Postconditions: All scenarios are evaluated in one numpy broadcast, eg. pass both parameters of np.meshgrid for a full grid
+    '''
+    residents = _as_counts(residents)
+    stations = _as_counts(stations)
+
+    ratio = np.asarray(ev_per_resident, dtype=float) / np.asarray(ev_per_charging_station, dtype=float)
+    ratio = ratio.reshape(ratio.shape + (1,) * residents.ndim)
+    return np.round(ratio * residents - stations).astype(int)
+
 
 class DemandMethod:
-    
+
     latex_formula = r"\text{Demand} = \frac{\text{EV}\cdot \text{P}}{\text{EVPCS}} - \text{CS}\newline\newline"
     latex_variables = r"""
         \\
@@ -16,29 +67,40 @@ class DemandMethod:
         \text{CS} = \text{Charging stations that exist in the PLZ}
         \end{array}
     """
-    
-    
+
+    def __init__(self, ev_per_resident=EV_PER_RESIDENT, ev_per_charging_station=EV_PER_CHARGING_STATION):
+        if ev_per_resident < 0 or ev_per_charging_station <= 0:
+            raise ValueError("Electric vehicles per resident must be non-negative and electric vehicles per "
+                             "charging station must be positive.")
+        self.ev_per_resident = ev_per_resident
+        self.ev_per_charging_station = ev_per_charging_station
+
+    @traced('demand')
     @logger_decorator
+    @pipeline_stage('robert_demands')
     def robert_demands(self, gdf_residents_preprocessed, gdf_charging_station_counts):
         """
         Calculates Charging Station Demand per Postal Code
         Inputs: gdf_residents_preprocessed - residents vector; gdf_charging_station_counts - charging station counts vector
-        Outputs: Vector of charging station demand as integers using the formula (0.01 * station counts / 10) - residents
+        Outputs: Vector of charging station demand as integers using the formula (EV * residents / EVPCS) - station counts
         Postconditions: None
 
         Formula: (EV * P / EVPCS) - CS
         with:
-        EV = Electric Vehicles per resident (currently 0.01)
+        EV = Electric Vehicles per resident (ev_per_resident, by default 0.01)
         P = Population per postal code
-        EVPCS = Electric Vehicles per Charging Station (recommended are 10)
+        EVPCS = Electric Vehicles per Charging Station (ev_per_charging_station, recommended are 10)
         CS = Charging Stations that already exist in the postal code area
 
         """
-        # Check if the input values are correct
-        if (gdf_residents_preprocessed < 0).any().any() or (gdf_charging_station_counts < 0).any().any():
-            raise ValueError("Incorrect input value: The number of residents and the number of "
-                             "charging stations must be be non-negative.")
+        # Both vectors are aligned on their index like the former .sub, postal codes missing in one of them become NaN
+        residents, stations = gdf_residents_preprocessed.align(gdf_charging_station_counts, join='outer')
+
+        # The inputs are checked for missing and negative values in scenario_demands
+        demand = scenario_demands(residents.to_numpy(), stations.to_numpy(), self.ev_per_resident, self.ev_per_charging_station)
 
-        return round(((0.01 * gdf_residents_preprocessed) / 10).sub(gdf_charging_station_counts),0).astype(int)
+        if isinstance(residents, pd.DataFrame):
+            return pd.DataFrame(demand, index=residents.index, columns=residents.columns)
+        return pd.Series(demand, index=residents.index, name=residents.name)
 
 
@@ -0,0 +1,115 @@
+# Registry of the demand models selectable in the demand layer
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+from scipy.spatial import cKDTree
+from core.domain.demand_methods.DemandMethods import DemandMethod
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.Tracing import traced
+
+
+# Power of a standard AC charging point, the capacity model counts stations in multiples of it
+REFERENCE_KW = 22
+
+# The density weight is sqrt(density / median density), bounded to this range
+DENSITY_WEIGHT_BOUNDS = (0.5, 2.0)
+
+# Distance in km at which a charging station still covers 1/e of the demand, stations further than
+# DECAY_CUTOFF decay lengths away are ignored
+DECAY_KM = 2.0
+DECAY_CUTOFF = 3
+
+KM_PER_DEGREE = 111.32
+
+DEMAND_MODELS = {}
+DEFAULT_DEMAND_MODEL = "Charging stations"
+
+
+def register_demand_model(name, description):
+    '''
+    Adds a demand model to the registry
+    Inputs:
+        - name: the name shown in the model selection
+        - description: a short explanation written below the demand formula
+    Outputs: A decorator for functions (df_merged, demander) -> demand per PLZ as a float array
+    Postconditions: The model can be selected in the app and passed to compute_demand
+    '''
+    def decorator(func):
+        DEMAND_MODELS[name] = {'function': func, 'description': description}
+        return func
+    return decorator
+
+
+def _required_stations(df_merged, demander):
+    '''Charging stations needed by the residents of each PLZ, EV * P / EVPCS'''
+    return demander.ev_per_resident * df_merged['Einwohner'].to_numpy(dtype=float) / demander.ev_per_charging_station
+
+
+# ------------------------------------------------------------------------
+
+@register_demand_model("Charging stations", "Every charging station counts the same, regardless of its power.")
+def station_demand(df_merged, demander):
+    return demander.robert_demands(df_merged['Einwohner'], df_merged['Number']).to_numpy(dtype=float)
+
+
+@register_demand_model("Charging capacity (kW)",
+                       f"Existing charging stations count by their summed power, in units of {REFERENCE_KW} kW.")
+def capacity_demand(df_merged, demander):
+    power = df_merged['KW'].to_numpy(dtype=float) if 'KW' in df_merged.columns else REFERENCE_KW * df_merged['Number'].to_numpy(dtype=float)
+    return _required_stations(df_merged, demander) - power / REFERENCE_KW
+
+
+@register_demand_model("Population density",
+                       "Densely populated PLZ rely more on public charging, the need is weighted by the square root of the "
+                       "population density relative to the median.")
+def density_demand(df_merged, demander):
+    weight = np.ones(len(df_merged))
+    if 'qkm' in df_merged.columns:
+        density = df_merged['Einwohner'].to_numpy(dtype=float) / df_merged['qkm'].to_numpy(dtype=float)
+        density[~np.isfinite(density)] = np.nan
+        if not np.isnan(density).all():
+            weight = np.nan_to_num(np.sqrt(density / np.nanmedian(density)), nan=1.0)
+    return _required_stations(df_merged, demander) * np.clip(weight, *DENSITY_WEIGHT_BOUNDS) - df_merged['Number'].to_numpy(dtype=float)
+
+
+@register_demand_model("Distance decay",
+                       f"Charging stations of neighbouring PLZ also cover the demand, weighted by exp(-distance / {DECAY_KM:g} km).")
+def distance_decay_demand(df_merged, demander):
+    stations = df_merged['Number'].to_numpy(dtype=float)
+    if len(df_merged) == 0:
+        return stations
+
+    # Centroids in km of an equirectangular projection around the mean latitude
+    centroids = shapely.centroid(np.asarray(df_merged.geometry.values))
+    lon, lat = shapely.get_x(centroids), shapely.get_y(centroids)
+    points = np.column_stack([lon * np.cos(np.radians(np.nanmean(lat))), lat]) * KM_PER_DEGREE
+
+    # Sparse kernel of all pairs of different PLZ within the cutoff, the PLZ itself is added with weight 1
+    tree = cKDTree(points)
+    pairs = tree.sparse_distance_matrix(tree, DECAY_KM * DECAY_CUTOFF, output_type='coo_matrix')
+    neighbours = pairs.row != pairs.col
+    kernel = sparse.csr_matrix((np.exp(-pairs.data[neighbours] / DECAY_KM), (pairs.row[neighbours], pairs.col[neighbours])),
+                               shape=pairs.shape)
+    supply = stations + kernel @ stations
+    return _required_stations(df_merged, demander) - supply
+
+
+# ------------------------------------------------------------------------
+
+@traced('demand_model')
+@pipeline_stage('compute_demand')
+def compute_demand(model, df_merged, demander=None):
+    '''
+    Calculates the charging station demand per PLZ with a registered model
+    Inputs:
+        - model: name of a model in DEMAND_MODELS
+        - df_merged: the merged residents and charging station counts (PLZ, Einwohner, Number, optionally KW, qkm and geometry)
+        - demander: optional DemandMethod with the electric vehicles per resident and per charging station
+    Outputs: A series of integer demands aligned with df_merged
+    Postconditions: The result is cached per model and parameters, the station counts are aggregated once before
+    '''
+    if model not in DEMAND_MODELS:
+        raise ValueError(f"Unknown demand model {model}, choose one of {', '.join(DEMAND_MODELS)}")
+    demand = DEMAND_MODELS[model]['function'](df_merged, demander or DemandMethod())
+    return pd.Series(np.round(demand).astype(int), index=df_merged.index, name='Demand')
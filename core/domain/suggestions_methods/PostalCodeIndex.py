@@ -0,0 +1,150 @@
+# Methods associated with validating the postal codes of the suggestions
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from core.infrastructure.PipelineCache import fingerprint
+
+
+# Dataset versions whose index is kept, older ones are evicted
+MAX_INDEXES = 4
+
+# Number of valid postal codes proposed for a typo
+DEFAULT_SUGGESTIONS = 3
+
+_DIGITS = "0123456789"
+
+# Digits of a German postal code, numeric codes lose their leading zeros (eg. 01067 in Dresden)
+POSTAL_CODE_DIGITS = 5
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+# ----------------------------------------------------------------------
+def normalize_postal_code(plz):
+    '''
+    Converts a postal code to the string it is stored and looked up as
+    Inputs: plz - a postal code as string or number
+    Outputs: The stripped string, numbers are padded with leading zeros to five digits (1067 becomes "01067")
+    Postconditions: None
+    '''
+    if isinstance(plz, (float, np.floating)) and float(plz).is_integer():
+        plz = int(plz)
+    if isinstance(plz, (int, np.integer)) and not isinstance(plz, (bool, np.bool_)):
+        return str(plz).zfill(POSTAL_CODE_DIGITS)
+    return str(plz).strip()
+
+
+def postal_code_strings(postal_codes):
+    '''
+    Converts many postal codes like normalize_postal_code
+    Inputs: postal_codes - a series or array-like of postal codes
+    Outputs: A series of strings, with the index of postal_codes if it is a series
+    Postconditions: Integer columns are converted in one vectorized zfill
+    '''
+    if not isinstance(postal_codes, pd.Series):
+        postal_codes = pd.Series(postal_codes if isinstance(postal_codes, np.ndarray) else list(postal_codes))
+    if pd.api.types.is_integer_dtype(postal_codes) and not postal_codes.hasnans:
+        return postal_codes.astype(str).str.zfill(POSTAL_CODE_DIGITS)
+    return postal_codes.map(normalize_postal_code).astype(object)
+
+
+# ----------------------------------------------------------------------
+class PostalCodeIndex:
+    '''Immutable lookup of the valid postal codes: a frozenset and the sorted codes for vectorized and nearest lookups'''
+
+    def __init__(self, postal_codes):
+        self.codes = np.unique(np.asarray(postal_code_strings(postal_codes).tolist(), dtype=str))
+        self.codes.flags.writeable = False
+        self._set = frozenset(self.codes.tolist())
+
+        # Numeric codes for the numerically nearest postal codes
+        numeric = np.array([_is_number(code) for code in self.codes.tolist()], dtype=bool)
+        values = self.codes[numeric].astype(np.int64)
+        order = np.argsort(values, kind='stable')
+        self._values, self._numeric_codes = values[order], self.codes[numeric][order]
+
+    def __contains__(self, plz):
+        return normalize_postal_code(plz) in self._set
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.codes.tolist())
+
+    def contains(self, postal_codes):
+        '''
+        Validates many postal codes at once
+        Inputs: postal_codes - array-like of postal codes
+        Outputs: A boolean numpy array, True where the postal code is valid
+        Postconditions: The codes are looked up with one binary search over the sorted codes
+        '''
+        values = np.asarray(postal_code_strings(postal_codes).tolist(), dtype=str)
+        if len(self.codes) == 0:
+            return np.zeros(values.shape, dtype=bool)
+        position = np.minimum(np.searchsorted(self.codes, values), len(self.codes) - 1)
+        return self.codes[position] == values
+
+    def nearest(self, plz, n=DEFAULT_SUGGESTIONS):
+        '''
+        Proposes valid postal codes for a mistyped one
+        Inputs:
+            - plz: the invalid postal code
+            - n: maximal number of proposals
+        Outputs: A list of valid postal codes, the closest first
+        Postconditions: Postal codes one typo away (a wrong, missing, extra or swapped digit) are preferred, sorted by
+            their numeric distance. If there are none, the numerically nearest postal codes are proposed
+        '''
+        plz = normalize_postal_code(plz)
+        candidates = [code for code in _one_typo_away(plz) if code in self._set and code != plz]
+        target = int(plz) if _is_number(plz) else None
+        if target is not None:
+            candidates.sort(key=lambda code: (abs(int(code) - target) if _is_number(code) else np.inf, code))
+        if candidates or target is None or len(self._values) == 0:
+            return candidates[:n]
+
+        position = np.searchsorted(self._values, target)
+        window = np.arange(max(position - n, 0), min(position + n, len(self._values)))
+        closest = window[np.argsort(np.abs(self._values[window] - target), kind='stable')]
+        return self._numeric_codes[closest[:n]].tolist()
+
+
+def _is_number(text):
+    '''True if text consists of ASCII digits only, str.isdigit also accepts eg. superscripts int() can't parse'''
+    return text.isascii() and text.isdecimal()
+
+
+def _one_typo_away(plz):
+    '''All strings one wrong, missing, extra or swapped digit away from plz, without duplicates'''
+    splits = [(plz[:i], plz[i:]) for i in range(len(plz) + 1)]
+    deletes = [left + right[1:] for left, right in splits if right]
+    swaps = [left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1]
+    replaces = [left + digit + right[1:] for left, right in splits if right for digit in _DIGITS]
+    inserts = [left + digit + right for left, right in splits for digit in _DIGITS]
+    return list(dict.fromkeys(deletes + swaps + replaces + inserts))
+
+
+# ----------------------------------------------------------------------
+def get_postal_code_index(df, column='PLZ'):
+    '''
+    Looks up the postal code index of a dataset, shared by all sessions of the process
+    Inputs:
+        - df: the dataframe with the valid postal codes
+        - column: the postal code column
+    Outputs: The PostalCodeIndex of the column
+    Postconditions: The index is built once per dataset version (the fingerprint of df), streamlit reruns reuse it.
+        At most MAX_INDEXES versions are kept
+    '''
+    key = (fingerprint(df), column)
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = PostalCodeIndex(df[column])
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return index
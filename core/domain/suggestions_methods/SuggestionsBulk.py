@@ -0,0 +1,154 @@
+# Methods associated with importing and exporting suggestions in bulk,
+# run with: python -m core.domain.suggestions_methods.SuggestionsBulk import suggestions.csv --db datasets/suggestions.db
+import argparse
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.Tracing import traced
+from core.domain.suggestions_methods.SuggestionsStore import SuggestionsStore, SUGGESTIONS_DB, BATCH_SIZE
+from core.domain.suggestions_methods.PostalCodeIndex import PostalCodeIndex, normalize_postal_code
+
+
+# File formats by suffix
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+# ----------------------------------------------------------------------
+def file_format(path, fmt=None):
+    '''The format of a suggestions file, "csv" or "jsonl", given or derived from the suffix'''
+    fmt = fmt or FORMATS.get(Path(path).suffix.lower())
+    if fmt not in FORMATS.values():
+        raise ValueError(f"Unknown format of {path}, use one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def read_suggestion_batches(path, fmt=None, batch_size=BATCH_SIZE):
+    '''
+    Reads a suggestions file batch by batch
+    Inputs:
+        - path: a csv file with the columns PLZ and Text or a jsonl file with one {"Text", "PLZ"} object per line
+        - fmt: "csv" or "jsonl", derived from the suffix if None
+        - batch_size: number of suggestions per batch
+    Outputs: A generator of dataframes with the string columns Text and PLZ
+    Postconditions: Only one batch is in memory. Missing values and lines that aren't JSON objects become empty strings
+    '''
+    if file_format(path, fmt) == 'csv':
+        for chunk in pd.read_csv(path, usecols=['PLZ', 'Text'], dtype=str, keep_default_na=False, chunksize=batch_size):
+            yield chunk[['Text', 'PLZ']].reset_index(drop=True)
+        return
+
+    with open(path, "r", encoding="utf-8") as file:
+        while True:
+            lines = list(islice(file, batch_size))
+            if not lines:
+                return
+            yield pd.DataFrame([_parse_line(line) for line in lines], columns=['Text', 'PLZ'])
+
+
+def _parse_line(line):
+    '''Text and PLZ of one jsonl line'''
+    try:
+        suggestion = json.loads(line)
+    except json.JSONDecodeError:
+        return "", ""
+    if not isinstance(suggestion, dict):
+        return "", ""
+    text, plz = suggestion.get('Text'), suggestion.get('PLZ')
+    return "" if text is None else str(text), "" if plz is None else normalize_postal_code(plz)
+
+
+def valid_suggestions(batch, postal_codes=None):
+    '''
+    Validates a batch of suggestions
+    Inputs:
+        - batch: a dataframe with the string columns Text and PLZ
+        - postal_codes: optional PostalCodeIndex of the valid postal codes
+    Outputs: A boolean numpy array, True for suggestions with a text and a (valid) PLZ
+    Postconditions: The columns are stripped in place, the postal codes are validated with one vectorized lookup
+    '''
+    batch['Text'] = batch['Text'].str.strip()
+    batch['PLZ'] = batch['PLZ'].str.strip()
+    valid = (batch['Text'] != "").to_numpy() & (batch['PLZ'] != "").to_numpy()
+    if postal_codes is not None:
+        valid &= postal_codes.contains(batch['PLZ'].to_numpy())
+    return valid
+
+
+# ----------------------------------------------------------------------
+@traced('suggestions.import')
+@logger_decorator
+def import_suggestions(path, store, postal_codes=None, fmt=None, batch_size=BATCH_SIZE):
+    '''
+    Imports a suggestions file into the store
+    Inputs:
+        - path: a csv or jsonl file, see read_suggestion_batches
+        - store: the SuggestionsStore
+        - postal_codes: optional PostalCodeIndex, suggestions about other postal codes are rejected
+        - fmt: "csv" or "jsonl", derived from the suffix if None
+        - batch_size: number of suggestions read, validated and written at once
+    Outputs: A dictionary with the number of suggestions read, invalid, duplicates and imported
+    Postconditions: Every batch is written in one transaction, suggestions whose content is already stored (also
+        earlier in the file) are skipped. The memory is bounded by the batch size, not by the size of the file
+    '''
+    stats = {'read': 0, 'invalid': 0, 'duplicates': 0, 'imported': 0}
+    for batch in read_suggestion_batches(path, fmt, batch_size):
+        valid = valid_suggestions(batch, postal_codes)
+        imported = store.append_many(zip(batch['Text'].to_numpy()[valid], batch['PLZ'].to_numpy()[valid]))
+        stats['read'] += len(batch)
+        stats['invalid'] += int(np.count_nonzero(~valid))
+        stats['duplicates'] += int(np.count_nonzero(valid)) - imported
+        stats['imported'] += imported
+    return stats
+
+
+@traced('suggestions.export')
+@logger_decorator
+def export_suggestions(store, path, fmt=None, batch_size=BATCH_SIZE):
+    '''
+    Exports all suggestions of the store
+    Inputs:
+        - store: the SuggestionsStore
+        - path: the csv or jsonl file written
+        - fmt: "csv" or "jsonl", derived from the suffix if None
+        - batch_size: number of suggestions read from the store at once
+    Outputs: The number of exported suggestions
+    Postconditions: The suggestions are written in the order they were submitted, in the format read by
+        import_suggestions. Only one batch is in memory
+    '''
+    fmt, exported = file_format(path, fmt), 0
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file) if fmt == 'csv' else None
+        if writer is not None:
+            writer.writerow(['PLZ', 'Text'])
+        for batch in store.iter_batches(batch_size):
+            if writer is not None:
+                writer.writerows((suggestion['PLZ'], suggestion['Text']) for suggestion in batch)
+            else:
+                file.writelines(json.dumps(suggestion, ensure_ascii=False) + "\n" for suggestion in batch)
+            exported += len(batch)
+    return exported
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Imports or exports suggestions as csv (PLZ, Text) or jsonl files")
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('file')
+    parser.add_argument('--db', default=SUGGESTIONS_DB)
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), default=None)
+    parser.add_argument('--postal-codes', default=None, help="csv file with the valid postal codes, eg. datasets/plz_einwohner.csv")
+    parser.add_argument('--column', default='plz', help="postal code column of the --postal-codes file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    suggestions_store = SuggestionsStore(args.db)
+    if args.command == 'import':
+        index = None if args.postal_codes is None else \
+            PostalCodeIndex(pd.read_csv(args.postal_codes, usecols=[args.column], dtype=str, sep=None, engine='python')[args.column])
+        for name, value in import_suggestions(args.file, suggestions_store, index, args.format, args.batch_size).items():
+            print(f"{name}: {value}")
+    else:
+        print(f"exported: {export_suggestions(suggestions_store, args.file, args.format, args.batch_size)}")
@@ -25,15 +25,20 @@ def overwrite_file(suggestion_file = SUGGESTIONS_FILE):
 
 # ----------------------------------------------------------------------
 @logger_decorator
-def clear_suggestions_file(password, suggestions_file = SUGGESTIONS_FILE):
+def clear_suggestions_file(password, suggestions_file = SUGGESTIONS_FILE, store = None):
     '''
     If the password matches, we can wipe the suggestions file
-    Inputs: password, a string that is input on the streamlit UI
+    Inputs:
+        - password, a string that is input on the streamlit UI
+        - store: optional SuggestionsStore, cleared instead of the file
     Outputs: None
-    Postconditions: The SUGGESTIONS_FILE is wiped if the correct password is given 
+    Postconditions: The SUGGESTIONS_FILE (or the store) is wiped if the correct password is given 
     '''
     if password == "12345":
-        overwrite_file(suggestions_file)
+        if store is not None:
+            store.clear()
+        else:
+            overwrite_file(suggestions_file)
         st.sidebar.info("Password Accepted")
 
 
@@ -79,6 +84,10 @@ def save_suggestions(suggestions, suggestions_file = SUGGESTIONS_FILE):
     Postconditions: 
         - The file at SUGGESTIONS_FILE is updated via a JSON dump if it exists
         - A file SUGGESTIONS_FILE is created if it doesn't exist
+        - The file is replaced atomically, a crash never leaves a truncated file
+        - The app appends to the SuggestionsStore instead, this only writes the legacy JSON format
     '''
-    with open(suggestions_file, "w+") as file:
+    tmp_file = f"{suggestions_file}.tmp"
+    with open(tmp_file, "w") as file:
         json.dump(suggestions, file)
+    os.replace(tmp_file, suggestions_file)
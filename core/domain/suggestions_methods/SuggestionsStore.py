@@ -0,0 +1,309 @@
+# Methods associated with storing the suggestions in an embedded SQLite database
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+from core.infrastructure.Tracing import traced
+from core.domain.suggestions_methods.PostalCodeIndex import normalize_postal_code
+
+
+# Define the path to the suggestions database, it lives next to the JSON file it replaces
+SUGGESTIONS_DB = "/mount/src/berlinevchargingstationvisualizer/datasets/suggestions.db"
+
+# Seconds a writer waits for the lock of another writer before giving up
+BUSY_TIMEOUT_S = 30
+
+# Suggestions shown per page of the suggestions list
+PAGE_SIZE = 20
+
+# Suggestions written per transaction by bulk inserts and read per query by exports
+BATCH_SIZE = 10000
+
+# Schema changes of each version, a database is migrated by running the missing versions in order. The version is
+# stored in PRAGMA user_version
+_MIGRATIONS = {
+    1: ['''
+        CREATE TABLE IF NOT EXISTS suggestions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            plz TEXT NOT NULL,
+            text TEXT NOT NULL,
+            created REAL NOT NULL
+        )
+    '''],
+    # PLZ index in the order the suggestions are listed and a full text index over the texts, kept up to date by triggers
+    2: [
+        "CREATE INDEX IF NOT EXISTS suggestions_plz ON suggestions (plz, id)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS suggestions_fts USING fts5(text, content='suggestions', content_rowid='id')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS suggestions_fts_insert AFTER INSERT ON suggestions BEGIN
+            INSERT INTO suggestions_fts (rowid, text) VALUES (new.id, new.text);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS suggestions_fts_delete AFTER DELETE ON suggestions BEGIN
+            INSERT INTO suggestions_fts (suggestions_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END
+        ''',
+        "INSERT INTO suggestions_fts (suggestions_fts) VALUES ('rebuild')"
+    ],
+    # Materialized number of suggestions per PLZ, updated by triggers in the transaction of every insert and delete
+    3: [
+        "CREATE TABLE IF NOT EXISTS suggestion_counts (plz TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID",
+        '''
+        CREATE TRIGGER IF NOT EXISTS suggestion_counts_insert AFTER INSERT ON suggestions BEGIN
+            INSERT INTO suggestion_counts (plz, count) VALUES (new.plz, 1)
+                ON CONFLICT (plz) DO UPDATE SET count = count + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS suggestion_counts_delete AFTER DELETE ON suggestions BEGIN
+            UPDATE suggestion_counts SET count = count - 1 WHERE plz = old.plz;
+            DELETE FROM suggestion_counts WHERE plz = old.plz AND count <= 0;
+        END
+        ''',
+        "DELETE FROM suggestion_counts",
+        "INSERT INTO suggestion_counts (plz, count) SELECT plz, COUNT(*) FROM suggestions GROUP BY plz"
+    ],
+    # Hash of the content of each suggestion, bulk imports skip suggestions that are already stored
+    4: [
+        "ALTER TABLE suggestions ADD COLUMN content_hash TEXT",
+        "UPDATE suggestions SET content_hash = content_hash(text, plz)",
+        "CREATE INDEX IF NOT EXISTS suggestions_content_hash ON suggestions (content_hash)"
+    ]
+}
+SCHEMA_VERSION = max(_MIGRATIONS)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def content_hash(text, plz):
+    '''
+    Identifies the content of a suggestion
+    Inputs:
+        - text: the suggestion
+        - plz: the postal code it is about
+    Outputs: A hex string, equal for suggestions that only differ in case and whitespace
+    Postconditions: None
+    '''
+    normalized = " ".join(str(text).split()).casefold()
+    return hashlib.sha256(f"{normalize_postal_code(plz)}\x1f{normalized}".encode()).hexdigest()
+
+
+# ----------------------------------------------------------------------
+class SuggestionsStore:
+    '''Append only store of the suggestions, safe for many concurrent submitters of one or more processes'''
+
+    def __init__(self, path=SUGGESTIONS_DB, legacy_file=None):
+        '''
+        Opens the store and creates the database if it doesn't exist
+        Inputs:
+            - path: path of the SQLite database
+            - legacy_file: optional suggestions.json of the former storage, imported once into a new database
+        Outputs: None
+        Postconditions: The database is in WAL mode, so readers never block the writer and a crash never loses a
+            committed suggestion
+        '''
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("BEGIN IMMEDIATE")
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            for migration in range(version + 1, SCHEMA_VERSION + 1):
+                for statement in _MIGRATIONS[migration]:
+                    connection.execute(statement)
+            if version == 0 and legacy_file is not None and Path(legacy_file).exists():
+                self._import_legacy(connection, legacy_file)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            connection.execute("COMMIT")
+
+    @contextmanager
+    def _connect(self):
+        '''A short lived connection, every statement commits on its own unless a transaction is opened'''
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+        try:
+            connection.execute("PRAGMA synchronous=FULL")
+            connection.create_function("content_hash", 2, content_hash, deterministic=True)
+            yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _import_legacy(connection, legacy_file):
+        '''Copies the suggestions of a suggestions.json into the database'''
+        with open(legacy_file, "r") as file:
+            try:
+                suggestions = json.load(file)
+            except json.JSONDecodeError:
+                suggestions = []
+        rows = [(normalize_postal_code(s["PLZ"]), str(s["Text"]), time.time()) for s in suggestions
+                if isinstance(s, dict) and "PLZ" in s and "Text" in s]
+        connection.executemany("INSERT INTO suggestions (plz, text, created, content_hash) "
+                               "VALUES (?1, ?2, ?3, content_hash(?2, ?1))", rows)
+
+    @traced('suggestions.append')
+    def append(self, text, plz):
+        '''
+        Adds a suggestion
+        Inputs:
+            - text: the suggestion
+            - plz: the postal code it is about
+        Outputs: The id of the new suggestion
+        Postconditions: The suggestion is committed with a single insert, concurrent submitters wait for each other
+            instead of overwriting each other
+        '''
+        with self._connect() as connection:
+            cursor = connection.execute("INSERT INTO suggestions (plz, text, created, content_hash) VALUES (?, ?, ?, ?)",
+                                        (normalize_postal_code(plz), str(text), time.time(), content_hash(text, plz)))
+            return cursor.lastrowid
+
+    @traced('suggestions.append_many')
+    def append_many(self, suggestions):
+        '''
+        Adds many suggestions in one transaction, skipping the ones already stored
+        Inputs: suggestions - iterable of (text, plz) tuples
+        Outputs: The number of added suggestions
+        Postconditions: A suggestion is skipped if one with the same content hash is stored, also earlier in the same
+            batch. The counts per PLZ and the full text index are updated in the same transaction
+        '''
+        created = time.time()
+        rows = ((normalize_postal_code(plz), str(text), created, content_hash(text, plz)) for text, plz in suggestions)
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            cursor = connection.executemany(
+                "INSERT INTO suggestions (plz, text, created, content_hash) SELECT ?1, ?2, ?3, ?4 "
+                "WHERE NOT EXISTS (SELECT 1 FROM suggestions WHERE content_hash = ?4)", rows)
+            connection.execute("COMMIT")
+            return cursor.rowcount
+
+    def iter_batches(self, batch_size=BATCH_SIZE):
+        '''
+        Reads all suggestions batch by batch
+        Inputs: batch_size - number of suggestions per batch
+        Outputs: A generator of lists of {"Text", "PLZ"} dictionaries in the order they were submitted
+        Postconditions: Every batch is a separate query continuing after the last id, no read transaction is held
+            between batches and only one batch is in memory
+        '''
+        last_id = 0
+        while True:
+            with self._connect() as connection:
+                rows = connection.execute("SELECT id, plz, text FROM suggestions WHERE id > ? ORDER BY id LIMIT ?",
+                                          (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [{"Text": text, "PLZ": plz} for _, plz, text in rows]
+
+    @traced('suggestions.load')
+    def suggestions(self):
+        '''
+        Loads all suggestions
+        Inputs: None
+        Outputs: A list of {"Text", "PLZ"} dictionaries in the order they were submitted
+        Postconditions: None
+        '''
+        with self._connect() as connection:
+            rows = connection.execute("SELECT text, plz FROM suggestions ORDER BY id").fetchall()
+        return [{"Text": text, "PLZ": plz} for text, plz in rows]
+
+    @traced('suggestions.query')
+    def query(self, plz=None, text=None, after=None, limit=PAGE_SIZE):
+        '''
+        Loads one page of the suggestions sorted by PLZ
+        Inputs:
+            - plz: optional postal code, a trailing * matches all postal codes starting with the prefix (eg. "130*")
+            - text: optional words that must all occur in the suggestion, the last one may be incomplete
+            - after: the cursor returned with the previous page, None for the first page
+            - limit: number of suggestions per page
+        Outputs: A tuple of the list of {"Text", "PLZ"} dictionaries and the cursor of the next page, None on the last page
+        Postconditions: The page is read with a range scan of the PLZ index (and the full text index), so the cost
+            depends on the page size, not on the number of suggestions
+        '''
+        where, parameters = _filters(plz, text)
+        if after is not None:
+            where.append("(plz, id) > (?, ?)")
+            parameters += list(after)
+        sql = (f"SELECT id, plz, text FROM suggestions {'WHERE ' + ' AND '.join(where) if where else ''} "
+               "ORDER BY plz, id LIMIT ?")
+        with self._connect() as connection:
+            rows = connection.execute(sql, parameters + [limit + 1]).fetchall()
+        next_cursor = (rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return [{"Text": row_text, "PLZ": row_plz} for _, row_plz, row_text in rows[:limit]], next_cursor
+
+    @traced('suggestions.plz_counts')
+    def plz_counts(self):
+        '''
+        Loads the number of suggestions per PLZ
+        Inputs: None
+        Outputs: A dataframe with the columns PLZ and Suggestions, PLZ without suggestions are missing
+        Postconditions: The counts are read from the materialized aggregate, the suggestions aren't scanned
+        '''
+        with self._connect() as connection:
+            rows = connection.execute("SELECT plz, count FROM suggestion_counts ORDER BY plz").fetchall()
+        return pd.DataFrame(rows, columns=['PLZ', 'Suggestions']).astype({'PLZ': str, 'Suggestions': 'int64'})
+
+    def total(self):
+        '''Number of stored suggestions, summed from the materialized counts per PLZ instead of scanning the suggestions'''
+        with self._connect() as connection:
+            return connection.execute("SELECT COALESCE(SUM(count), 0) FROM suggestion_counts").fetchone()[0]
+
+    def count(self, plz=None, text=None):
+        '''Number of stored suggestions matching the filters of query'''
+        where, parameters = _filters(plz, text)
+        with self._connect() as connection:
+            return connection.execute(f"SELECT COUNT(*) FROM suggestions {'WHERE ' + ' AND '.join(where) if where else ''}",
+                                      parameters).fetchone()[0]
+
+    def clear(self):
+        '''
+        Deletes all suggestions
+        Inputs: None
+        Outputs: None
+        Postconditions: The store is empty, the legacy file is not imported again
+        '''
+        with self._connect() as connection:
+            connection.execute("DELETE FROM suggestions")
+
+
+# ----------------------------------------------------------------------
+def _filters(plz, text):
+    '''SQL conditions and parameters of the PLZ and text filters of a query'''
+    where, parameters = [], []
+    plz = (plz or "").strip()
+    if plz.endswith("*"):
+        prefix = plz.rstrip("*")
+        if prefix:
+            # The prefix as a range, so the PLZ index is used
+            where.append("plz >= ? AND plz < ?")
+            parameters += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    elif plz:
+        where.append("plz = ?")
+        parameters.append(plz)
+
+    words = re.findall(r"\w+", text or "")
+    if words:
+        # Every word is quoted, so the input can't contain FTS5 syntax
+        where.append("id IN (SELECT rowid FROM suggestions_fts WHERE suggestions_fts MATCH ?)")
+        parameters.append(" ".join(f'"{word}"' for word in words) + "*")
+    return where, parameters
+
+
+def open_suggestions_store(path=SUGGESTIONS_DB, legacy_file=None):
+    '''
+    Opens the suggestions store shared by all sessions of the process
+    Inputs:
+        - path: path of the SQLite database
+        - legacy_file: optional suggestions.json imported into a new database
+    Outputs: The SuggestionsStore of the path
+    Postconditions: The database is created on the first call only, streamlit reruns reuse the store
+    '''
+    with _stores_lock:
+        if str(path) not in _stores:
+            _stores[str(path)] = SuggestionsStore(path, legacy_file)
+        return _stores[str(path)]
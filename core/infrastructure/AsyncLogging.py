@@ -0,0 +1,147 @@
+# Methods associated with non-blocking logging and compact summaries of logged objects
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import numpy as np
+import pandas as pd
+
+
+# Longest text logged for a single argument or result
+DEFAULT_MAX_CHARS = 200
+# Containers are summarized element by element up to this many elements
+MAX_ITEMS = 8
+# Records waiting for the background thread, further records are dropped instead of blocking the caller
+DEFAULT_QUEUE_SIZE = 10000
+
+_settings = {'sample_rate': 1.0, 'max_chars': DEFAULT_MAX_CHARS}
+_listener = None
+
+
+# -----------------------------------------------------------------------------
+def configure_call_logging(sample_rate=1.0, max_chars=DEFAULT_MAX_CHARS):
+    '''
+    Sets how logger_decorator logs calls
+    Inputs:
+        - sample_rate: fraction of the successful calls that are logged, exceptions are always logged
+        - max_chars: longest text logged for a single argument or result
+    Outputs: None
+    Postconditions: None
+    '''
+    _settings['sample_rate'] = sample_rate
+    _settings['max_chars'] = max_chars
+
+
+def should_log_call():
+    '''Samples the calls logged by logger_decorator'''
+    rate = _settings['sample_rate']
+    return rate >= 1.0 or random.random() < rate
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def summarize(obj, max_chars=None):
+    '''
+    Compact text of a logged argument or result
+    Inputs:
+        - obj: any object
+        - max_chars: longest text returned, defaults to the configured limit
+    Outputs: Shape, dtypes and memory footprint for frames and arrays, the repr for small objects
+    Postconditions: Large objects are never converted to text as a whole
+    '''
+    max_chars = _settings['max_chars'] if max_chars is None else max_chars
+    if isinstance(obj, pd.DataFrame):
+        dtypes = ', '.join(f"{column}: {dtype}" for column, dtype in list(obj.dtypes.items())[:MAX_ITEMS])
+        more = ', ...' if obj.shape[1] > MAX_ITEMS else ''
+        text = f"<{type(obj).__name__} {obj.shape[0]}x{obj.shape[1]} [{dtypes}{more}] " \
+               f"{_format_bytes(obj.memory_usage(index=True, deep=False).sum())}>"
+    elif isinstance(obj, pd.Series):
+        text = f"<{type(obj).__name__} {obj.name} {len(obj)} {obj.dtype} {_format_bytes(obj.memory_usage(index=True, deep=False))}>"
+    elif isinstance(obj, np.ndarray):
+        text = f"<ndarray {obj.shape} {obj.dtype} {_format_bytes(obj.nbytes)}>"
+    elif isinstance(obj, (tuple, list)):
+        items = [summarize(item, max_chars) for item in obj[:MAX_ITEMS]]
+        if len(obj) > MAX_ITEMS:
+            items.append(f"... {len(obj) - MAX_ITEMS} more")
+        body = ', '.join(items) + (',' if isinstance(obj, tuple) and len(obj) == 1 else '')
+        text = f"({body})" if isinstance(obj, tuple) else f"[{body}]"
+    elif isinstance(obj, dict):
+        items = [f"{key!r}: {summarize(value, max_chars)}" for key, value in list(obj.items())[:MAX_ITEMS]]
+        if len(obj) > MAX_ITEMS:
+            items.append(f"... {len(obj) - MAX_ITEMS} more")
+        text = '{' + ', '.join(items) + '}'
+    elif isinstance(obj, (str, bytes)) and len(obj) > max_chars:
+        text = repr(obj[:max_chars])
+    else:
+        text = repr(obj)
+
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... ({len(text)} chars)"
+    return text
+
+
+# -----------------------------------------------------------------------------
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    '''QueueHandler that drops records when the queue is full, the number of dropped records is kept in dropped'''
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_async_logging(filename, level=logging.INFO, log_format='%(asctime)s - %(levelname)s - %(message)s',
+                        queue_size=DEFAULT_QUEUE_SIZE):
+    '''
+    Routes the root logger through a queue that is written to the log file by a background thread
+    Inputs:
+        - filename: the log file
+        - level: the logging level of the root logger
+        - log_format: the format of the log lines
+        - queue_size: records waiting to be written before new records are dropped
+    Outputs: The QueueListener writing the file
+    Postconditions: Logging calls only enqueue the record, the file is written on the listener thread.
+        Calling it again (eg. on a streamlit rerun) keeps the running listener
+    '''
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.FileHandler(filename)
+    file_handler.setFormatter(logging.Formatter(log_format))
+    log_queue = queue.Queue(queue_size)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(DroppingQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_async_logging)
+    return _listener
+
+
+def stop_async_logging():
+    '''Writes the queued records and stops the background thread'''
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(logging.getLogger().handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logging.getLogger().removeHandler(handler)
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
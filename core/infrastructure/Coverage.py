@@ -0,0 +1,112 @@
+# Methods associated with the distance of the residents to the nearest charging stations
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.SpatialJoin import to_numeric_coordinates, points_in_polygons
+from core.infrastructure.Tracing import traced
+
+
+EARTH_RADIUS_KM = 6371.0
+
+# Number of nearest charging stations the coverage distance is averaged over
+DEFAULT_K = 3
+
+# Points queried at once, bounds the memory of the distance and index arrays
+DEFAULT_BATCH_SIZE = 200000
+
+KM_PER_DEGREE = 111.32
+
+
+# -----------------------------------------------------------------------------
+def unit_vectors(lat, lon):
+    '''Points on the unit sphere, their euclidean (chord) distance is a monotone function of the great circle distance'''
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def nearest_station_distances(lat, lon, station_lat, station_lon, k=DEFAULT_K, batch_size=DEFAULT_BATCH_SIZE, workers=-1):
+    '''
+    Computes the great circle distance of points to their k nearest charging stations
+    Inputs:
+        - lat, lon: float arrays of the point coordinates
+        - station_lat, station_lon: float arrays of the charging station coordinates, NaN coordinates are ignored
+        - k: number of nearest stations
+        - batch_size: number of points queried at once
+        - workers: threads of each KD-tree query, -1 uses all cores
+    Outputs: A float array of shape (n, k) with the distances in km, sorted ascending. Missing stations are inf
+    Postconditions: The KD-tree is built once over the stations on the unit sphere, the points are queried in batches
+    '''
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    station_lat, station_lon = np.asarray(station_lat, dtype=float), np.asarray(station_lon, dtype=float)
+    located = ~(np.isnan(station_lat) | np.isnan(station_lon))
+    distances = np.full((len(lat), k), np.inf)
+    if not located.any() or len(lat) == 0:
+        return distances
+
+    tree = cKDTree(unit_vectors(station_lat[located], station_lon[located]))
+    for start in range(0, len(lat), batch_size):
+        chord, _ = tree.query(unit_vectors(lat[start:start + batch_size], lon[start:start + batch_size]), k=k, workers=workers)
+        chord = chord.reshape(-1, k)
+        with np.errstate(invalid='ignore'):
+            arc = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0))
+        distances[start:start + batch_size] = np.where(np.isinf(chord), np.inf, arc)
+    return distances
+
+
+def grid_points(bounds, spacing_km):
+    '''
+    Creates a regular grid of points
+    Inputs:
+        - bounds: (minx, miny, maxx, maxy) in degrees
+        - spacing_km: distance of neighbouring grid points in km
+    Outputs: The latitudes and longitudes of the grid points as flat float arrays
+    Postconditions: The longitude spacing is corrected for the mean latitude, so the cells are about square
+    '''
+    minx, miny, maxx, maxy = bounds
+    lat_step = spacing_km / KM_PER_DEGREE
+    lon_step = lat_step / np.cos(np.radians((miny + maxy) / 2))
+    lon, lat = np.meshgrid(np.arange(minx + lon_step / 2, maxx, lon_step), np.arange(miny + lat_step / 2, maxy, lat_step))
+    return lat.ravel(), lon.ravel()
+
+
+# -----------------------------------------------------------------------------
+@traced('coverage')
+@logger_decorator
+@pipeline_stage('plz_coverage')
+def plz_coverage(df_population, df_stations, k=DEFAULT_K, grid_km=None):
+    '''
+    Computes the distance of the residents of each PLZ to their nearest charging stations
+    Inputs:
+        - df_population: the preprocessed residents (PLZ, Breitengrad, Längengrad and the PLZ polygons)
+        - df_stations: the charging station register with the columns Breitengrad and Längengrad
+        - k: number of nearest stations averaged
+        - grid_km: optional grid spacing in km, if given the distances are averaged over a grid inside each PLZ
+            polygon, otherwise they are measured from the PLZ centre (lat, lon of plz_einwohner.csv)
+    Outputs: A dataframe with the columns PLZ, Nearest (km to the nearest station) and Distance (mean km to the k nearest)
+    Postconditions: All stations of the register are used, so stations behind a region border still cover the residents.
+        PLZ without any grid point inside fall back to their centre
+    '''
+    station_lat = to_numeric_coordinates(df_stations['Breitengrad'])
+    station_lon = to_numeric_coordinates(df_stations['Längengrad'])
+    lat = to_numeric_coordinates(df_population['Breitengrad'])
+    lon = to_numeric_coordinates(df_population['Längengrad'])
+
+    distances = nearest_station_distances(lat, lon, station_lat, station_lon, k)
+    nearest, mean = distances[:, 0], distances.mean(axis=1)
+
+    if grid_km and len(df_population):
+        grid_lat, grid_lon = grid_points(df_population.geometry.total_bounds, grid_km)
+        polygon = points_in_polygons(grid_lon, grid_lat, df_population.geometry.to_numpy())
+        inside = polygon >= 0
+        grid_distances = nearest_station_distances(grid_lat[inside], grid_lon[inside], station_lat, station_lon, k)
+
+        points = np.bincount(polygon[inside], minlength=len(df_population))
+        covered = points > 0
+        nearest_sum = np.bincount(polygon[inside], weights=grid_distances[:, 0], minlength=len(df_population))
+        mean_sum = np.bincount(polygon[inside], weights=grid_distances.mean(axis=1), minlength=len(df_population))
+        nearest = np.where(covered, nearest_sum / np.maximum(points, 1), nearest)
+        mean = np.where(covered, mean_sum / np.maximum(points, 1), mean)
+
+    return pd.DataFrame({'PLZ': df_population['PLZ'].to_numpy(), 'Nearest': nearest.round(2), 'Distance': mean.round(2)})
@@ -0,0 +1,104 @@
+# Methods associated with rolling PLZ values up to the Berlin districts (Bezirke)
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy import sparse
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.Tracing import traced
+
+
+# Equal area projection the overlaps are measured in
+AREA_CRS = 'EPSG:3035'
+
+# Columns of the merged PLZ frame that are summed per district
+ROLLUP_COLUMNS = ('Einwohner', 'Number', 'KW')
+
+
+class Crosswalk:
+    '''Sparse area weights (districts x PLZ): the share of the area of each PLZ that lies in each district'''
+
+    def __init__(self, weights, plz, districts):
+        self.weights = weights
+        self.plz = pd.Index(plz)
+        self.districts = pd.Index(districts)
+
+    def rollup(self, df, columns, key='PLZ'):
+        '''
+        Sums PLZ values per district
+        Inputs:
+            - df: a frame with the column key and the columns to roll up
+            - columns: the columns to roll up
+            - key: the PLZ column of df
+        Outputs: A dataframe indexed by district with one column per rolled up column
+        Postconditions: All columns are rolled up by one sparse matrix product. PLZ unknown to the crosswalk
+            are ignored, PLZ missing in df count as 0
+        '''
+        columns = list(columns)
+        position = self.plz.get_indexer(df[key])
+        known = position >= 0
+        values = np.zeros((len(self.plz), len(columns)))
+        values[position[known]] = df[columns].to_numpy(dtype=float)[known]
+        return pd.DataFrame(self.weights @ values, index=self.districts, columns=columns)
+
+
+# -----------------------------------------------------------------------------
+@traced('crosswalk')
+@logger_decorator
+@pipeline_stage('plz_district_crosswalk')
+def build_crosswalk(df_plz_geo, df_districts, plz_key='PLZ', district_key='Bezirk'):
+    '''
+    Precomputes the area weights of the PLZ in each district
+    Inputs:
+        - df_plz_geo: geodataframe with the PLZ polygons (EPSG:4326)
+        - df_districts: geodataframe with the district polygons (EPSG:4326)
+        - plz_key, district_key: the name columns of both frames
+    Outputs: A Crosswalk, weight[d, p] = area(PLZ p within district d) / area(PLZ p)
+    Postconditions: The candidate pairs are found with an STRtree, only PLZ crossing a district border are
+        intersected. The result is cached by the pipeline cache
+    '''
+    plz_polygons = gpd.GeoSeries(df_plz_geo.geometry.values, crs='EPSG:4326').to_crs(AREA_CRS).to_numpy()
+    district_polygons = gpd.GeoSeries(df_districts.geometry.values, crs='EPSG:4326').to_crs(AREA_CRS).to_numpy()
+
+    plz_idx, district_idx = shapely.STRtree(district_polygons).query(plz_polygons, predicate='intersects')
+    shapely.prepare(district_polygons)
+    inside = shapely.contains_properly(district_polygons[district_idx], plz_polygons[plz_idx])
+
+    plz_areas = shapely.area(plz_polygons)
+    overlap = plz_areas[plz_idx]
+    overlap[~inside] = shapely.area(shapely.intersection(plz_polygons[plz_idx[~inside]], district_polygons[district_idx[~inside]]))
+
+    keep = overlap > 0
+    weights = sparse.csr_matrix((overlap[keep] / plz_areas[plz_idx[keep]], (district_idx[keep], plz_idx[keep])),
+                                shape=(len(district_polygons), len(plz_polygons)))
+    return Crosswalk(weights, df_plz_geo[plz_key].to_numpy(), df_districts[district_key].to_numpy())
+
+
+@pipeline_stage('district_rollup')
+def district_rollup(crosswalk, df_merged, df_districts, district_key='Bezirk'):
+    '''
+    Rolls the merged PLZ frame up to the districts
+    Inputs:
+        - crosswalk: the Crosswalk returned by build_crosswalk
+        - df_merged: the merged residents and charging station counts per PLZ
+        - df_districts: geodataframe with the district polygons
+        - district_key: the name column of df_districts
+    Outputs: A geodataframe in the format of the merged PLZ frame with one row per district: Bezirk, the summed
+        Einwohner, Number and KW, qkm, Breitengrad, Längengrad (centre) and geometry
+    Postconditions: The demand of the districts is computed from the rolled up values, for the linear station
+        formula this equals the sum of the PLZ demands before rounding
+    '''
+    columns = [column for column in ROLLUP_COLUMNS if column in df_merged.columns]
+    rolled = crosswalk.rollup(df_merged, columns).reindex(df_districts[district_key].to_numpy())
+
+    geometry = gpd.GeoSeries(df_districts.geometry.values, crs='EPSG:4326')
+    centres = geometry.to_crs(AREA_CRS).centroid.to_crs('EPSG:4326')
+    result = gpd.GeoDataFrame({district_key: df_districts[district_key].to_numpy()}, geometry=geometry.values, crs='EPSG:4326')
+    for column in columns:
+        result[column] = rolled[column].to_numpy()
+    result['Einwohner'] = result['Einwohner'].round().astype(np.int64)
+    result['qkm'] = geometry.to_crs(AREA_CRS).area.to_numpy() / 1e6
+    result['Breitengrad'] = centres.y.to_numpy()
+    result['Längengrad'] = centres.x.to_numpy()
+    return result
@@ -0,0 +1,280 @@
+# Methods associated with the precompiled columnar dataset cache
+import os
+import json
+import hashlib
+import pandas as pd
+import geopandas as gpd
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.RegisterIngestion import stream_register
+from core.infrastructure.Regions import get_region, region_plz_range, REGION_GERMANY
+from core.infrastructure.PipelineCache import stamp
+from core.infrastructure.Tracing import traced
+
+
+# Bump whenever the layout of the cached files changes, this invalidates all existing caches
+CACHE_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+# Columns kept from the charging station register and the dtypes they are stored with
+LSTAT_DTYPES = {
+    'Postleitzahl': 'int32',
+    'Bundesland': 'category',
+    'Breitengrad': 'float64',
+    'Längengrad': 'float64',
+    'Nennleistung Ladeeinrichtung [kW]': 'float64'
+}
+
+
+# -----------------------------------------------------------------------------
+def file_fingerprint(path, chunk_size=1 << 20):
+    '''
+    Computes the sha256 hash of a file without reading it fully into memory
+    Inputs:
+        - path: path to the file
+        - chunk_size: number of bytes read per step
+    Outputs: The hex digest of the file content
+    Postconditions: None
+    '''
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def register_region(paramdict):
+    '''
+    Selects the region the cached charging station register is reduced to
+    Inputs: paramdict - parameter dictionary
+    Outputs: The configured Bundesland, or None if the whole register is kept
+    Postconditions: Only regions whose residents are selected by a PLZ window are reduced, the residents of the other
+        Bundesländer are assigned by the closest station of any Bundesland and need the whole register
+    '''
+    region = get_region(paramdict)
+    if region == REGION_GERMANY or region_plz_range(region, 'resid', paramdict) is None:
+        return None
+    return region
+
+
+def dataset_hash(manifest, name):
+    '''The hash of a cached dataset: the hash of its source file, combined with the region for a reduced register'''
+    source_hash = manifest['sources'][name]['sha256']
+    if name != 'lstat' or manifest.get('region') is None:
+        return source_hash
+    return hashlib.sha256(f"{source_hash}:{manifest['region']}".encode()).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def source_paths(source_dir, paramdict):
+    '''
+    Collects the paths of the csv files the cache is built from
+    Inputs:
+        - source_dir: directory containing the raw csv files
+        - paramdict: dictionary containing filenames
+    Outputs: A dictionary mapping the dataset name to the path of its csv file
+    Postconditions: The district polygons (geodat_dis) are only included if paramdict enables 'districts'
+    '''
+    paths = {
+        'geodat_plz': os.path.join(source_dir, paramdict["file_geodat_plz"]),
+        'lstat': os.path.join(source_dir, paramdict["file_lstations"]),
+        'residents': os.path.join(source_dir, paramdict["file_residents"])
+    }
+    if paramdict.get('districts'):
+        paths['geodat_dis'] = os.path.join(source_dir, paramdict["file_geodat_dis"])
+    return paths
+
+
+def check_sources(paths, paramdict):
+    '''
+    Fails early if a csv file the cache is built from is missing
+    Inputs:
+        - paths: dictionary mapping dataset name to csv path, as returned by source_paths
+        - paramdict: parameter dictionary
+    Outputs: None
+    Postconditions: Raises a FileNotFoundError naming the missing file, for the PLZ polygons also what the file
+        has to contain, since only the Berlin polygons are shipped
+    '''
+    for name, path in paths.items():
+        if os.path.exists(path):
+            continue
+        if name == 'geodat_plz':
+            raise FileNotFoundError(
+                f"The PLZ polygons of the region '{get_region(paramdict)}' are missing: {path} does not exist. "
+                f"Only the Berlin polygons are shipped, other regions need the PLZ polygons of the whole region as a ';' "
+                f"separated csv with the columns PLZ and geometry (WKT), in the layout of geodata_berlin_plz.csv.")
+        raise FileNotFoundError(f"The source file of the dataset '{name}' is missing: {path} does not exist.")
+
+
+# -----------------------------------------------------------------------------
+@traced('csv_read.geodat_plz')
+def _compile_geodat_plz(path):
+    '''Reads the PLZ geometry csv and parses the WKT polygons once'''
+    df_geo = pd.read_csv(path, delimiter=';')
+    return gpd.GeoDataFrame(df_geo, geometry=gpd.GeoSeries.from_wkt(df_geo['geometry']))
+
+
+@traced('csv_read.geodat_dis')
+def _compile_geodat_dis(path):
+    '''Reads the district geometry csv, it has the same layout as the PLZ geometry csv'''
+    return _compile_geodat_plz(path)
+
+
+@traced('csv_read.lstat')
+def _compile_lstat(path, region=None):
+    '''
+    Streams the charging station register keeping only the columns used by the pipeline and the stations of the region
+    (all of them for None). The PLZ windows are applied after the coordinate based PLZ assignment, only the Bundesland is filtered here
+    '''
+    df_lstat = stream_register(path, {'region_plz_ranges': {}}, region)['stations']
+    return df_lstat.astype(LSTAT_DTYPES).reset_index(drop=True)
+
+
+@traced('csv_read.residents')
+def _compile_residents(path):
+    '''Reads the residents table with explicit column types'''
+    return pd.read_csv(path, delimiter=',', dtype={'plz': 'int64', 'einwohner': 'int64', 'qkm': 'float64',
+                                                   'lat': 'float64', 'lon': 'float64'})
+
+
+COMPILERS = {
+    'geodat_plz': _compile_geodat_plz,
+    'geodat_dis': _compile_geodat_dis,
+    'lstat': _compile_lstat,
+    'residents': _compile_residents
+}
+
+
+# -----------------------------------------------------------------------------
+def read_manifest(cache_dir):
+    '''
+    Reads the manifest describing the current cache content
+    Inputs: cache_dir - directory of the cache
+    Outputs: The manifest as a dictionary, or None if it doesn't exist or can't be read
+    Postconditions: None
+    '''
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _stat_key(path):
+    '''Size and modification time of a file, used to skip rehashing unchanged sources'''
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def source_hashes(paths, manifest=None):
+    '''
+    Computes the content hashes of the source files
+    Inputs:
+        - paths: dictionary mapping dataset name to csv path
+        - manifest: optional previous manifest, hashes are reused for files whose size and mtime are unchanged
+    Outputs: A dictionary mapping dataset name to {'sha256', 'stat'}
+    Postconditions: None
+    '''
+    previous = (manifest or {}).get('sources', {})
+    hashes = {}
+    for name, path in paths.items():
+        stat = _stat_key(path)
+        if name in previous and previous[name].get('stat') == stat:
+            hashes[name] = previous[name]
+        else:
+            hashes[name] = {'sha256': file_fingerprint(path), 'stat': stat}
+    return hashes
+
+
+def is_cache_valid(manifest, hashes, region=None):
+    '''
+    Checks if the cache was built by the current cache version from the given sources
+    Inputs:
+        - manifest: the manifest read from the cache directory
+        - hashes: the current source hashes
+        - region: the region the register is reduced to, see register_region
+    Outputs: True if the cache can be used, False otherwise
+    Postconditions: None
+    '''
+    if manifest is None or manifest.get('version') != CACHE_VERSION or manifest.get('region') != region:
+        return False
+    cached = manifest.get('sources', {})
+    return all(name in cached and cached[name]['sha256'] == entry['sha256'] for name, entry in hashes.items())
+
+
+# -----------------------------------------------------------------------------
+@logger_decorator
+def build_dataset_cache(source_dir, cache_dir, paramdict, hashes=None):
+    '''
+    Converts the raw csv inputs into versioned parquet files
+    Inputs:
+        - source_dir: directory containing the raw csv files
+        - cache_dir: directory the parquet files and the manifest are written to
+        - paramdict: dictionary containing filenames
+        - hashes: optional precomputed source hashes
+    Outputs: The manifest written to the cache directory
+    Postconditions: One parquet file per dataset and a manifest keyed on the source hashes and the register region exist
+        in cache_dir. Geometry is stored as WKB, all other columns as typed arrow columns
+    '''
+    paths = source_paths(source_dir, paramdict)
+    region = register_region(paramdict)
+    hashes = hashes or source_hashes(paths)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Invalidate first, the manifest is only written again once every file is complete
+    if os.path.exists(os.path.join(cache_dir, MANIFEST_FILE)):
+        os.remove(os.path.join(cache_dir, MANIFEST_FILE))
+
+    for name, path in paths.items():
+        frame = COMPILERS[name](path, region) if name == 'lstat' else COMPILERS[name](path)
+        target = os.path.join(cache_dir, f"{name}.parquet")
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        frame.to_parquet(tmp_target, index=False)
+        os.replace(tmp_target, target)
+
+    manifest = {'version': CACHE_VERSION, 'region': region, 'sources': hashes}
+
+    tmp_manifest = os.path.join(cache_dir, f"{MANIFEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_manifest, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_manifest, os.path.join(cache_dir, MANIFEST_FILE))
+
+    return manifest
+
+
+# -----------------------------------------------------------------------------
+@traced('load_dataset_cache')
+@logger_decorator
+def load_dataset_cache(source_dir, cache_dir, paramdict):
+    '''
+    Loads the preprocessed datasets, rebuilding the cache first if the sources changed
+    Inputs:
+        - source_dir: directory containing the raw csv files
+        - cache_dir: directory of the parquet cache
+        - paramdict: dictionary containing filenames
+    Outputs: A dictionary with the keys 'geodat_plz' (GeoDataFrame), 'lstat' and 'residents' (DataFrames),
+        and 'geodat_dis' (GeoDataFrame) if districts are enabled
+    Postconditions: The cache is (re)built if it is missing, outdated, or was built from different sources or for
+        another region. Each returned frame carries its dataset_hash in frame.attrs['source_hash'].
+        Raises a FileNotFoundError before anything is read if a source file is missing
+    '''
+    paths = source_paths(source_dir, paramdict)
+    check_sources(paths, paramdict)
+    manifest = read_manifest(cache_dir)
+    hashes = source_hashes(paths, manifest)
+
+    if not is_cache_valid(manifest, hashes, register_region(paramdict)):
+        manifest = build_dataset_cache(source_dir, cache_dir, paramdict, hashes)
+
+    datasets = {}
+    for name in paths:
+        target = os.path.join(cache_dir, f"{name}.parquet")
+        if name in ('geodat_plz', 'geodat_dis'):
+            frame = gpd.read_parquet(target, memory_map=True)
+        else:
+            frame = pd.read_parquet(target, memory_map=True)
+        frame.attrs['source_hash'] = dataset_hash(manifest, name)
+        stamp(frame, frame.attrs['source_hash'])
+        datasets[name] = frame
+
+    return datasets
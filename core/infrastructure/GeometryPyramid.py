@@ -0,0 +1,184 @@
+# Methods associated with the multi-resolution simplification pyramid of the PLZ polygons
+import os
+import time
+import folium
+import shapely
+import pandas as pd
+import geopandas as gpd
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+
+
+# Zoom levels a simplified geometry set is precomputed for, the full resolution is used above the last level
+DEFAULT_ZOOM_LEVELS = (8, 10, 12, 14)
+
+# Allowed deviation of a simplified border, in screen pixels
+PIXEL_TOLERANCE = 0.5
+
+
+# -----------------------------------------------------------------------------
+def tolerance_for_zoom(zoom, pixel_tolerance=PIXEL_TOLERANCE):
+    '''
+    Converts a web map zoom level into a simplification tolerance
+    Inputs:
+        - zoom: the web mercator zoom level
+        - pixel_tolerance: the allowed deviation in screen pixels
+    Outputs: The tolerance in degrees that corresponds to pixel_tolerance pixels at the given zoom
+    Postconditions: None
+    '''
+    return pixel_tolerance * 360.0 / (256 * 2 ** zoom)
+
+
+# -----------------------------------------------------------------------------
+def simplify_coverage(geometries, tolerance):
+    '''
+    Simplifies a set of polygons that tile an area without creating gaps or overlaps
+    Inputs:
+        - geometries: array-like of (multi)polygons
+        - tolerance: the simplification tolerance in the units of the geometries
+    Outputs: A numpy array with the simplified geometries
+    Postconditions: Borders shared by two polygons are simplified once, so neighbours stay consistent.
+        Inputs that do not form a valid coverage are simplified per polygon instead
+    '''
+    geometries = gpd.GeoSeries(geometries).to_numpy()
+    if shapely.coverage_is_valid(geometries):
+        return shapely.coverage_simplify(geometries, tolerance, simplify_boundary=True)
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+# -----------------------------------------------------------------------------
+@logger_decorator
+def build_simplification_pyramid(gdf, zoom_levels=DEFAULT_ZOOM_LEVELS):
+    '''
+    Precomputes a decimated geometry set for each zoom level
+    Inputs:
+        - gdf: a geodataframe of polygons in EPSG:4326 (eg. the PLZ polygons)
+        - zoom_levels: the zoom levels to precompute
+    Outputs: A dictionary mapping each zoom level to a copy of gdf with simplified geometry,
+        None maps to the full resolution geometry
+    Postconditions: None
+    '''
+    pyramid = {None: gdf}
+    for zoom in sorted(zoom_levels):
+        level = gdf.copy()
+        level['geometry'] = simplify_coverage(gdf.geometry, tolerance_for_zoom(zoom))
+        pyramid[zoom] = gpd.GeoDataFrame(level, geometry='geometry', crs=gdf.crs)
+    return pyramid
+
+
+# -----------------------------------------------------------------------------
+def geometry_for_zoom(pyramid, zoom):
+    '''
+    Picks the geometry set that should be rendered at a zoom level
+    Inputs:
+        - pyramid: a pyramid created by build_simplification_pyramid
+        - zoom: the zoom level of the map
+    Outputs: The coarsest level that is still precise enough for zoom, the full resolution above the last level
+    Postconditions: None
+    '''
+    levels = sorted(level for level in pyramid if level is not None)
+    candidates = [level for level in levels if level >= zoom]
+    return pyramid[candidates[0]] if candidates else pyramid[None]
+
+
+def finest_level(pyramid):
+    '''
+    Picks the geometry set of a map that can be zoomed in after it was rendered
+    Inputs: pyramid - a pyramid created by build_simplification_pyramid
+    Outputs: The most precise precomputed level, the full resolution if the pyramid has no levels
+    Postconditions: None
+    '''
+    levels = [level for level in pyramid if level is not None]
+    return pyramid[max(levels)] if levels else pyramid[None]
+
+
+# -----------------------------------------------------------------------------
+@pipeline_stage('apply_geometry_level')
+def apply_geometry_level(df, level, key='PLZ'):
+    '''
+    Replaces the geometry of a dataframe with the geometry of a pyramid level
+    Inputs:
+        - df: a geodataframe with the column key and a geometry column
+        - level: one level of a simplification pyramid, with the same key column
+        - key: the column that links both frames
+    Outputs: A geodataframe with the data of df and the geometry of level
+    Postconditions: Rows of df without a geometry in level keep their own geometry
+    '''
+    lookup = pd.Series(level.geometry.values, index=level[key].values)
+    simplified = df[key].map(lookup)
+    result = df.copy()
+    result['geometry'] = gpd.GeoSeries(simplified.where(simplified.notna(), df['geometry']).values, index=df.index)
+    return gpd.GeoDataFrame(result, geometry='geometry')
+
+
+# -----------------------------------------------------------------------------
+@logger_decorator
+def load_or_build_pyramid(gdf, cache_dir, name, zoom_levels=DEFAULT_ZOOM_LEVELS):
+    '''
+    Loads a pyramid from the parquet cache or builds and stores it
+    Inputs:
+        - gdf: the full resolution geodataframe, gdf.attrs['source_hash'] identifies its content if present
+        - cache_dir: the directory the levels are stored in
+        - name: the name of the geometry set (eg. 'geodat_plz')
+        - zoom_levels: the zoom levels to precompute
+    Outputs: The pyramid as returned by build_simplification_pyramid
+    Postconditions: One parquet file per level exists in cache_dir, named after name and the source hash
+    '''
+    source_hash = gdf.attrs.get('source_hash')
+    if source_hash is None:
+        return build_simplification_pyramid(gdf, zoom_levels)
+
+    paths = {zoom: os.path.join(cache_dir, f"{name}_z{zoom}_{source_hash[:16]}.parquet") for zoom in zoom_levels}
+    if all(os.path.exists(path) for path in paths.values()):
+        pyramid = {None: gdf}
+        pyramid.update({zoom: gpd.read_parquet(path) for zoom, path in paths.items()})
+        return pyramid
+
+    pyramid = build_simplification_pyramid(gdf, zoom_levels)
+    os.makedirs(cache_dir, exist_ok=True)
+    for zoom, path in paths.items():
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pyramid[zoom].to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return pyramid
+
+
+# -----------------------------------------------------------------------------
+def benchmark_pyramid(pyramid, repeat=3):
+    '''
+    Measures size and render cost of each pyramid level
+    Inputs:
+        - pyramid: a pyramid created by build_simplification_pyramid
+        - repeat: how often each level is rendered, the fastest run is reported
+    Outputs: A dataframe with one row per level and the columns zoom, tolerance, vertices, bytes and render_secs
+    Postconditions: None
+    '''
+    rows = []
+    for zoom in sorted(pyramid, key=lambda level: float('inf') if level is None else level):
+        level = gpd.GeoDataFrame(pyramid[zoom], geometry='geometry')
+        geojson = level[['geometry']].to_json()
+
+        render_times = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            folium_map = folium.Map(location=[52.52, 13.40], zoom_start=zoom or 10)
+            folium.GeoJson(geojson).add_to(folium_map)
+            folium_map.get_root().render()
+            render_times.append(time.perf_counter() - start_time)
+
+        rows.append({
+            'zoom': 'full' if zoom is None else zoom,
+            'tolerance': 0.0 if zoom is None else tolerance_for_zoom(zoom),
+            'vertices': int(shapely.get_num_coordinates(level.geometry.to_numpy()).sum()),
+            'bytes': len(geojson.encode()),
+            'render_secs': min(render_times)
+        })
+    return pd.DataFrame(rows)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    # Benchmark for the shipped Berlin PLZ polygons: python -m core.infrastructure.GeometryPyramid
+    df_geo = pd.read_csv(os.path.join(os.getcwd(), 'datasets', 'geodata_berlin_plz.csv'), delimiter=';')
+    gdf_geo = gpd.GeoDataFrame(df_geo, geometry=gpd.GeoSeries.from_wkt(df_geo['geometry']))
+    print(benchmark_pyramid(build_simplification_pyramid(gdf_geo)).to_string(index=False))
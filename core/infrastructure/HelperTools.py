@@ -7,18 +7,18 @@ import time
 import functools   
 import random
 from collections import Counter, OrderedDict
+from core.infrastructure.AsyncLogging import summarize, should_log_call
+from core.infrastructure.Tracing import span
 
 #------------------------------------------------------------------------------
 
 def timer(func):
-    """Print the runtime of the decorated function"""
+    """Print the runtime of the decorated function and record the call as a span of the trace"""
     @functools.wraps(func)
     def wrapper_timer(*args, **kwargs):
-        start_time = time.perf_counter()  # 1
-        value = func(*args, **kwargs)
-        end_time = time.perf_counter()  # 2
-        run_time = end_time - start_time  # 3
-        print(" ====> Duration {:.2f} secs: {}".format(run_time, func.__doc__))
+        with span(func.__qualname__) as record:
+            value = func(*args, **kwargs)
+        print(" ====> Duration {:.2f} secs: {}".format(record['wall'], func.__doc__))
         return value
 
     return wrapper_timer #  no "()" here, we need the object to be returned.
@@ -29,16 +29,20 @@ def logger_decorator(func):
     Creates a logger decorator which logs information about function calls within the codebase
     Input: A function
     Output: A wrapper function
-    Postconditions: None
+    Postconditions: Arguments and results are logged as compact summaries (shape, dtypes and memory of frames),
+        successful calls are sampled as configured with AsyncLogging.configure_call_logging
     '''
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
+        sampled = should_log_call()
         # Log function call details
-        logging.info(f"Called {func.__name__} with args: {args}, kwargs: {kwargs}")
+        if sampled:
+            logging.info(f"Called {func.__name__} with args: {summarize(args)}, kwargs: {summarize(kwargs)}")
         try:
             result = func(*args, **kwargs)
             # Log the result
-            logging.info(f"{func.__name__} returned {result}")
+            if sampled:
+                logging.info(f"{func.__name__} returned {summarize(result)}")
             return result
         except Exception as e:
             # Log any exception that occurs
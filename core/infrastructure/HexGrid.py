@@ -0,0 +1,158 @@
+# Methods associated with aggregating stations and residents on a hexagonal grid instead of the PLZ polygons
+import math
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.SpatialJoin import to_numeric_coordinates
+from core.infrastructure.Tracing import traced
+
+
+# Equal area projection the hexagons are regular in (ETRS89 Lambert Azimuthal Equal Area)
+HEX_CRS = 'EPSG:3035'
+
+# Circumradius of the hexagons of each level in km, every level halves the size of the previous one
+DEFAULT_HEX_SIZES_KM = (8, 4, 2, 1)
+
+_SQRT3 = math.sqrt(3)
+
+
+# -----------------------------------------------------------------------------
+def _to_hex_crs(lon, lat):
+    return Transformer.from_crs('EPSG:4326', HEX_CRS, always_xy=True).transform(lon, lat)
+
+
+def hex_axial(x, y, size):
+    '''
+    Finds the hexagon each point lies in
+    Inputs:
+        - x, y: float arrays of projected coordinates in m
+        - size: circumradius of the pointy top hexagons in m
+    Outputs: Two integer arrays with the axial coordinates (q, r) of the hexagons
+    Postconditions: The fractional cube coordinates are rounded, the component with the largest rounding error is
+        recomputed from the other two
+    '''
+    q = (_SQRT3 / 3 * np.asarray(x, dtype=float) - np.asarray(y, dtype=float) / 3) / size
+    r = (2 / 3 * np.asarray(y, dtype=float)) / size
+    s = -q - r
+
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+def hex_polygons(q, r, size):
+    '''
+    Creates the polygons of hexagons
+    Inputs:
+        - q, r: integer arrays of axial coordinates
+        - size: circumradius in m
+    Outputs: A numpy array of shapely polygons in the projected coordinates
+    Postconditions: None
+    '''
+    center_x = size * (_SQRT3 * np.asarray(q) + _SQRT3 / 2 * np.asarray(r))
+    center_y = size * 1.5 * np.asarray(r)
+    angles = np.radians(30 + 60 * np.arange(6))
+    x = center_x[:, None] + size * np.cos(angles)[None, :]
+    y = center_y[:, None] + size * np.sin(angles)[None, :]
+    return shapely.polygons(np.stack([x, y], axis=-1))
+
+
+def _covering_hexagons(bounds, size):
+    '''Axial coordinates of all hexagons that overlap a bounding box'''
+    minx, miny, maxx, maxy = bounds
+    r_values = np.arange(math.floor(miny / (1.5 * size)) - 1, math.ceil(maxy / (1.5 * size)) + 2)
+    q_min = math.floor((minx / size - _SQRT3 / 2 * r_values.max()) / _SQRT3) - 1
+    q_max = math.ceil((maxx / size - _SQRT3 / 2 * r_values.min()) / _SQRT3) + 1
+    q, r = np.meshgrid(np.arange(q_min, q_max + 1), r_values)
+    return q.ravel(), r.ravel()
+
+
+# -----------------------------------------------------------------------------
+def hex_level(df_population, df_stations, size_km):
+    '''
+    Aggregates residents and charging stations on one hexagon level
+    Inputs:
+        - df_population: geodataframe with PLZ, Einwohner and the PLZ polygons in EPSG:4326 (also without a crs set)
+        - df_stations: the charging stations with Breitengrad, Längengrad and the power in KW
+            (or 'Nennleistung Ladeeinrichtung [kW]' of the register)
+        - size_km: circumradius of the hexagons in km
+    Outputs: A geodataframe in the format of the merged PLZ frame, one row per hexagon that overlaps a PLZ polygon:
+        Hexagon (axial "q,r"), PLZ (the PLZ with the largest overlap), Einwohner, Number, KW, qkm (area of the overlap),
+        Breitengrad, Längengrad (hexagon centre) and geometry
+    Postconditions: The residents of a PLZ are apportioned to the hexagons by the share of its area they cover.
+        Stations are binned by their coordinates, stations outside all hexagons are dropped
+    '''
+    size = size_km * 1000
+    plz_polygons = gpd.GeoSeries(df_population.geometry.values, crs='EPSG:4326').to_crs(HEX_CRS).to_numpy()
+    plz_areas = shapely.area(plz_polygons)
+
+    # Hexagons overlapping the PLZ polygons and the overlap of every (hexagon, PLZ) pair
+    q, r = _covering_hexagons(shapely.total_bounds(plz_polygons), size)
+    polygons = hex_polygons(q, r, size)
+    hex_idx, plz_idx = shapely.STRtree(plz_polygons).query(polygons, predicate='intersects')
+
+    # Most hexagons lie inside a single PLZ, only the ones crossing a border are intersected
+    shapely.prepare(plz_polygons)
+    inside = shapely.contains_properly(plz_polygons[plz_idx], polygons[hex_idx])
+    overlap = np.full(len(hex_idx), shapely.area(polygons[0]) if len(polygons) else 0.0)
+    overlap[~inside] = shapely.area(shapely.intersection(polygons[hex_idx[~inside]], plz_polygons[plz_idx[~inside]]))
+    keep = overlap > 0
+    hex_idx, plz_idx, overlap = hex_idx[keep], plz_idx[keep], overlap[keep]
+
+    cells, cell_of_pair = np.unique(hex_idx, return_inverse=True)
+    residents = df_population['Einwohner'].to_numpy(dtype=float)
+    einwohner = np.bincount(cell_of_pair, weights=residents[plz_idx] * overlap / plz_areas[plz_idx], minlength=len(cells))
+    area = np.bincount(cell_of_pair, weights=overlap, minlength=len(cells))
+
+    # PLZ with the largest share of each hexagon
+    order = np.lexsort((-overlap, cell_of_pair))
+    first = order[np.r_[True, cell_of_pair[order][1:] != cell_of_pair[order][:-1]]]
+    dominant = df_population['PLZ'].to_numpy()[plz_idx[first]]
+
+    # Stations binned by their coordinates
+    lat = to_numeric_coordinates(df_stations['Breitengrad'])
+    lon = to_numeric_coordinates(df_stations['Längengrad'])
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    x, y = _to_hex_crs(lon[located], lat[located])
+    station_q, station_r = hex_axial(x, y, size)
+    kw_column = 'KW' if 'KW' in df_stations.columns else 'Nennleistung Ladeeinrichtung [kW]'
+    stations = pd.DataFrame({'q': station_q, 'r': station_r, 'KW': pd.to_numeric(df_stations[kw_column], errors='coerce').to_numpy()[located]})
+    stations = stations.groupby(['q', 'r']).agg(Number=('KW', 'size'), KW=('KW', 'sum'))
+    cell_stations = stations.reindex(pd.MultiIndex.from_arrays([q[cells], r[cells]])).fillna(0)
+
+    geometry = gpd.GeoSeries(polygons[cells], crs=HEX_CRS).to_crs('EPSG:4326')
+    centres = shapely.centroid(geometry.to_numpy())
+    return gpd.GeoDataFrame({
+        'Hexagon': [f"{cell_q},{cell_r}" for cell_q, cell_r in zip(q[cells], r[cells])],
+        'PLZ': dominant,
+        'Einwohner': np.round(einwohner).astype(np.int64),
+        'Number': cell_stations['Number'].to_numpy(),
+        'KW': cell_stations['KW'].to_numpy(),
+        'qkm': area / 1e6,
+        'Breitengrad': shapely.get_y(centres),
+        'Längengrad': shapely.get_x(centres),
+        'geometry': geometry.values
+    }, geometry='geometry', crs='EPSG:4326')
+
+
+@traced('hex_hierarchy')
+@logger_decorator
+@pipeline_stage('hex_hierarchy')
+def build_hex_hierarchy(df_population, df_stations, sizes_km=DEFAULT_HEX_SIZES_KM):
+    '''
+    Precomputes the hexagon aggregation of every level
+    Inputs:
+        - df_population, df_stations: see hex_level
+        - sizes_km: circumradius of the hexagons of each level in km
+    Outputs: A dictionary mapping each size in km to the frame returned by hex_level
+    Postconditions: The hierarchy is cached by the pipeline cache, switching levels needs no recomputation
+    '''
+    return {size_km: hex_level(df_population, df_stations, size_km) for size_km in sizes_km}
@@ -0,0 +1,170 @@
+# Methods associated with updating the per PLZ aggregates incrementally when a new register is published
+import os
+import threading
+import numpy as np
+import pandas as pd
+from core.infrastructure.HelperTools import logger_decorator
+
+
+# Register columns a station row is identified by, a changed value makes it a removed and an added row
+HASH_COLUMNS = ['Postleitzahl', 'Bundesland', 'Breitengrad', 'Längengrad', 'Nennleistung Ladeeinrichtung [kW]']
+
+SNAPSHOT_FILE = 'snapshot.parquet'
+STATE_FILE = 'plz_state.parquet'
+
+# Columns of the per PLZ state, the demand isn't persisted as it depends on the model and parameters selected in the app
+STATE_COLUMNS = ['Einwohner', 'Number', 'KW']
+
+
+# -----------------------------------------------------------------------------
+def register_snapshot(df_register):
+    '''
+    Condenses a register to the row hashes needed to diff it against a later version
+    Inputs: df_register - typed register rows with the columns of HASH_COLUMNS
+    Outputs: A dataframe with one row per distinct station row: hash, PLZ, KW and its multiplicity n
+    Postconditions: None
+    '''
+    columns = [column for column in HASH_COLUMNS if column in df_register.columns]
+    hashes = pd.util.hash_pandas_object(df_register[columns].astype(str), index=False).to_numpy()
+    snapshot = pd.DataFrame({
+        'hash': hashes,
+        'PLZ': df_register['Postleitzahl'].to_numpy().astype('int64'),
+        'KW': df_register['Nennleistung Ladeeinrichtung [kW]'].to_numpy().astype('float64')
+    })
+    return snapshot.groupby('hash', sort=True).agg(PLZ=('PLZ', 'first'), KW=('KW', 'first'), n=('PLZ', 'size')).reset_index()
+
+
+def diff_snapshots(old_snapshot, new_snapshot):
+    '''
+    Diffs two register snapshots
+    Inputs: old_snapshot, new_snapshot - snapshots as returned by register_snapshot
+    Outputs: A dataframe indexed by PLZ with the change of the station count (Number) and of the summed power (KW),
+        only PLZ with added or removed rows are contained
+    Postconditions: None
+    '''
+    merged = old_snapshot.merge(new_snapshot, on='hash', how='outer', suffixes=('_old', '_new'))
+    n_old = merged['n_old'].fillna(0).to_numpy()
+    n_new = merged['n_new'].fillna(0).to_numpy()
+    changed = n_old != n_new
+
+    # A hash identifies the row, so PLZ and KW are the same in both snapshots when both contain it
+    merged = merged[changed]
+    delta = pd.DataFrame({
+        'PLZ': merged['PLZ_new'].fillna(merged['PLZ_old']).astype('int64').to_numpy(),
+        'Number': (n_new - n_old)[changed]
+    })
+    delta['KW'] = merged['KW_new'].fillna(merged['KW_old']).to_numpy() * delta['Number'].to_numpy()
+    return delta.groupby('PLZ').sum().astype({'Number': 'int64'})
+
+
+# -----------------------------------------------------------------------------
+def build_plz_state(snapshot, df_residents):
+    '''
+    Computes the per PLZ state from scratch
+    Inputs:
+        - snapshot: register snapshot as returned by register_snapshot
+        - df_residents: dataframe with the columns PLZ and Einwohner
+    Outputs: A dataframe indexed by PLZ with the columns Einwohner, Number and KW
+    Postconditions: Every PLZ with residents or stations is contained
+    '''
+    counts = pd.DataFrame({'Number': snapshot['n'], 'KW': snapshot['KW'] * snapshot['n'], 'PLZ': snapshot['PLZ']})
+    counts = counts.groupby('PLZ').sum()
+    residents = df_residents.drop_duplicates('PLZ').set_index('PLZ')['Einwohner'].astype('float64')
+
+    df_state = counts.join(residents, how='outer')
+    df_state = df_state.fillna({'Number': 0, 'KW': 0.0}).astype({'Number': 'int64'})
+    return df_state[STATE_COLUMNS].rename_axis('PLZ')
+
+
+def apply_plz_delta(df_state, delta, df_residents=None):
+    '''
+    Applies a register diff to the per PLZ state
+    Inputs:
+        - df_state: state as returned by build_plz_state
+        - delta: register diff as returned by diff_snapshots
+        - df_residents: optional current residents (PLZ, Einwohner), PLZ whose residents changed are updated too
+    Outputs: The updated state and the sorted array of the affected PLZ
+    Postconditions: Only the rows of the affected PLZ are recomputed, PLZ left without stations and residents are dropped
+    '''
+    df_state = df_state.copy()
+    affected = delta.index
+
+    if df_residents is not None:
+        residents = df_residents.drop_duplicates('PLZ').set_index('PLZ')['Einwohner'].astype('float64')
+        residents = residents.reindex(df_state.index.union(residents.index))
+        current = df_state['Einwohner'].reindex(residents.index)
+        changed = ~((residents == current) | (residents.isna() & current.isna()))
+        affected = affected.union(residents.index[changed.to_numpy()])
+
+    new_plz = affected.difference(df_state.index)
+    if len(new_plz):
+        df_new = pd.DataFrame({'Einwohner': np.nan, 'Number': 0, 'KW': 0.0}, index=new_plz)
+        df_state = pd.concat([df_state, df_new.astype(df_state.dtypes.to_dict())]).sort_index()
+
+    rows = df_state.loc[affected].copy()
+    changed_counts = delta.reindex(affected, fill_value=0)
+    rows['Number'] = rows['Number'] + changed_counts['Number'].to_numpy()
+    rows['KW'] = rows['KW'] + changed_counts['KW'].to_numpy()
+    if df_residents is not None:
+        rows['Einwohner'] = residents.reindex(affected).to_numpy()
+
+    df_state.loc[affected, STATE_COLUMNS] = rows[STATE_COLUMNS]
+    empty = df_state.index.isin(affected) & (df_state['Number'] == 0) & df_state['Einwohner'].isna()
+    return df_state[~empty], np.asarray(affected, dtype='int64')
+
+
+# -----------------------------------------------------------------------------
+def _write_parquet(df, path):
+    '''Writes a parquet file atomically, the temporary file is unique per process and thread'''
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@logger_decorator
+def update_register_state(df_register, df_residents, state_dir):
+    '''
+    Updates the persisted per PLZ state with a new version of the register
+    Inputs:
+        - df_register: typed register rows of the region, with the column Postleitzahl
+        - df_residents: dataframe with the columns PLZ and Einwohner
+        - state_dir: directory the snapshot and the state of the last ingested register are stored in
+    Outputs: A dictionary with
+        - 'state': the per PLZ state (Einwohner, Number, KW) indexed by PLZ
+        - 'affected': sorted array of the PLZ whose rows were recomputed
+        - 'full': True if no previous state existed and everything was computed from scratch
+    Postconditions: The snapshot and the state are persisted for the next update
+    '''
+    snapshot_path = os.path.join(state_dir, SNAPSHOT_FILE)
+    state_path = os.path.join(state_dir, STATE_FILE)
+    snapshot = register_snapshot(df_register)
+
+    if os.path.exists(snapshot_path) and os.path.exists(state_path):
+        delta = diff_snapshots(pd.read_parquet(snapshot_path), snapshot)
+        df_state, affected = apply_plz_delta(pd.read_parquet(state_path, columns=STATE_COLUMNS), delta, df_residents)
+        full = False
+    else:
+        df_state = build_plz_state(snapshot, df_residents)
+        affected, full = df_state.index.to_numpy(dtype='int64'), True
+
+    os.makedirs(state_dir, exist_ok=True)
+    # The snapshot is removed before the state is replaced, an interrupted update then rebuilds everything
+    if full or len(affected):
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        _write_parquet(df_state, state_path)
+        _write_parquet(snapshot, snapshot_path)
+    return {'state': df_state, 'affected': affected, 'full': full}
+
+
+# -----------------------------------------------------------------------------
+def station_counts(df_state):
+    '''
+    Station counts of a per PLZ state
+    Inputs: df_state - state as returned by update_register_state
+    Outputs: A dataframe with the columns PLZ, Number and KW in the format of stream_register
+    Postconditions: PLZ without stations are dropped
+    '''
+    counts = df_state.loc[df_state['Number'] > 0, ['Number', 'KW']]
+    return counts.reset_index()
+
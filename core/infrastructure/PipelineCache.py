@@ -0,0 +1,292 @@
+# Methods associated with the content addressed cache shared by all pipeline stages
+import os
+import pickle
+import hashlib
+import functools
+import threading
+import weakref
+from collections import Counter, OrderedDict
+import pandas as pd
+import geopandas as gpd
+from core.infrastructure.Tracing import record_cache
+
+
+# Bump to invalidate every cached stage result, eg. when the pickled classes change
+CACHE_VERSION = 2
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+# The cache all stages use, None runs every stage uncached
+_active_cache = None
+
+# Fingerprints of stamped frames by id, with a weak reference that identifies the frame
+_stamps = {}
+_stamps_lock = threading.RLock()
+
+
+# -----------------------------------------------------------------------------
+def stamp(frame, value):
+    '''
+    Attaches a fingerprint to a dataframe or series
+    Inputs:
+        - frame: the dataframe or series
+        - value: its fingerprint
+    Outputs: The frame
+    Postconditions: The stamp is registered for this object only (attrs would be inherited by copies and slices) and
+        is dropped when the frame is garbage collected or its shape, columns or dtypes change
+    '''
+    key = id(frame)
+    reference = weakref.ref(frame, lambda reference: _drop_stamp(key, reference))
+    with _stamps_lock:
+        _stamps[key] = (reference, _layout(frame), value)
+    return frame
+
+
+def unstamp(frame):
+    '''Drops the fingerprint of a frame whose values were modified in place, it is hashed again when needed'''
+    with _stamps_lock:
+        entry = _stamps.get(id(frame))
+        if entry is not None and entry[0]() is frame:
+            del _stamps[id(frame)]
+    return frame
+
+
+def _drop_stamp(key, reference):
+    '''Removes the stamp of a collected frame, unless the id was reused by a frame stamped since'''
+    with _stamps_lock:
+        if key in _stamps and _stamps[key][0] is reference:
+            del _stamps[key]
+
+
+def _stamped(frame):
+    '''The fingerprint stamped on exactly this frame, None if there is none or the frame changed since'''
+    with _stamps_lock:
+        entry = _stamps.get(id(frame))
+    if entry is None or entry[0]() is not frame or entry[1] != _layout(frame):
+        return None
+    return entry[2]
+
+
+def _layout(frame):
+    '''Shape, column names and dtypes of a frame, replacing or adding a column changes it'''
+    dtypes = frame.dtypes.to_numpy() if isinstance(frame, pd.DataFrame) else [frame.dtype]
+    return frame.shape, _column_names(frame), tuple(map(str, dtypes))
+
+
+def _column_names(frame):
+    return tuple(map(str, frame.columns)) if isinstance(frame, pd.DataFrame) else (str(frame.name),)
+
+
+def _content_hash(frame):
+    '''sha256 of the values, dtypes and index of a dataframe or series'''
+    df = frame.to_frame() if isinstance(frame, pd.Series) else frame
+    digest = hashlib.sha256(repr((type(frame).__name__, _column_names(frame), [str(dtype) for dtype in df.dtypes])).encode())
+    for position in range(df.shape[1]):
+        values = df.iloc[:, position]
+        if isinstance(values.dtype, gpd.array.GeometryDtype):
+            values = gpd.GeoSeries(values).to_wkb()
+        try:
+            digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+        except TypeError:
+            # Unhashable cells like lists
+            digest.update(pickle.dumps(values.to_list()))
+    digest.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def fingerprint(obj):
+    '''
+    Computes a cheap content fingerprint of a stage input
+    Inputs: obj - a dataframe, series, container of inputs or any picklable object
+    Outputs: A hex string that changes whenever the content changes
+    Postconditions: Frames are stamped with their fingerprint, so they are only hashed once (frames loaded from
+        the dataset cache are stamped with their source hash). Values modified in place without changing the layout
+        of the frame need an unstamp, stages therefore never modify their inputs
+    '''
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        stamped = _stamped(obj)
+        if stamped is not None:
+            return stamped
+        value = _content_hash(obj)
+        stamp(obj, value)
+        return value
+    if isinstance(obj, dict):
+        items = sorted((repr(key), fingerprint(value)) for key, value in obj.items())
+        return hashlib.sha256(repr(items).encode()).hexdigest()
+    if isinstance(obj, (list, tuple)):
+        return hashlib.sha256(repr([type(obj).__name__] + [fingerprint(value) for value in obj]).encode()).hexdigest()
+    if obj is None or isinstance(obj, (str, int, float, bool, bytes)):
+        return repr(obj)
+    return hashlib.sha256(pickle.dumps(obj)).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def _detach(value, key):
+    '''Copy of a cached value that callers may modify, frames are stamped with the cache key'''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return stamp(value.copy(), key)
+    if isinstance(value, tuple):
+        return tuple(_detach(item, f"{key}:{position}") for position, item in enumerate(value))
+    if isinstance(value, dict):
+        return {name: _detach(item, f"{key}:{name}") for name, item in value.items()}
+    return value
+
+
+class PipelineCache:
+    '''
+    Two level cache of stage results: a bounded in memory LRU shared by all sessions of the process
+    and an optional directory shared by all processes, both addressed by the fingerprints of the stage inputs
+    '''
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, stage, args, kwargs):
+        '''Content address of a stage call'''
+        return hashlib.sha256(f"{CACHE_VERSION}|{stage}|{fingerprint(args)}|{fingerprint(kwargs)}".encode()).hexdigest()
+
+    def path(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}-{key}.pkl")
+
+    def get(self, stage, key):
+        '''Looks a result up in memory, then on disk; returns (found, value)'''
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                record_cache('pipeline', True)
+                return True, self.memory[key]
+
+        if self.cache_dir is not None:
+            path = self.path(stage, key)
+            try:
+                with open(path, 'rb') as file:
+                    value = pickle.load(file)
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self.stats['disk_hits'] += 1
+                record_cache('pipeline', True)
+                self._remember(key, value)
+                return True, value
+
+        self.stats['misses'] += 1
+        record_cache('pipeline', False)
+        return False, None
+
+    def put(self, stage, key, value):
+        '''Stores a result in memory and, if it can be pickled, on disk'''
+        self._remember(key, value)
+        if self.cache_dir is None:
+            return
+        path = self.path(stage, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _evict_disk(self):
+        '''Removes the least recently used files until the directory fits into max_bytes'''
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['evictions'] += 1
+
+    def call(self, stage, func, args, kwargs):
+        '''Returns the cached result of func(*args, **kwargs), computing and storing it on a miss'''
+        key = self.key(stage, args, kwargs)
+        found, value = self.get(stage, key)
+        if not found:
+            value = func(*args, **kwargs)
+            self.put(stage, key, value)
+        return _detach(value, key)
+
+    def clear(self):
+        '''Empties both levels of the cache'''
+        with self.lock:
+            self.memory.clear()
+        if self.cache_dir is not None:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.pkl'):
+                    os.remove(entry.path)
+
+
+# -----------------------------------------------------------------------------
+def configure_pipeline_cache(cache_dir, paramdict):
+    '''
+    Activates the pipeline cache for all stages
+    Inputs:
+        - cache_dir: directory shared by all processes, None keeps the cache in memory only
+        - paramdict: parameter dictionary with 'pipeline_cache', 'pipeline_cache_entries' and 'pipeline_cache_bytes'
+    Outputs: The active PipelineCache, None if the cache is disabled
+    Postconditions: Calling it again with the same directory keeps the existing cache and its memory level
+    '''
+    global _active_cache
+    if not paramdict.get('pipeline_cache', True):
+        _active_cache = None
+    elif _active_cache is None or _active_cache.cache_dir != cache_dir:
+        _active_cache = PipelineCache(cache_dir,
+                                      paramdict.get('pipeline_cache_entries', DEFAULT_MAX_ENTRIES),
+                                      paramdict.get('pipeline_cache_bytes', DEFAULT_MAX_BYTES))
+    return _active_cache
+
+
+def get_pipeline_cache():
+    '''The active PipelineCache, None if no cache is configured'''
+    return _active_cache
+
+
+def set_pipeline_cache(cache):
+    '''Activates a PipelineCache (None disables caching), eg. to restore the cache returned by get_pipeline_cache'''
+    global _active_cache
+    _active_cache = cache
+
+
+def pipeline_stage(name):
+    '''
+    Caches the results of a pipeline stage in the active PipelineCache
+    Input: name - the stage name, part of the cache key
+    Output: A decorator
+    Postconditions: Without an active cache the stage runs uncached
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active_cache is None:
+                return func(*args, **kwargs)
+            return _active_cache.call(name, func, args, kwargs)
+        return wrapper
+    return decorator
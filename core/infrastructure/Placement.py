@@ -0,0 +1,132 @@
+# Methods associated with proposing locations for new charging stations
+import heapq
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import cKDTree
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.SpatialJoin import to_numeric_coordinates, points_in_polygons
+from core.infrastructure.Coverage import unit_vectors, grid_points, EARTH_RADIUS_KM
+from core.infrastructure.Tracing import traced
+
+
+# A new station serves the demand within SERVICE_KM, weighted by exp(-distance / DECAY_KM). It replaces at most one
+# missing charging station, shared by the PLZ it serves in proportion to their weights
+SERVICE_KM = 3.0
+DECAY_KM = 1.0
+
+# Spacing of the grid of candidate sites inside the PLZ polygons
+DEFAULT_CANDIDATE_GRID_KM = 1.0
+
+
+# -----------------------------------------------------------------------------
+def service_matrix(candidate_lat, candidate_lon, lat, lon, service_km=SERVICE_KM, decay_km=DECAY_KM):
+    '''
+    Computes how much a station at each candidate site serves each demand point
+    Inputs:
+        - candidate_lat, candidate_lon: float arrays of the candidate sites
+        - lat, lon: float arrays of the demand points
+        - service_km, decay_km: service radius and decay length in km
+    Outputs: A sparse csr matrix (candidates x demand points) with the weights exp(-distance / decay_km), rows summing
+        to more than 1 are scaled to 1
+    Postconditions: Only pairs within service_km are stored, they are found with KD-trees on the unit sphere
+    '''
+    candidates = cKDTree(unit_vectors(candidate_lat, candidate_lon))
+    points = cKDTree(unit_vectors(lat, lon))
+    chord = candidates.sparse_distance_matrix(points, 2 * np.sin(service_km / (2 * EARTH_RADIUS_KM)), output_type='coo_matrix')
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord.data / 2, 1.0))
+    weights = sparse.csr_matrix((np.exp(-distance / decay_km), (chord.row, chord.col)), shape=chord.shape)
+    total = np.asarray(weights.sum(axis=1)).ravel()
+    return sparse.diags(1 / np.maximum(total, 1.0)) @ weights
+
+
+def _gain(weights, candidate, unmet, served):
+    '''Unmet demand a new station at the candidate would serve in addition to the stations placed so far'''
+    row = slice(weights.indptr[candidate], weights.indptr[candidate + 1])
+    points, weight = weights.indices[row], weights.data[row]
+    return float(np.sum(np.minimum(unmet[points], served[points] + weight) - np.minimum(unmet[points], served[points])))
+
+
+def lazy_greedy_placement(weights, unmet, n_stations):
+    '''
+    Picks the candidate sites that serve the most unmet demand
+    Inputs:
+        - weights: service matrix (candidates x demand points) returned by service_matrix
+        - unmet: float array with the unmet demand of each demand point, in charging stations
+        - n_stations: number of new stations
+    Outputs: A list of (candidate, gain) tuples in the order the stations were placed
+    Postconditions: The served demand sum(min(unmet, served)) is submodular, so the gains only decrease and a
+        gain computed in an earlier round is an upper bound (CELF). Only the candidate on top of the heap is
+        re-evaluated each round. A site can be picked more than once, once its neighbourhood needs more stations
+    '''
+    unmet = np.asarray(unmet, dtype=float)
+    served = np.zeros(len(unmet))
+
+    # Initial gains of all candidates at once
+    capped = weights.copy()
+    capped.data = np.minimum(capped.data, unmet[capped.indices])
+    gains = np.asarray(capped.sum(axis=1)).ravel()
+
+    heap = [(-gain, candidate) for candidate, gain in enumerate(gains) if gain > 0]
+    heapq.heapify(heap)
+    evaluated = np.zeros(weights.shape[0], dtype=int)
+
+    placed = []
+    while heap and len(placed) < n_stations:
+        negative_gain, candidate = heapq.heappop(heap)
+        # The gain is up to date, so no other candidate can do better
+        if evaluated[candidate] == len(placed):
+            row = slice(weights.indptr[candidate], weights.indptr[candidate + 1])
+            served[weights.indices[row]] += weights.data[row]
+            placed.append((candidate, -negative_gain))
+
+        gain = _gain(weights, candidate, unmet, served)
+        evaluated[candidate] = len(placed)
+        if gain > 0:
+            heapq.heappush(heap, (-gain, candidate))
+    return placed
+
+
+# -----------------------------------------------------------------------------
+@traced('placement')
+@logger_decorator
+@pipeline_stage('propose_stations')
+def propose_stations(df_merged, demand, n_stations, candidate_grid_km=DEFAULT_CANDIDATE_GRID_KM):
+    '''
+    Proposes the sites of new charging stations
+    Inputs:
+        - df_merged: the merged residents and charging stations (PLZ, Breitengrad, Längengrad and the PLZ polygons)
+        - demand: the charging station demand per PLZ aligned with df_merged, eg. the result of compute_demand
+        - n_stations: number of new stations
+        - candidate_grid_km: spacing of the candidate sites, a grid inside the PLZ polygons
+    Outputs: A dataframe with one row per new station: Rank, PLZ, Breitengrad, Längengrad, Gain (unmet demand served,
+        in charging stations) and Served (cumulative)
+    Postconditions: The unmet demand of a PLZ is its positive demand, located at the PLZ centre
+    '''
+    columns = ['Rank', 'PLZ', 'Breitengrad', 'Längengrad', 'Gain', 'Served']
+    unmet = np.clip(np.asarray(demand, dtype=float), 0, None)
+    lat = to_numeric_coordinates(df_merged['Breitengrad'])
+    lon = to_numeric_coordinates(df_merged['Längengrad'])
+    located = (unmet > 0) & ~(np.isnan(lat) | np.isnan(lon))
+    if n_stations <= 0 or not located.any():
+        return pd.DataFrame(columns=columns)
+
+    polygons = df_merged.geometry.to_numpy()
+    candidate_lat, candidate_lon = grid_points(df_merged.geometry.total_bounds, candidate_grid_km)
+    polygon = points_in_polygons(candidate_lon, candidate_lat, polygons)
+    inside = polygon >= 0
+
+    weights = service_matrix(candidate_lat[inside], candidate_lon[inside], lat[located], lon[located])
+    placed = lazy_greedy_placement(weights, unmet[located], n_stations)
+
+    candidate = np.array([site for site, _ in placed], dtype=int)
+    gain = np.array([gain for _, gain in placed])
+    return pd.DataFrame({
+        'Rank': np.arange(1, len(placed) + 1),
+        'PLZ': df_merged['PLZ'].to_numpy()[polygon[inside][candidate]],
+        'Breitengrad': candidate_lat[inside][candidate].round(5),
+        'Längengrad': candidate_lon[inside][candidate].round(5),
+        'Gain': gain.round(2),
+        'Served': gain.cumsum().round(2)
+    }, columns=columns)
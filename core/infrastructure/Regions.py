@@ -0,0 +1,132 @@
+# Methods associated with restricting the pipeline to a region (a Bundesland or all of Germany)
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from core.infrastructure.Coverage import unit_vectors
+from core.infrastructure.SpatialJoin import to_numeric_coordinates
+
+
+REGION_GERMANY = 'Deutschland'
+
+BUNDESLAENDER = [
+    'Baden-Württemberg', 'Bayern', 'Berlin', 'Brandenburg', 'Bremen', 'Hamburg', 'Hessen',
+    'Mecklenburg-Vorpommern', 'Niedersachsen', 'Nordrhein-Westfalen', 'Rheinland-Pfalz', 'Saarland',
+    'Sachsen', 'Sachsen-Anhalt', 'Schleswig-Holstein', 'Thüringen'
+]
+
+# Exclusive PLZ windows of regions that can be selected by PLZ alone,
+# 'lstat' applies to the charging station register and 'resid' to the residents table
+DEFAULT_PLZ_RANGES = {
+    'Berlin': {'lstat': (10115, 14200), 'resid': (10000, 14200)}
+}
+
+
+# -----------------------------------------------------------------------------
+def get_region(paramdict):
+    '''
+    Reads the selected region from the parameter dictionary
+    Inputs: paramdict - parameter dictionary
+    Outputs: The region name, Berlin if none is configured
+    Postconditions: A ValueError is raised for unknown regions
+    '''
+    region = paramdict.get('region', 'Berlin')
+    if region != REGION_GERMANY and region not in BUNDESLAENDER:
+        raise ValueError(f"Unknown region: {region}. Use a Bundesland or '{REGION_GERMANY}'.")
+    return region
+
+
+def region_plz_range(region, dataset, paramdict):
+    '''The PLZ window of a region for the given dataset ('lstat' or 'resid'), None if the region has none'''
+    return paramdict.get('region_plz_ranges', DEFAULT_PLZ_RANGES).get(region, {}).get(dataset)
+
+
+# -----------------------------------------------------------------------------
+def filter_register_by_region(df_register, region, paramdict):
+    '''
+    Keeps the charging stations of a region
+    Inputs:
+        - df_register: charging station dataframe with the columns PLZ and Bundesland
+        - region: a Bundesland or REGION_GERMANY
+        - paramdict: parameter dictionary, may override the PLZ windows with 'region_plz_ranges'
+    Outputs: The filtered dataframe
+    Postconditions: None
+    '''
+    if region == REGION_GERMANY:
+        return df_register
+
+    mask = df_register["Bundesland"] == region
+    plz_range = region_plz_range(region, 'lstat', paramdict)
+    if plz_range is not None:
+        mask &= (df_register["PLZ"] > plz_range[0]) & (df_register["PLZ"] < plz_range[1])
+    return df_register[mask]
+
+
+# -----------------------------------------------------------------------------
+def filter_residents_by_region(df_residents, region, paramdict):
+    '''
+    Keeps the residents of a region that can be selected by its PLZ window
+    Inputs:
+        - df_residents: residents dataframe with the column PLZ
+        - region: a Bundesland or REGION_GERMANY
+        - paramdict: parameter dictionary, may override the PLZ windows with 'region_plz_ranges'
+    Outputs: The filtered dataframe
+    Postconditions: Regions without a PLZ window are not filtered here, their residents are
+        partitioned beforehand with resident_bundesland_lookup
+    '''
+    plz_range = region_plz_range(region, 'resid', paramdict)
+    if region == REGION_GERMANY or plz_range is None:
+        return df_residents
+    return df_residents[(df_residents["PLZ"] > plz_range[0]) & (df_residents["PLZ"] < plz_range[1])]
+
+
+# -----------------------------------------------------------------------------
+def plz_bundesland_lookup(df_register):
+    '''
+    Derives the Bundesland of every PLZ from the charging station register
+    Inputs: df_register - the raw register with the columns Postleitzahl and Bundesland
+    Outputs: A series mapping each PLZ to the Bundesland most of its stations are registered in
+    Postconditions: None
+    '''
+    counts = df_register.groupby(['Postleitzahl', 'Bundesland'], observed=True).size().reset_index(name='n')
+    counts = counts.sort_values(['Postleitzahl', 'n'], ascending=[True, False]).drop_duplicates('Postleitzahl')
+    return pd.Series(counts['Bundesland'].astype(str).to_numpy(), index=counts['Postleitzahl'].to_numpy())
+
+
+def resident_bundesland_lookup(df_register, df_residents):
+    '''
+    Derives the Bundesland of every PLZ of the residents table
+    Inputs:
+        - df_register: the raw register with the columns Postleitzahl, Bundesland, Breitengrad and Längengrad
+        - df_residents: the raw residents table with the columns plz, lat and lon
+    Outputs: A series mapping each resident PLZ to a Bundesland
+    Postconditions: PLZ with stations get the Bundesland of plz_bundesland_lookup, PLZ without any station the
+        Bundesland of the station closest to their coordinates. PLZ without coordinates are left out
+    '''
+    lookup = plz_bundesland_lookup(df_register)
+    df_rest = df_residents.drop_duplicates('plz')
+    df_rest = df_rest[~df_rest['plz'].isin(lookup.index)]
+
+    station_lat, station_lon = to_numeric_coordinates(df_register['Breitengrad']), to_numeric_coordinates(df_register['Längengrad'])
+    located = ~(np.isnan(station_lat) | np.isnan(station_lon))
+    lat, lon = to_numeric_coordinates(df_rest['lat']), to_numeric_coordinates(df_rest['lon'])
+    resident_located = ~(np.isnan(lat) | np.isnan(lon))
+    if df_rest.empty or not located.any() or not resident_located.any():
+        return lookup
+
+    # The nearest station is searched on the unit sphere like the coverage distances
+    tree = cKDTree(unit_vectors(station_lat[located], station_lon[located]))
+    _, nearest = tree.query(unit_vectors(lat[resident_located], lon[resident_located]))
+    bundesland = df_register['Bundesland'].astype(str).to_numpy()[located][nearest]
+    rest = pd.Series(bundesland, index=df_rest['plz'].to_numpy()[resident_located])
+    return pd.concat([lookup, rest])
+
+
+# -----------------------------------------------------------------------------
+def partition_regions(region):
+    '''
+    Lists the partitions the pipeline is run for
+    Inputs: region - a Bundesland or REGION_GERMANY
+    Outputs: The list of Bundesländer that are processed one after the other
+    Postconditions: None
+    '''
+    return list(BUNDESLAENDER) if region == REGION_GERMANY else [region]
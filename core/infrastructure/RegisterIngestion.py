@@ -0,0 +1,150 @@
+# Methods associated with streaming the charging station register in chunks
+import pandas as pd
+import geopandas as gpd
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.Regions import filter_register_by_region
+from core.infrastructure.SpatialJoin import to_numeric_coordinates
+from core.infrastructure.Tracing import traced
+
+
+# The only register columns the pipeline uses and the dtypes they are parsed with
+REGISTER_COLUMNS = {
+    'Postleitzahl': 'string',
+    'Bundesland': 'category',
+    'Breitengrad': 'float64',
+    'Längengrad': 'float64',
+    'Nennleistung Ladeeinrichtung [kW]': 'float64'
+}
+
+# Columns in German number format, parsed natively with decimal=','
+DECIMAL_COLUMNS = ['Breitengrad', 'Längengrad', 'Nennleistung Ladeeinrichtung [kW]']
+
+DEFAULT_CHUNKSIZE = 100000
+
+
+# -----------------------------------------------------------------------------
+def _open_register(path, dtypes, chunksize, skip):
+    '''A chunked csv reader of the register that starts after the first skip rows'''
+    return pd.read_csv(path, delimiter=';', usecols=list(REGISTER_COLUMNS), dtype=dtypes, decimal=',',
+                       skiprows=(lambda line: 0 < line <= skip) if skip else None, chunksize=chunksize)
+
+
+def _read_malformed_chunk(path, chunksize, skip):
+    '''Reads one chunk with the DECIMAL_COLUMNS as strings, malformed values become NaN'''
+    dtypes = dict(REGISTER_COLUMNS, **{column: 'string' for column in DECIMAL_COLUMNS})
+    with _open_register(path, dtypes, chunksize, skip) as reader:
+        chunk = next(reader)
+    for column in DECIMAL_COLUMNS:
+        chunk[column] = to_numeric_coordinates(chunk[column])
+    return chunk
+
+
+def read_register_chunks(path, chunksize=DEFAULT_CHUNKSIZE):
+    '''
+    Reads the charging station register chunk by chunk
+    Inputs:
+        - path: path of the semicolon separated register csv
+        - chunksize: number of rows per chunk
+    Outputs: An iterator of typed dataframes with the columns of REGISTER_COLUMNS
+    Postconditions: Only the used columns are parsed, decimal commas are read natively by the csv parser. Only a chunk
+        with a malformed number is read again as strings, its malformed values become NaN. Rows without a numeric
+        Postleitzahl are dropped
+    '''
+    rows = 0
+    reader = _open_register(path, REGISTER_COLUMNS, chunksize, rows)
+    try:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except ValueError:
+                # A failed reader can't be resumed, the chunk is read again and a new reader continues after it
+                reader.close()
+                chunk = _read_malformed_chunk(path, chunksize, rows)
+                reader = _open_register(path, REGISTER_COLUMNS, chunksize, rows + len(chunk))
+            rows += len(chunk)
+            chunk['Postleitzahl'] = pd.to_numeric(chunk['Postleitzahl'], errors='coerce')
+            chunk = chunk.dropna(subset=['Postleitzahl'])
+            chunk['Postleitzahl'] = chunk['Postleitzahl'].astype('int32')
+            yield chunk
+    finally:
+        reader.close()
+
+
+# -----------------------------------------------------------------------------
+def _region_rows(chunk, region, paramdict):
+    '''Rows of a raw register chunk that belong to the region'''
+    if region is None:
+        return chunk
+    filtered = filter_register_by_region(chunk.rename(columns={'Postleitzahl': 'PLZ'}), region, paramdict)
+    return chunk.loc[filtered.index]
+
+
+def aggregate_chunk(chunk):
+    '''
+    Aggregates the stations of one chunk per PLZ
+    Inputs: chunk - a register chunk as returned by read_register_chunks
+    Outputs: A dataframe indexed by PLZ with the station count (Number) and the summed power (KW)
+    Postconditions: None
+    '''
+    return chunk.groupby('Postleitzahl').agg(
+        Number=('Postleitzahl', 'size'),
+        KW=('Nennleistung Ladeeinrichtung [kW]', 'sum')
+    ).rename_axis('PLZ')
+
+
+# -----------------------------------------------------------------------------
+@traced('csv_read.register')
+@logger_decorator
+def stream_register(path, paramdict, region=None, keep_stations=True, chunksize=DEFAULT_CHUNKSIZE):
+    '''
+    Streams the register once, filtering and aggregating every chunk
+    Inputs:
+        - path: path of the register csv
+        - paramdict: parameter dictionary
+        - region: a Bundesland or 'Deutschland', None keeps every row
+        - keep_stations: if False only the aggregates are kept, so memory does not grow with the register
+        - chunksize: number of rows per chunk
+    Outputs: A dictionary with
+        - 'stations': the typed station rows of the region (None if keep_stations is False)
+        - 'counts': a dataframe with the columns PLZ, Number and KW summed over all chunks
+    Postconditions: None
+    '''
+    stations = []
+    counts = None
+    for chunk in read_register_chunks(path, chunksize):
+        chunk = _region_rows(chunk, region, paramdict)
+        chunk_counts = aggregate_chunk(chunk)
+        counts = chunk_counts if counts is None else counts.add(chunk_counts, fill_value=0)
+        if keep_stations:
+            stations.append(chunk)
+
+    if counts is None:
+        counts = pd.DataFrame({'Number': [], 'KW': []}).rename_axis('PLZ')
+    counts = counts.astype({'Number': 'int64'}).sort_index().reset_index()
+
+    if not keep_stations:
+        return {'stations': None, 'counts': counts}
+
+    df_stations = pd.concat(stations, ignore_index=True) if stations else \
+        pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in REGISTER_COLUMNS.items()})
+    return {'stations': df_stations, 'counts': counts}
+
+
+# -----------------------------------------------------------------------------
+def counts_with_geometry(df_counts, df_geo, paramdict):
+    '''
+    Adds the PLZ polygons to streamed counts
+    Inputs:
+        - df_counts: the 'counts' dataframe returned by stream_register
+        - df_geo: geodataframe with the PLZ polygons
+        - paramdict: parameter dictionary
+    Outputs: A geodataframe in the format of count_plz_occurrences (PLZ, Number, geometry) plus the KW column
+    Postconditions: PLZ without a polygon are dropped
+    '''
+    merged = df_counts.merge(df_geo[[paramdict["geocode"], 'geometry']], left_on='PLZ', right_on=paramdict["geocode"], how='inner')
+    merged = merged[['PLZ', 'Number', 'geometry', 'KW']]
+    if not isinstance(merged['geometry'].dtype, gpd.array.GeometryDtype):
+        merged['geometry'] = gpd.GeoSeries.from_wkt(merged['geometry'])
+    return gpd.GeoDataFrame(merged, geometry='geometry')
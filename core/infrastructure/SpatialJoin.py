@@ -0,0 +1,95 @@
+# Methods associated with assigning charging stations to PLZ polygons by their coordinates
+import numpy as np
+import pandas as pd
+import shapely
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import pipeline_stage
+
+
+# -----------------------------------------------------------------------------
+def to_numeric_coordinates(series):
+    '''
+    Converts a coordinate column to floats
+    Inputs: series - a column with floats or strings in German number format (eg. "52,5321")
+    Outputs: A float64 numpy array, unparsable values become NaN
+    Postconditions: None
+    '''
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype='float64')
+    return pd.to_numeric(series.astype(str).str.replace(',', '.', regex=False), errors='coerce').to_numpy(dtype='float64')
+
+
+# -----------------------------------------------------------------------------
+def points_in_polygons(lon, lat, polygons):
+    '''
+    Finds the polygon each point lies in
+    Inputs:
+        - lon, lat: float arrays of the point coordinates
+        - polygons: array of the polygons
+    Outputs: An integer array with the position of the polygon covering each point, -1 if there is none
+    Postconditions: Points on a border shared by two polygons are assigned to the first of them.
+        An STRtree selects the polygons that overlap the points at all, the points are then swept in
+        longitude order and tested with intersects_xy, so no shapely point objects have to be created
+    '''
+    result = np.full(len(lon), -1, dtype=np.int64)
+    valid = np.flatnonzero(~(np.isnan(lon) | np.isnan(lat)))
+    if len(valid) == 0 or len(polygons) == 0:
+        return result
+
+    # Sort the points by longitude once, the points inside a bounding box are then a contiguous slice
+    order = valid[np.argsort(lon[valid], kind='stable')]
+    xs, ys = lon[order], lat[order]
+
+    tree = shapely.STRtree(polygons)
+    candidates = np.sort(tree.query(shapely.box(xs[0], ys.min(), xs[-1], ys.max())))
+    bounds = shapely.bounds(polygons)
+    shapely.prepare(polygons[candidates])
+
+    for polygon_idx in candidates:
+        minx, miny, maxx, maxy = bounds[polygon_idx]
+        start, stop = np.searchsorted(xs, minx, side='left'), np.searchsorted(xs, maxx, side='right')
+        in_box = np.flatnonzero((ys[start:stop] >= miny) & (ys[start:stop] <= maxy)) + start
+        # contains_xy would exclude the boundary and lose points on shared borders
+        inside = in_box[shapely.intersects_xy(polygons[polygon_idx], xs[in_box], ys[in_box])]
+        hits = order[inside]
+        result[hits[result[hits] < 0]] = polygon_idx
+    return result
+
+
+# -----------------------------------------------------------------------------
+@logger_decorator
+@pipeline_stage('assign_stations_to_plz')
+def assign_stations_to_plz(df_stations, df_geo, paramdict):
+    '''
+    Assigns every charging station to the PLZ polygon that contains its coordinates
+    Inputs:
+        - df_stations: the charging station register with the columns Postleitzahl, Breitengrad and Längengrad
+        - df_geo: a geodataframe with the PLZ polygons
+        - paramdict: parameter dictionary, 'plz_assignment' decides which PLZ is kept:
+            'spatial' replaces the stated PLZ by the one found from the coordinates, 'register' keeps the stated PLZ
+    Outputs: A copy of df_stations with numeric coordinates and the columns
+        - PLZ_geo: the PLZ found from the coordinates (<NA> if the station lies outside all polygons)
+        - PLZ_mismatch: True if the stated PLZ is covered by df_geo but the coordinates lie in another polygon
+    Postconditions: None
+    '''
+    df_result = df_stations.copy()
+    lat = to_numeric_coordinates(df_result['Breitengrad'])
+    lon = to_numeric_coordinates(df_result['Längengrad'])
+    df_result['Breitengrad'] = lat
+    df_result['Längengrad'] = lon
+
+    geo_plz = df_geo[paramdict["geocode"]].to_numpy()
+    hits = points_in_polygons(lon, lat, df_geo.geometry.to_numpy())
+    plz_geo = pd.array(geo_plz[hits], dtype='Int64')
+    plz_geo[hits < 0] = pd.NA
+    df_result['PLZ_geo'] = plz_geo
+
+    stated_plz = pd.to_numeric(df_result['Postleitzahl'], errors='coerce')
+    covered = stated_plz.isin(geo_plz)
+    df_result['PLZ_mismatch'] = (covered & (df_result['PLZ_geo'] != stated_plz).fillna(True)).astype(bool)
+
+    if paramdict.get('plz_assignment', 'register') == 'spatial':
+        located = df_result['PLZ_geo'].notna()
+        df_result.loc[located, 'Postleitzahl'] = df_result.loc[located, 'PLZ_geo'].astype('int64')
+
+    return df_result
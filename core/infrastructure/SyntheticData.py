@@ -0,0 +1,268 @@
+# Methods associated with generating synthetic registers, residents and PLZ polygons for load tests,
+# run with: python -m core.infrastructure.SyntheticData --polygons 8200 --stations 1000000 --output datasets/synthetic
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from core.infrastructure.Regions import BUNDESLAENDER
+
+
+# Bounding box of Germany (lon/lat)
+GERMANY_BOUNDS = (5.87, 47.27, 15.04, 55.06)
+
+# Capital of every Bundesland, cells are assigned to the Bundesland of the nearest capital
+CAPITALS = {
+    'Baden-Württemberg': ('Stuttgart', 9.18, 48.78), 'Bayern': ('München', 11.58, 48.14),
+    'Berlin': ('Berlin', 13.40, 52.52), 'Brandenburg': ('Potsdam', 13.06, 52.39),
+    'Bremen': ('Bremen', 8.80, 53.08), 'Hamburg': ('Hamburg', 9.99, 53.55),
+    'Hessen': ('Wiesbaden', 8.24, 50.08), 'Mecklenburg-Vorpommern': ('Schwerin', 11.41, 53.63),
+    'Niedersachsen': ('Hannover', 9.73, 52.37), 'Nordrhein-Westfalen': ('Düsseldorf', 6.77, 51.23),
+    'Rheinland-Pfalz': ('Mainz', 8.27, 50.00), 'Saarland': ('Saarbrücken', 6.99, 49.24),
+    'Sachsen': ('Dresden', 13.74, 51.05), 'Sachsen-Anhalt': ('Magdeburg', 11.63, 52.13),
+    'Schleswig-Holstein': ('Kiel', 10.13, 54.32), 'Thüringen': ('Erfurt', 11.03, 50.98)
+}
+
+# Further large cities, PLZ are denser and stations more frequent around all cities
+CITIES = [(name, lon, lat) for name, lon, lat in CAPITALS.values()] + [
+    ('Köln', 6.96, 50.94), ('Frankfurt am Main', 8.68, 50.11), ('Leipzig', 12.37, 51.34), ('Nürnberg', 11.08, 49.45),
+    ('Dortmund', 7.47, 51.51), ('Essen', 7.01, 51.46), ('Duisburg', 6.76, 51.43), ('Bochum', 7.22, 51.48)
+]
+
+# PLZ range of every Bundesland (simplified to one range each, the Berlin range matches the region filter)
+PLZ_RANGES = {
+    'Sachsen': (1001, 9999), 'Berlin': (10115, 14199), 'Brandenburg': (14400, 16999),
+    'Mecklenburg-Vorpommern': (17000, 19999), 'Hamburg': (20000, 22999), 'Schleswig-Holstein': (23000, 25999),
+    'Bremen': (28000, 28999), 'Niedersachsen': (29000, 37999), 'Sachsen-Anhalt': (38000, 39999),
+    'Nordrhein-Westfalen': (40000, 53999), 'Rheinland-Pfalz': (54000, 56999), 'Hessen': (57000, 65999),
+    'Saarland': (66000, 66999), 'Baden-Württemberg': (67000, 79999), 'Bayern': (80000, 97999),
+    'Thüringen': (98000, 99999)
+}
+
+# Distribution of the charging power in kW, the share of fast chargers grows in the real register
+POWER_KW = [3.7, 11.0, 22.0, 50.0, 150.0, 300.0]
+POWER_SHARE = [0.03, 0.22, 0.50, 0.10, 0.10, 0.05]
+
+OPERATORS = ['EnBW mobility+ AG und Co.KG', 'E.ON Drive GmbH', 'Allego GmbH', 'Stadtwerke', 'IONITY GmbH',
+             'Tesla Germany GmbH', 'EWE Go GmbH', 'Vattenfall Europe Innovation GmbH']
+STREETS = ['Hauptstraße', 'Bahnhofstraße', 'Schulstraße', 'Gartenstraße', 'Dorfstraße', 'Berliner Straße',
+           'Lindenstraße', 'Kirchstraße', 'Industriestraße', 'Am Markt']
+
+REGISTER_COLUMNS = ['Betreiber', 'Straße', 'Hausnummer', 'Adresszusatz', 'Postleitzahl', 'Ort', 'Bundesland',
+                    'Kreis/kreisfreie Stadt', 'Breitengrad', 'Längengrad', 'Inbetriebnahmedatum',
+                    'Nennleistung Ladeeinrichtung [kW]', 'Art der Ladeeinrichung', 'Anzahl Ladepunkte',
+                    'Steckertypen1', 'P1 [kW]']
+
+# Rough size of one degree in km at the latitude of Germany
+KM_PER_DEGREE = (71.0, 111.0)
+
+
+# -----------------------------------------------------------------------------
+def _nearest(lon, lat, points):
+    '''Index of the nearest of the (name, lon, lat) points for every coordinate'''
+    coordinates = np.array([(point[1], point[2]) for point in points])
+    distances = ((lon[:, None] - coordinates[:, 0]) * KM_PER_DEGREE[0]) ** 2 + \
+                ((lat[:, None] - coordinates[:, 1]) * KM_PER_DEGREE[1]) ** 2
+    return distances.argmin(axis=1)
+
+
+def _assign_plz(bundesland, lon, lat):
+    '''Numbers the cells of every Bundesland within its PLZ range, north-west to south-east'''
+    plz = np.zeros(len(bundesland), dtype='int64')
+    for state, (start, end) in PLZ_RANGES.items():
+        cells = np.flatnonzero(bundesland == state)
+        if len(cells) == 0:
+            continue
+        if len(cells) > end - start + 1:
+            # More cells than the range can number (scales beyond Germany): synthetic six digit PLZ
+            return 100000 + np.lexsort((lon, -lat))
+        order = cells[np.lexsort((lon[cells], -lat[cells]))]
+        plz[order] = np.round(np.linspace(start, end, len(cells) + 1)[:-1]).astype('int64')
+    return plz
+
+
+def synthetic_plz_polygons(n_polygons, vertices=100, bounds=GERMANY_BOUNDS, urban_share=0.6, seed=0):
+    '''
+    Generates PLZ polygons that tile a bounding box
+    Inputs:
+        - n_polygons: number of polygons
+        - vertices: approximate number of vertices per polygon
+        - bounds: the tiled bounding box (lon/lat)
+        - urban_share: share of the polygons that are clustered around the large cities
+        - seed: seed of the random generator
+    Outputs: A geodataframe with the columns PLZ, Bundesland, Ort and geometry, sorted by PLZ
+    Postconditions: The polygons are the Voronoi cells of random seed points, small in cities and large in the countryside
+    '''
+    rng = np.random.default_rng(seed)
+    n_urban = int(n_polygons * urban_share)
+    city = rng.integers(0, len(CITIES), n_urban)
+    centers = np.array([(lon, lat) for _, lon, lat in CITIES])[city]
+    urban = centers + rng.normal(0, 0.12, (n_urban, 2)) * [1.0, 0.65]
+    rural = rng.uniform(bounds[:2], bounds[2:], (n_polygons - n_urban, 2))
+    points = np.clip(np.vstack([urban, rural]), bounds[:2], bounds[2:])
+    points += rng.uniform(-1e-6, 1e-6, points.shape)
+
+    box = shapely.box(*bounds)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=box, ordered=True))
+    cells = shapely.intersection(cells, box)
+    perimeter = shapely.length(cells)
+    cells = np.array([shapely.segmentize(cell, length / vertices) for cell, length in zip(cells, perimeter)])
+
+    lon, lat = points[:, 0], points[:, 1]
+    bundesland = np.array(BUNDESLAENDER)[_nearest(lon, lat, [CAPITALS[state] for state in BUNDESLAENDER])]
+    gdf = gpd.GeoDataFrame({
+        'PLZ': _assign_plz(bundesland, lon, lat),
+        'Bundesland': bundesland,
+        'Ort': np.array([name for name, _, _ in CITIES])[_nearest(lon, lat, CITIES)]
+    }, geometry=cells, crs='EPSG:4326')
+    return gdf.sort_values('PLZ', ignore_index=True)
+
+
+# -----------------------------------------------------------------------------
+def synthetic_residents(gdf_geo, seed=0):
+    '''
+    Generates the residents table of the polygons
+    Inputs:
+        - gdf_geo: polygons as returned by synthetic_plz_polygons
+        - seed: seed of the random generator
+    Outputs: A dataframe in the format of plz_einwohner.csv (plz, note, einwohner, qkm, lat, lon)
+    Postconditions: The number of residents per PLZ is lognormal around 9000 like in the real table
+    '''
+    rng = np.random.default_rng(seed)
+    centroids = shapely.centroid(gdf_geo.geometry.values)
+    bounds = shapely.bounds(gdf_geo.geometry.values)
+    mid_lat = np.radians((bounds[:, 1] + bounds[:, 3]) / 2)
+    qkm = shapely.area(gdf_geo.geometry.values) * KM_PER_DEGREE[1] ** 2 * np.cos(mid_lat)
+    return pd.DataFrame({
+        'plz': gdf_geo['PLZ'].to_numpy(),
+        'note': [f"{plz:05d} {ort}" for plz, ort in zip(gdf_geo['PLZ'], gdf_geo['Ort'])],
+        'einwohner': np.maximum(rng.lognormal(np.log(9000), 0.6, len(gdf_geo)).round(), 1).astype('int64'),
+        'qkm': qkm.round(6),
+        'lat': shapely.get_y(centroids).round(5),
+        'lon': shapely.get_x(centroids).round(5)
+    })
+
+
+def _points_in_polygons(polygons, rng):
+    '''One uniformly distributed point in each of the polygons (rejection sampling)'''
+    bounds = shapely.bounds(polygons)
+    lon, lat = np.empty(len(polygons)), np.empty(len(polygons))
+    missing = np.arange(len(polygons))
+    while len(missing):
+        x = rng.uniform(bounds[missing, 0], bounds[missing, 2])
+        y = rng.uniform(bounds[missing, 1], bounds[missing, 3])
+        inside = shapely.contains_xy(polygons[missing], x, y)
+        lon[missing[inside]], lat[missing[inside]] = x[inside], y[inside]
+        missing = missing[~inside]
+    return lon, lat
+
+
+def _german_decimal(values, decimals):
+    '''Formats numbers with a decimal comma like the register does'''
+    return np.char.replace(np.char.mod(f"%.{decimals}f", values), '.', ',')
+
+
+def synthetic_register(gdf_geo, df_residents, n_stations, seed=0):
+    '''
+    Generates charging stations in the schema of the Ladesaeulenregister
+    Inputs:
+        - gdf_geo: polygons as returned by synthetic_plz_polygons
+        - df_residents: residents as returned by synthetic_residents, stations are distributed proportional to them
+        - n_stations: number of register rows
+        - seed: seed of the random generator
+    Outputs: A dataframe as pd.read_csv(..., delimiter=';') reads the register: Postleitzahl as integer,
+        the coordinates as strings with decimal commas, the power in kW as float
+    Postconditions: Every station lies inside the polygon of its PLZ
+    '''
+    rng = np.random.default_rng(seed)
+    residents = df_residents.set_index('plz')['einwohner'].reindex(gdf_geo['PLZ']).fillna(0).to_numpy(dtype=float)
+    weights = residents ** 1.1
+    cell = rng.choice(len(gdf_geo), n_stations, p=weights / weights.sum())
+    lon, lat = _points_in_polygons(gdf_geo.geometry.values[cell], rng)
+
+    power = rng.choice(POWER_KW, n_stations, p=POWER_SHARE)
+    fast = power > 22
+    days = rng.integers(0, 15 * 365, n_stations)
+    ort = gdf_geo['Ort'].to_numpy()[cell]
+    return pd.DataFrame({
+        'Betreiber': rng.choice(OPERATORS, n_stations),
+        'Straße': rng.choice(STREETS, n_stations),
+        'Hausnummer': rng.integers(1, 200, n_stations).astype(str),
+        'Adresszusatz': '',
+        'Postleitzahl': gdf_geo['PLZ'].to_numpy()[cell],
+        'Ort': ort,
+        'Bundesland': gdf_geo['Bundesland'].to_numpy()[cell],
+        'Kreis/kreisfreie Stadt': ort,
+        'Breitengrad': _german_decimal(lat, 6),
+        'Längengrad': _german_decimal(lon, 6),
+        'Inbetriebnahmedatum': (pd.Timestamp('2010-01-01') + pd.to_timedelta(days, unit='D')).strftime('%d.%m.%Y'),
+        'Nennleistung Ladeeinrichtung [kW]': power,
+        'Art der Ladeeinrichung': np.where(fast, 'Schnellladeeinrichtung', 'Normalladeeinrichtung'),
+        'Anzahl Ladepunkte': rng.integers(1, 3, n_stations),
+        'Steckertypen1': np.where(fast, 'DC Kupplung Combo, AC Kupplung Typ 2', 'AC Steckdose Typ 2'),
+        'P1 [kW]': power
+    }, columns=REGISTER_COLUMNS)
+
+
+# -----------------------------------------------------------------------------
+def write_register_csv(path, gdf_geo, df_residents, n_stations, seed=0, chunksize=100000):
+    '''
+    Writes a synthetic register csv chunk by chunk, so millions of stations fit into memory
+    Inputs:
+        - path: the csv file
+        - gdf_geo, df_residents: polygons and residents the stations are generated for
+        - n_stations: number of register rows
+        - seed: seed of the random generator, every chunk derives its own seed from it
+        - chunksize: number of rows generated at a time
+    Outputs: None
+    Postconditions: The file is semicolon separated with decimal commas and zero padded PLZ like the real register
+    '''
+    seeds = np.random.SeedSequence(seed).spawn(max(1, -(-n_stations // chunksize)))
+    for position, start in enumerate(range(0, max(n_stations, 1), chunksize)):
+        chunk = synthetic_register(gdf_geo, df_residents, min(chunksize, n_stations - start), seeds[position])
+        chunk['Postleitzahl'] = chunk['Postleitzahl'].map('{:05d}'.format)
+        chunk.to_csv(path, sep=';', decimal=',', index=False, mode='w' if position == 0 else 'a', header=position == 0)
+
+
+def write_synthetic_datasets(directory, n_polygons, n_stations, paramdict, vertices=100, seed=0):
+    '''
+    Writes a complete synthetic dataset the pipeline can be run on
+    Inputs:
+        - directory: the target directory
+        - n_polygons: number of PLZ polygons
+        - n_stations: number of register rows
+        - paramdict: parameter dictionary with the file names (file_lstations, file_residents, file_geodat_plz)
+        - vertices: approximate number of vertices per polygon
+        - seed: seed of the random generators
+    Outputs: A dictionary with the written paths
+    Postconditions: The files have the formats of the real datasets
+    '''
+    os.makedirs(directory, exist_ok=True)
+    gdf_geo = synthetic_plz_polygons(n_polygons, vertices, seed=seed)
+    df_residents = synthetic_residents(gdf_geo, seed)
+
+    paths = {
+        'geodat_plz': os.path.join(directory, paramdict['file_geodat_plz']),
+        'residents': os.path.join(directory, paramdict['file_residents']),
+        'lstat': os.path.join(directory, paramdict['file_lstations'])
+    }
+    pd.DataFrame({'PLZ': gdf_geo['PLZ'], 'geometry': gdf_geo.geometry.to_wkt()}).to_csv(paths['geodat_plz'], sep=';', index=False)
+    df_residents.assign(plz=df_residents['plz'].map('{:05d}'.format)).to_csv(paths['residents'], index=False)
+    write_register_csv(paths['lstat'], gdf_geo, df_residents, n_stations, seed)
+    return paths
+
+
+if __name__ == '__main__':
+    from config import pdict
+
+    parser = argparse.ArgumentParser(description="Writes synthetic PLZ polygons, residents and a charging station register")
+    parser.add_argument('--polygons', type=int, default=8200)
+    parser.add_argument('--stations', type=int, default=100000)
+    parser.add_argument('--vertices', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join('datasets', 'synthetic'))
+    args = parser.parse_args()
+
+    for name, path in write_synthetic_datasets(args.output, args.polygons, args.stations, pdict, args.vertices, args.seed).items():
+        print(f"{name}: {path}")
@@ -0,0 +1,189 @@
+# Methods associated with recording nested spans of the pipeline stages and exporting them as a trace
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+import pandas as pd
+
+
+# Finished spans kept in memory, older spans are dropped
+MAX_SPANS = 10000
+
+
+class Tracer:
+    '''
+    Records nested spans with wall time, CPU time, peak traced memory and cache hits/misses.
+    Every thread has its own span stack, a span without a parent starts a new trace
+    '''
+
+    def __init__(self, max_spans=MAX_SPANS, memory=False):
+        self.spans = deque(maxlen=max_spans)
+        self.memory = memory
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.trace_ids = iter(range(1, 2 ** 62))
+        self.origin = time.perf_counter()
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+            self.local.trace_id = None
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name, **args):
+        '''
+        Records the enclosed block as a span
+        Inputs:
+            - name: the name of the span, eg. the pipeline stage
+            - args: additional values stored with the span
+        Outputs: The span dictionary, its timings are filled in when the block is left
+        Postconditions: The span is recorded even if the block raises
+        '''
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        if parent is None:
+            with self.lock:
+                self.local.trace_id = next(self.trace_ids)
+
+        record = {'name': name, 'trace_id': self.local.trace_id, 'depth': len(stack),
+                  'parent': parent['name'] if parent else None, 'thread': threading.get_ident(),
+                  'cache': Counter(), 'args': args}
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None and '_max_memory' in parent:
+                parent['_max_memory'] = max(parent['_max_memory'], peak)
+            tracemalloc.reset_peak()
+            record['_base_memory'] = record['_max_memory'] = current
+
+        stack.append(record)
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - start
+            record['cpu'] = time.thread_time() - cpu_start
+            record['start'] = start - self.origin
+            stack.pop()
+
+            if '_base_memory' in record:
+                record['_max_memory'] = max(record['_max_memory'], tracemalloc.get_traced_memory()[1])
+                record['peak_memory'] = record['_max_memory'] - record.pop('_base_memory')
+                if parent is not None and '_max_memory' in parent:
+                    parent['_max_memory'] = max(parent['_max_memory'], record['_max_memory'])
+                del record['_max_memory']
+            self.spans.append(record)
+
+    def record_cache(self, kind, hit):
+        '''Counts a cache hit or miss in the innermost open span of the thread'''
+        stack = self._stack()
+        if stack:
+            stack[-1]['cache'][f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+    def current_trace(self):
+        '''The finished spans of the trace the thread is currently in (or was in last)'''
+        trace_id = getattr(self.local, 'trace_id', None)
+        return [record for record in list(self.spans) if record['trace_id'] == trace_id]
+
+    def clear(self):
+        self.spans.clear()
+
+
+# -----------------------------------------------------------------------------
+_tracer = Tracer()
+
+
+def get_tracer():
+    '''The process wide tracer'''
+    return _tracer
+
+
+def configure_tracing(memory=False):
+    '''
+    Configures the process wide tracer
+    Inputs: memory - if True tracemalloc is started and the peak memory of every span is recorded
+    Outputs: The tracer
+    Postconditions: Tracing memory slows every allocation down, it is meant for profiling runs
+    '''
+    _tracer.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _tracer
+
+
+def span(name, **args):
+    '''Context manager recording a span with the process wide tracer'''
+    return _tracer.span(name, **args)
+
+
+def record_cache(kind, hit):
+    '''Counts a cache hit or miss in the current span of the process wide tracer'''
+    _tracer.record_cache(kind, hit)
+
+
+def traced(name=None):
+    '''
+    Records every call of the decorated function as a span
+    Input: name - the name of the span, defaults to the qualified function name
+    Output: A decorator
+    Postconditions: None
+    '''
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _tracer.span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# -----------------------------------------------------------------------------
+def spans_to_frame(spans):
+    '''
+    Tabulates spans
+    Inputs: spans - a list of span dictionaries
+    Outputs: A dataframe with one row per span, ordered by start time, times in milliseconds
+    Postconditions: None
+    '''
+    rows = [{
+        'span': '  ' * record['depth'] + record['name'],
+        'wall_ms': record['wall'] * 1000,
+        'cpu_ms': record['cpu'] * 1000,
+        'peak_kb': record['peak_memory'] / 1024 if 'peak_memory' in record else None,
+        'cache': ', '.join(f"{key}: {value}" for key, value in sorted(record['cache'].items())),
+        'start': record['start']
+    } for record in spans]
+    df = pd.DataFrame(rows, columns=['span', 'wall_ms', 'cpu_ms', 'peak_kb', 'cache', 'start'])
+    return df.sort_values('start', kind='stable').drop(columns='start').reset_index(drop=True)
+
+
+def to_chrome_trace(spans):
+    '''
+    Converts spans to the Chrome trace event format (chrome://tracing, Perfetto)
+    Inputs: spans - a list of span dictionaries
+    Outputs: A dictionary with the complete ('X') events in 'traceEvents'
+    Postconditions: None
+    '''
+    events = []
+    for record in spans:
+        args = {'cpu_ms': round(record['cpu'] * 1000, 3), **dict(record['cache']),
+                **{key: str(value) for key, value in record['args'].items()}}
+        if 'peak_memory' in record:
+            args['peak_memory_bytes'] = record['peak_memory']
+        events.append({
+            'name': record['name'], 'cat': 'pipeline', 'ph': 'X', 'pid': os.getpid(), 'tid': record['thread'],
+            'ts': round(record['start'] * 1e6, 3), 'dur': round(record['wall'] * 1e6, 3), 'args': args
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def export_trace(spans, path):
+    '''Writes spans as a Chrome trace json file'''
+    with open(path, 'w') as file:
+        json.dump(to_chrome_trace(spans), file)
@@ -0,0 +1,256 @@
+# Methods associated with serving the map layers as Mapbox Vector Tiles
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import shapely
+import pandas as pd
+import geopandas as gpd
+import mapbox_vector_tile
+from core.infrastructure.HelperTools import logger_decorator
+from core.infrastructure.PipelineCache import fingerprint
+from core.infrastructure.GeometryPyramid import geometry_for_zoom, apply_geometry_level
+
+
+# Half the circumference of the earth in web mercator metres
+MERCATOR_ORIGIN = 20037508.342789244
+
+# Resolution of a tile and the margin around it that is included to avoid seams, both in tile units
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+# Layers kept registered, the tiles of older layers are deleted from the disk cache
+MAX_SOURCES = 16
+
+TILE_PATH_PATTERN = re.compile(r"^/(?P<layer>[\w\-]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.pbf$")
+
+
+# -----------------------------------------------------------------------------
+def tile_bounds(z, x, y):
+    '''
+    Computes the web mercator bounds of a tile
+    Inputs: z, x, y - the tile coordinates in the XYZ scheme used by leaflet
+    Outputs: The bounds (minx, miny, maxx, maxy) in EPSG:3857
+    Postconditions: None
+    '''
+    size = 2 * MERCATOR_ORIGIN / 2 ** z
+    minx = -MERCATOR_ORIGIN + x * size
+    maxy = MERCATOR_ORIGIN - y * size
+    return (minx, maxy - size, minx + size, maxy)
+
+
+# -----------------------------------------------------------------------------
+class VectorTileSource:
+    '''
+    Cuts a geodataframe into vector tiles on request and caches every tile on disk
+    '''
+
+    def __init__(self, name, gdf, properties, cache_dir, levels=None):
+        '''
+        Inputs:
+            - name: the name of the layer inside the tiles
+            - gdf: a geodataframe in EPSG:4326
+            - properties: the columns of gdf that are written to the tile features
+            - cache_dir: the directory tiles of this source are stored in
+            - levels: optional dictionary mapping zoom levels to simplified geometries of the rows of gdf in EPSG:4326
+        Postconditions: The geometry and every level are projected to web mercator once and indexed by an STRtree
+        '''
+        self.name = name
+        self.cache_dir = cache_dir
+        crs = gdf.crs or "EPSG:4326"
+        self.levels = {None: self._index(gdf.geometry.values, crs)}
+        for zoom, geometries in (levels or {}).items():
+            self.levels[zoom] = self._index(geometries, crs)
+        self.properties = pd.DataFrame(gdf[list(properties)]).to_dict('records')
+        self.evicted = False
+
+    @staticmethod
+    def _index(geometries, crs):
+        '''Projects geometries to web mercator and returns them with their STRtree'''
+        projected = gpd.GeoSeries(geometries, crs=crs).to_crs("EPSG:3857").to_numpy()
+        return projected, shapely.STRtree(projected)
+
+    def tile_path(self, z, x, y):
+        '''The path of the cached tile file'''
+        return os.path.join(self.cache_dir, str(z), str(x), f"{y}.pbf")
+
+    def encode_tile(self, z, x, y):
+        '''
+        Encodes one tile
+        Inputs: z, x, y - the tile coordinates
+        Outputs: The tile as MVT protobuf bytes
+        Postconditions: None
+        '''
+        bounds = tile_bounds(z, x, y)
+        margin = (bounds[2] - bounds[0]) * TILE_BUFFER / TILE_EXTENT
+        clip_bounds = (bounds[0] - margin, bounds[1] - margin, bounds[2] + margin, bounds[3] + margin)
+
+        # The coarsest level that is still precise enough for the zoom of the tile. The levels are simplified as a
+        # coverage, simplifying the clipped polygons one by one again would move borders shared by two of them apart
+        geometries, tree = geometry_for_zoom(self.levels, z)
+        hits = tree.query(shapely.box(*clip_bounds), predicate='intersects')
+        clipped = shapely.clip_by_rect(geometries[hits], *clip_bounds)
+
+        features = [
+            {'geometry': geometry, 'properties': self.properties[hit]}
+            for hit, geometry in zip(hits, clipped) if not geometry.is_empty
+        ]
+        return mapbox_vector_tile.encode(
+            [{'name': self.name, 'features': features}],
+            default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT}
+        )
+
+    def get_tile(self, z, x, y):
+        '''
+        Returns a tile from the disk cache, encoding and storing it on a miss
+        Inputs: z, x, y - the tile coordinates
+        Outputs: The tile as MVT protobuf bytes
+        Postconditions: The tile exists in the disk cache, unless the source was evicted
+        '''
+        path = self.tile_path(z, x, y)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                return file.read()
+
+        tile = self.encode_tile(z, x, y)
+        if self.evicted:
+            return tile
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(tile)
+        os.replace(tmp_path, path)
+        return tile
+
+
+# -----------------------------------------------------------------------------
+class VectorTileServer:
+    '''
+    Local HTTP server answering /<layer>/<z>/<x>/<y>.pbf requests from the registered tile sources
+    '''
+
+    def __init__(self, cache_dir, host="localhost", port=8765, max_sources=MAX_SOURCES):
+        self.cache_dir = cache_dir
+        self.host = host
+        self.port = port
+        self.max_sources = max_sources
+        self.sources = OrderedDict()
+        self.lock = threading.Lock()
+        self.httpd = None
+        self.geometry_pyramid = None
+        self.pyramid_key = None
+
+    def set_geometry_pyramid(self, pyramid, key='PLZ'):
+        '''
+        Serves the polygons of a simplification pyramid at the zoom levels they were built for
+        Inputs:
+            - pyramid: a pyramid created by build_simplification_pyramid
+            - key: the column that links registered layers to the pyramid
+        Outputs: None
+        Postconditions: Layers registered afterwards whose geometry is the full resolution of the pyramid are tiled
+            from the level geometry_for_zoom picks for each tile, other layers (eg. hexagons) keep their geometry
+        '''
+        self.geometry_pyramid = pyramid
+        self.pyramid_key = key
+
+    def _pyramid_levels(self, gdf):
+        '''
+        Looks up the pyramid levels of a layer
+        Inputs: gdf - the geodataframe of the layer
+        Outputs: A dictionary mapping each zoom level to the simplified geometry of the rows of gdf,
+            None if the layer does not consist of full resolution polygons of the pyramid
+        Postconditions: None
+        '''
+        pyramid, key = self.geometry_pyramid, self.pyramid_key
+        if pyramid is None or key not in gdf.columns or len(gdf) == 0:
+            return None
+        full = pyramid[None].drop_duplicates(key)
+        geometries = gdf[key].map(pd.Series(full.geometry.values, index=full[key].values))
+        if geometries.isna().any() or not shapely.equals_exact(gdf.geometry.values, geometries.values, 0).all():
+            return None
+        return {zoom: apply_geometry_level(gdf, level, key).geometry.values
+                for zoom, level in pyramid.items() if zoom is not None}
+
+    @logger_decorator
+    def register(self, name, gdf, properties):
+        '''
+        Makes a geodataframe available as tile layer
+        Inputs:
+            - name: the name of the layer
+            - gdf: a geodataframe in EPSG:4326
+            - properties: the columns of gdf written to the tile features
+        Outputs: The id of the layer and the url template of its tiles.
+            The id contains the fingerprint of the properties, the geometry and the pyramid levels in use,
+            so changed data never hits stale tiles
+        Postconditions: The layer is served until max_sources newer layers were registered, then it is removed
+            together with its tiles on disk
+        '''
+        levels = self._pyramid_levels(gdf)
+        content = gdf[list(properties) + [gdf.geometry.name]]
+        layer_hash = fingerprint(content) if levels is None else fingerprint([content, sorted(levels)])
+        layer_id = f"{name}-{layer_hash[:12]}"
+        evicted = []
+        with self.lock:
+            if layer_id in self.sources:
+                self.sources.move_to_end(layer_id)
+            else:
+                self.sources[layer_id] = VectorTileSource(name, gdf, properties, os.path.join(self.cache_dir, layer_id),
+                                                          levels)
+            while len(self.sources) > self.max_sources:
+                evicted.append(self.sources.popitem(last=False)[1])
+        for source in evicted:
+            source.evicted = True
+            shutil.rmtree(source.cache_dir, ignore_errors=True)
+        return layer_id, f"http://{self.host}:{self.port}/{layer_id}/{{z}}/{{x}}/{{y}}.pbf"
+
+    def handle_request(self, path):
+        '''
+        Resolves a request path to a tile
+        Inputs: path - the requested url path
+        Outputs: The tile bytes, or None if the path does not name a registered layer
+        Postconditions: None
+        '''
+        match = TILE_PATH_PATTERN.match(path.split("?")[0])
+        source = None if match is None else self.sources.get(match.group('layer'))
+        if source is None:
+            return None
+        return source.get_tile(int(match.group('z')), int(match.group('x')), int(match.group('y')))
+
+    def start(self):
+        '''
+        Starts serving in a background thread
+        Inputs: None
+        Outputs: The server itself
+        Postconditions: The HTTP server listens on host:port
+        '''
+        server = self
+
+        class TileRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                tile = server.handle_request(self.path)
+                if tile is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.send_header("Content-Length", str(len(tile)))
+                self.end_headers()
+                self.wfile.write(tile)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((self.host, self.port), TileRequestHandler)
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        '''Stops the HTTP server'''
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
@@ -1,13 +1,36 @@
+import os
+import math
 import pandas as pd
 import geopandas as gpd
 import core.infrastructure.HelperTools as ht
 import folium
 import streamlit as st
-from streamlit_folium import folium_static
-from core.domain.suggestions_methods.SuggestionsMethods import \
-    initialize_suggestions_file, load_suggestions, SUGGESTIONS_FILE
+from core.domain.suggestions_methods.SuggestionsMethods import SUGGESTIONS_FILE
+from core.domain.suggestions_methods.SuggestionsStore import open_suggestions_store, SUGGESTIONS_DB
+from core.domain.suggestions_methods.PostalCodeIndex import get_postal_code_index, postal_code_strings
 from core.application.presentation.SuggestionsStreamlitMethods import submit_a_suggestion, view_suggestions, clear_suggestions
-from core.application.presentation.MapStreamlitMethods import create_residents_layer, create_demand_layer, create_charging_stations_layer
+from core.application.presentation.MapStreamlitMethods import create_residents_layer, create_demand_layer, create_charging_stations_layer, \
+    create_coverage_layer, create_suggestions_layer, select_new_stations, create_proposals_layer, select_aggregation, \
+    write_demand_formula_to_screen, select_demand_parameters, show_demand_scenarios, select_demand_model, write_demand_model_to_screen
+from core.application.presentation.MapArtifactCache import MapArtifactCache, map_artifact_key, render_map_html, show_map_html
+from core.domain.demand_methods.DemandMethods import DemandMethod
+from core.domain.demand_methods.DemandModels import DEFAULT_DEMAND_MODEL
+from core.infrastructure.GeometryPyramid import finest_level, apply_geometry_level
+from core.infrastructure.VectorTiles import VectorTileServer
+from core.infrastructure.Regions import get_region, filter_register_by_region, filter_residents_by_region, \
+    resident_bundesland_lookup, partition_regions, region_plz_range, REGION_GERMANY
+from core.infrastructure.RegisterIngestion import counts_with_geometry
+from core.infrastructure.SpatialJoin import to_numeric_coordinates
+from core.infrastructure.IncrementalUpdates import update_register_state, station_counts
+from core.infrastructure.PipelineCache import pipeline_stage
+from core.infrastructure.Tracing import traced
+from core.infrastructure.Placement import propose_stations
+from core.infrastructure.Crosswalk import district_rollup
+from core.domain.demand_methods.DemandModels import compute_demand
+
+# Zoom of the folium map if it can't be derived from the data
+MAP_ZOOM_START = 10
+
 
 # -----------------------------------------------------------------------
 @ht.logger_decorator
@@ -31,7 +54,9 @@ def sort_by_plz_add_geometry(df_register_input, df_geo_input, pdict):
     sorted_df2 = sorted_df.merge(df_geo_input, on=pdict["geocode"], how='left')
     sorted_df3 = sorted_df2.dropna(subset=['geometry'])
     
-    sorted_df3['geometry'] = gpd.GeoSeries.from_wkt(sorted_df3['geometry'])
+    # Geometry coming from the dataset cache is already parsed, only WKT strings need converting
+    if not isinstance(sorted_df3['geometry'].dtype, gpd.array.GeometryDtype):
+        sorted_df3['geometry'] = gpd.GeoSeries.from_wkt(sorted_df3['geometry'])
     ret = gpd.GeoDataFrame(sorted_df3, geometry='geometry')
     
     return ret
@@ -42,32 +67,28 @@ def sort_by_plz_add_geometry(df_register_input, df_geo_input, pdict):
 
 @ht.timer
 @ht.logger_decorator
-@st.cache_data
+@pipeline_stage('preprop_lstat')
 def preprop_lstat(dfr, dfg, paramdict):
     """
     Preprocesses DataFrame for Electric Charging Stations and Geographic Information
     Inputs: dfr - DataFrame with charging station data; dfg - DataFrame with geographic data; pdict - parameter dictionary
     Outputs: Processed and sorted DataFrame
-    Postconditions: DataFrame is filtered for Berlin, reformatted, and merged with geographic data
+    Postconditions: DataFrame is filtered for the configured region (Berlin by default), reformatted, and merged with geographic data
     """
 
     df_register_input = dfr.copy()
     df_geo_input = dfg.copy()
     
-    df_register_input = df_register_input.loc[:, ['Postleitzahl', 'Bundesland', 'Breitengrad', 'Längengrad', 'Nennleistung Ladeeinrichtung [kW]']]
+    # Flags of the coordinate based PLZ assignment are kept if it ran before
+    flag_columns = [column for column in ['PLZ_geo', 'PLZ_mismatch'] if column in df_register_input.columns]
+    df_register_input = df_register_input.loc[:, ['Postleitzahl', 'Bundesland', 'Breitengrad', 'Längengrad', 'Nennleistung Ladeeinrichtung [kW]'] + flag_columns]
     df_register_input.rename(columns={"Nennleistung Ladeeinrichtung [kW]": "KW", "Postleitzahl": "PLZ"}, inplace=True)
 
-    # Convert to string
-    df_register_input['Breitengrad'] = df_register_input['Breitengrad'].astype(str)
-    df_register_input['Längengrad'] = df_register_input['Längengrad'].astype(str)
+    # Coordinates of the dataset cache are floats already, only raw registers still have decimal commas
+    df_register_input['Breitengrad'] = to_numeric_coordinates(df_register_input['Breitengrad'])
+    df_register_input['Längengrad'] = to_numeric_coordinates(df_register_input['Längengrad'])
 
-    # Now replace the commas with periods
-    df_register_input['Breitengrad'] = df_register_input['Breitengrad'].str.replace(',', '.')
-    df_register_input['Längengrad'] = df_register_input['Längengrad'].str.replace(',', '.')
-
-    df_register_input = df_register_input[(df_register_input["Bundesland"] == 'Berlin') & 
-                      (df_register_input["PLZ"] > 10115) &  
-                      (df_register_input["PLZ"] < 14200)]
+    df_register_input = filter_register_by_region(df_register_input, get_region(paramdict), paramdict)
         
     return sort_by_plz_add_geometry(df_register_input, df_geo_input, paramdict)
 
@@ -77,18 +98,19 @@ def preprop_lstat(dfr, dfg, paramdict):
 
 @ht.timer
 @ht.logger_decorator
+@pipeline_stage('count_plz_occurrences')
 def count_plz_occurrences(df_charging_stations_preprocessed):
     """
     Counts Loading Stations Per Postal Code
     Inputs: df_lstat2 - DataFrame with charging station data and geometry
-    Outputs: DataFrame with counts and first geometry per postal code
-    Postconditions: DataFrame is grouped by postal code with counts and geometry aggregated
+    Outputs: DataFrame with counts and first geometry per postal code, plus the summed power (KW) if the stations have a KW column
+    Postconditions: DataFrame is grouped by postal code with counts, geometry and power aggregated in a single pass
     """
 
-    df_charging_stations_counts = df_charging_stations_preprocessed.groupby('PLZ').agg(
-        Number=('PLZ', 'count'),
-        geometry=('geometry', 'first')
-    ).reset_index()
+    aggregations = {'Number': ('PLZ', 'count'), 'geometry': ('geometry', 'first')}
+    if 'KW' in df_charging_stations_preprocessed.columns:
+        aggregations['KW'] = ('KW', 'sum')
+    df_charging_stations_counts = df_charging_stations_preprocessed.groupby('PLZ').agg(**aggregations).reset_index()
     
     return df_charging_stations_counts
 
@@ -98,19 +120,20 @@ def count_plz_occurrences(df_charging_stations_preprocessed):
 
 @ht.timer
 @ht.logger_decorator
-@st.cache_data
+@pipeline_stage('preprop_resid')
 def preprop_resid(dfr, dfg, paramdict):
     """
     Preprocesses DataFrame for Residents and Geographic Information
     Inputs: dfr - DataFrame with postal codes, population, and coordinates; dfg - DataFrame with geographic data; paramdict - parameter dictionary
     Outputs: Processed and sorted DataFrame
-    Postconditions: DataFrame is filtered, reformatted, and merged with geographic data
+    Postconditions: DataFrame is filtered, reformatted, and merged with geographic data, the area (qkm) is kept if the table has it
     """
 
     df_register_input = dfr.copy()
     df_geo_input = dfg.copy()    
     
-    df_register_input = df_register_input.loc[:, ['plz', 'einwohner', 'lat', 'lon']]
+    area_columns = [column for column in ['qkm'] if column in df_register_input.columns]
+    df_register_input = df_register_input.loc[:, ['plz', 'einwohner', 'lat', 'lon'] + area_columns]
     df_register_input.rename(columns={"plz": "PLZ", "einwohner": "Einwohner", "lat": "Breitengrad", "lon": "Längengrad"}, inplace=True)
 
     # Convert to string
@@ -121,45 +144,221 @@ def preprop_resid(dfr, dfg, paramdict):
     df_register_input['Breitengrad'] = df_register_input['Breitengrad'].str.replace(',', '.')
     df_register_input['Längengrad'] = df_register_input['Längengrad'].str.replace(',', '.')
 
-    df_register_input = df_register_input[ 
-                      (df_register_input["PLZ"] > 10000) &  
-                      (df_register_input["PLZ"] < 14200)]
+    df_register_input = filter_residents_by_region(df_register_input, get_region(paramdict), paramdict)
         
     return sort_by_plz_add_geometry(df_register_input, df_geo_input, paramdict)
 
 
 # -----------------------------------------------------------------------------
 
+@ht.timer
+@ht.logger_decorator
+@pipeline_stage('process_regions')
+def process_regions(df_lstat, df_residents, df_geo, paramdict):
+    """
+    Runs the preprocessing for the configured region, one Bundesland partition at a time
+    Inputs:
+        - df_lstat: the charging station register
+        - df_residents: the residents table
+        - df_geo: geodataframe with the PLZ polygons of the region
+        - paramdict: parameter dictionary, 'region' is a Bundesland or 'Deutschland'
+    Outputs: The charging station counts per PLZ and the preprocessed residents, both as geodataframes
+    Postconditions: Only the station level data of one partition is processed at a time. Residents of a PLZ without
+        stations belong to the Bundesland of the closest station, residents without coordinates are only kept for Germany.
+        The result is cached by the pipeline cache, which also persists it for other processes
+    """
+    region = get_region(paramdict)
+    plz_lookup = None if region == 'Berlin' else resident_bundesland_lookup(df_lstat, df_residents)
+
+    counts, residents = [], []
+    for partition in partition_regions(region):
+        partition_dict = dict(paramdict, region=partition)
+        df_lstat_partition = df_lstat[df_lstat['Bundesland'] == partition]
+        df_residents_partition = df_residents
+        if plz_lookup is not None and region_plz_range(partition, 'resid', paramdict) is None:
+            df_residents_partition = df_residents[df_residents['plz'].isin(plz_lookup.index[plz_lookup == partition])]
+        if df_lstat_partition.empty and df_residents_partition.empty:
+            continue
+
+        gdf_counts = gpd.GeoDataFrame(count_plz_occurrences(preprop_lstat(df_lstat_partition, df_geo, partition_dict)), geometry='geometry')
+        gdf_residents = preprop_resid(df_residents_partition, df_geo, partition_dict)
+        counts.append(gdf_counts)
+        residents.append(gdf_residents)
+
+    gdf_counts = gpd.GeoDataFrame(pd.concat(counts, ignore_index=True), geometry='geometry')
+    gdf_residents = gpd.GeoDataFrame(pd.concat(residents, ignore_index=True), geometry='geometry')
+    gdf_residents = gdf_residents.drop_duplicates(subset='PLZ')
+
+    # Residents that couldn't be located belong to no Bundesland partition
+    if region == REGION_GERMANY:
+        df_rest = df_residents[~df_residents['plz'].isin(gdf_residents['PLZ'])]
+        gdf_rest = preprop_resid(df_rest, df_geo, dict(paramdict, region=REGION_GERMANY))
+        gdf_residents = gpd.GeoDataFrame(pd.concat([gdf_residents, gdf_rest], ignore_index=True), geometry='geometry')
+
+    return gdf_counts.sort_values('PLZ', ignore_index=True), gdf_residents.sort_values('PLZ', ignore_index=True)
+
+
+@ht.timer
 @ht.logger_decorator
+@pipeline_stage('process_regions_incremental')
+def process_regions_incremental(df_lstat, df_residents, df_geo, paramdict, cache_dir):
+    """
+    Updates the charging station counts of the configured region from the last ingested register
+    Inputs:
+        - df_lstat: the charging station register
+        - df_residents: the residents table
+        - df_geo: geodataframe with the PLZ polygons of the region
+        - paramdict: parameter dictionary, 'region' is a Bundesland or 'Deutschland'
+        - cache_dir: directory the per PLZ state of every region is persisted in
+    Outputs: The charging station counts per PLZ and the preprocessed residents, both as geodataframes
+    Postconditions: Counts and demand are only recomputed for the PLZ whose stations or residents changed. As a
+        pipeline stage it only runs when the inputs changed, reruns with the same register don't diff it again
+    """
+    region = get_region(paramdict)
+    df_region = filter_register_by_region(df_lstat.rename(columns={'Postleitzahl': 'PLZ'}), region, paramdict)
+    df_region = df_lstat.loc[df_region.index]
+
+    if region != REGION_GERMANY and region_plz_range(region, 'resid', paramdict) is None:
+        plz_lookup = resident_bundesland_lookup(df_lstat, df_residents)
+        df_residents = df_residents[df_residents['plz'].isin(plz_lookup.index[plz_lookup == region])]
+    gdf_residents = preprop_resid(df_residents, df_geo, paramdict)
+
+    result = update_register_state(df_region, gdf_residents[['PLZ', 'Einwohner']], os.path.join(cache_dir, 'incremental', region))
+    gdf_counts = counts_with_geometry(station_counts(result['state']), df_geo, paramdict)
+    return gdf_counts, gdf_residents.sort_values('PLZ', ignore_index=True)
+
+
+# -----------------------------------------------------------------------------
+
+def map_view_for_bounds(bounds, width=800, height=600):
+    '''
+    Computes the center and zoom level that fit the given bounds into the map
+    Inputs:
+        - bounds: (minx, miny, maxx, maxy) in degrees
+        - width, height: the size of the map in pixels
+    Outputs: The location [lat, lon] of the center and the zoom level
+    Postconditions: None
+    '''
+    minx, miny, maxx, maxy = bounds
+    center_lat = (miny + maxy) / 2
+    span_x = max(maxx - minx, 1e-6)
+    span_y = max((maxy - miny) / math.cos(math.radians(center_lat)), 1e-6)
+    zoom = int(math.floor(min(math.log2(width * 360 / (256 * span_x)), math.log2(height * 360 / (256 * span_y)))))
+    return [center_lat, (minx + maxx) / 2], max(1, min(zoom, 18))
+
+
+# -----------------------------------------------------------------------------
+
+@ht.timer
+@ht.logger_decorator
+@pipeline_stage('merge_geo_dataframes')
 def merge_geo_dataframes(df_charging_stations, df_population):
     '''
     Merges the charging stations and population dataframes and fills NA's with 0
     Inputs:
         - df_charging_stations: A geodataframe sorted by PLZ and containing information about the charging stations
         - df_population: A geodataframe sorted by PLZ and containing information about the population
-    Outputs: A merged geodataframe
+    Outputs: A merged geodataframe, with the summed power (KW) if the charging stations have it
+    Postconditions: The inputs are not modified
     '''
 
     # Merge resident and charging station data
-    df_charging_stations['PLZ'] = df_charging_stations['PLZ'].astype(int)
-    df_charging_stations = df_charging_stations.iloc[:, 0:2]
+    station_columns = ['Number'] + [column for column in ['KW'] if column in df_charging_stations.columns]
+    df_charging_stations = df_charging_stations.loc[:, ['PLZ'] + station_columns].astype({'PLZ': int})
     df_merged = df_population.merge(df_charging_stations, on='PLZ', how='left')
 
     # Fill NaN values with 0
-    df_merged['Number'] = df_merged['Number'].fillna(0)
+    df_merged[station_columns] = df_merged[station_columns].fillna(0)
     
     return df_merged
 
 # -------------------------------------------------------------------------
 
+@st.cache_resource
+def get_map_artifact_cache(max_entries):
+    '''
+    Creates the cache of rendered map layers once per process, so all sessions share it
+    Inputs: max_entries - number of rendered layers kept
+    Outputs: The MapArtifactCache
+    Postconditions: None
+    '''
+    return MapArtifactCache(max_entries)
+
+
+@traced('layer_build')
+def render_layer(layer_selection, df_population, df_merged, map_location, map_zoom, tile_server=None, demander=None,
+                 demand_model=DEFAULT_DEMAND_MODEL, df_proposals=None):
+    '''
+    Builds the folium map of one layer and renders it to html
+    Inputs:
+        - layer_selection: "Residents", "Charging Stations", "Demand", "Coverage" or "Suggestions"
+        - df_population: the population geodataframe, with the coverage distances for the Coverage layer and the
+            suggestion counts for the Suggestions layer
+        - df_merged: the merged population and charging station geodataframe
+        - map_location, map_zoom: the initial view of the map
+        - tile_server: optional running VectorTileServer
+        - demander: optional DemandMethod with the parameters of the Demand layer
+        - demand_model: name of the model the Demand layer is computed with
+        - df_proposals: optional proposed new charging stations, drawn on top of the Demand layer
+    Outputs: The html of the map
+    Postconditions: Nothing is written to the screen
+    '''
+    folium_map = folium.Map(location=map_location, zoom_start=map_zoom)
+
+    if layer_selection == "Residents":
+        color_map, folium_map = create_residents_layer(df_population, folium_map, tile_server)
+    elif layer_selection == "Coverage":
+        color_map, folium_map = create_coverage_layer(df_population, folium_map, tile_server)
+    elif layer_selection == "Suggestions":
+        color_map, folium_map = create_suggestions_layer(df_population, folium_map, tile_server)
+    elif layer_selection == "Demand":
+        color_map, folium_map = create_demand_layer(df_merged, folium_map, tile_server, write_formula=False, demander=demander,
+                                                   demand_model=demand_model)
+        if df_proposals is not None and not df_proposals.empty:
+            folium_map = create_proposals_layer(df_proposals, folium_map)
+    else:  # Must be Charging Stations
+        color_map, folium_map = create_charging_stations_layer(df_merged, folium_map, tile_server)
+
+    # Add color map to the map
+    color_map.add_to(folium_map)
+    return render_map_html(folium_map)
+
+
+# -------------------------------------------------------------------------
+
+@st.cache_resource
+def get_tile_server(cache_dir, port):
+    '''
+    Starts the local vector tile server once per process
+    Inputs:
+        - cache_dir: the directory the tiles are cached in
+        - port: the port the server listens on
+    Outputs: The running VectorTileServer, shared by all sessions
+    Postconditions: The tile server runs in a background thread
+    '''
+    return VectorTileServer(cache_dir, port=port).start()
+
+
+# -------------------------------------------------------------------------
+
 @ht.timer
 @ht.logger_decorator
-def make_streamlit_electric_Charging_resid(df_charging_stations, df_population, suggestions_file = SUGGESTIONS_FILE):
+def make_streamlit_electric_Charging_resid(df_charging_stations, df_population, suggestions_file = SUGGESTIONS_FILE, geometry_pyramid = None, tile_server = None,
+                                           map_cache = None, df_coverage = None, hex_hierarchy = None, districts = None,
+                                           suggestions_db = SUGGESTIONS_DB):
     """
     Makes Streamlit App with Heatmap of Electric Charging Stations and Residents
     Inputs: 
         - df_charging_stations: A geodataframe sorted by PLZ and containing information about the charging stations
         - df_population: A geodataframe sorted by PLZ and containing information about the population
+        - geometry_pyramid: optional simplification pyramid of the PLZ polygons, the tile server cuts each tile from
+          the level of its zoom, without tile server the finest level is rendered so borders stay precise when zooming in
+        - tile_server: optional running VectorTileServer, if given the layers are loaded as vector tiles
+        - map_cache: optional MapArtifactCache, layers rendered before are then looked up instead of rebuilt
+        - df_coverage: optional distances of each PLZ to the nearest charging stations, adds the Coverage layer
+        - hex_hierarchy: optional hexagon levels of build_hex_hierarchy, the map can then be aggregated on hexagons
+        - districts: optional (Crosswalk, district polygons) tuple, the map can then be aggregated on the districts
+        - suggestions_db: the SQLite database of the suggestions, suggestions_file is imported into a new database
     Outputs: None
     Postconditions: Streamlit app is built and deployed
     """
@@ -167,36 +366,84 @@ def make_streamlit_electric_Charging_resid(df_charging_stations, df_population,
     # Process data
     df_charging_stations_copy = df_charging_stations.copy()
     df_population_copy = df_population.copy()
+    map_location, map_zoom = [52.52, 13.40], MAP_ZOOM_START
+    if not df_population_copy.empty:
+        map_location, map_zoom = map_view_for_bounds(gpd.GeoSeries(df_population_copy['geometry']).total_bounds)
+    # Tiles are cut from the pyramid level of their zoom, a folium GeoJson layer has to hold up when zoomed in
+    if geometry_pyramid is not None and tile_server is not None:
+        tile_server.set_geometry_pyramid(geometry_pyramid)
+    elif geometry_pyramid is not None:
+        df_population_copy = apply_geometry_level(df_population_copy, finest_level(geometry_pyramid))
     df_merged = merge_geo_dataframes(df_charging_stations_copy, df_population_copy)
 
     # Streamlit app
     st.title('Heatmaps: Electric Charging Stations and Residents')
+
+    # Hexagon or district aggregation, the hexagon levels and the district crosswalk are precomputed
+    aggregation = None
+    if hex_hierarchy is not None or districts is not None:
+        # The PLZ polygons are preselected, so the Coverage and Suggestions layers are available on the first load
+        aggregation = select_aggregation(hex_hierarchy, districts is not None)
+    if aggregation == 'Bezirke':
+        df_merged = district_rollup(districts[0], df_merged, districts[1])
+        df_population_copy = df_merged.copy()
+    elif aggregation is not None:
+        df_population_copy = hex_hierarchy[aggregation].copy()
+        df_merged = hex_hierarchy[aggregation].copy()
     
     # --------------------------------------------------------------------
     # Map Section
     # --------------------------------------------------------------------
 
 
-    # Create a radio button for layer selection
-    layer_selection = st.radio("Select Layer", ("Residents", "Charging Stations", "Demand"))
-    # Create a Folium map
-    folium_map = folium.Map(location=[52.52, 13.40], zoom_start=10)
-
-    if layer_selection == "Residents":
-        
-        color_map, folium_map = create_residents_layer(df_population_copy, folium_map)
-
-    elif layer_selection == "Demand":
+    # Open the suggestions store shared by all sessions (creates the database if it doesn't yet exist)
+    store = open_suggestions_store(suggestions_db, legacy_file=suggestions_file)
 
-        color_map, folium_map = create_demand_layer(df_merged, folium_map)
-    
-    else:  # Must be Charging Stations
-        
-        color_map, folium_map = create_charging_stations_layer(df_merged, folium_map)
-        
-    # Add color map to the map
-    color_map.add_to(folium_map)
-    folium_static(folium_map, width=800, height=600)
+    # Create a radio button for layer selection
+    layers = ("Residents", "Charging Stations", "Demand") + (() if df_coverage is None or aggregation is not None else ("Coverage",)) \
+        + (() if aggregation is not None else ("Suggestions",))
+    layer_selection = st.radio("Select Layer", layers)
+    if layer_selection == "Coverage":
+        df_population_copy = df_population_copy.merge(df_coverage[['PLZ', 'Nearest', 'Distance']], on='PLZ', how='left')
+    if layer_selection == "Suggestions":
+        # The counts per PLZ are materialized in the store, so this doesn't depend on the number of suggestions
+        counts = store.plz_counts().set_index('PLZ')['Suggestions']
+        df_population_copy['Suggestions'] = postal_code_strings(df_population_copy['PLZ']).map(counts).fillna(0).astype(int)
+    demander, demand_model, new_stations, df_proposals = DemandMethod(), DEFAULT_DEMAND_MODEL, 0, None
+    if layer_selection == "Demand":
+        demand_model = select_demand_model()
+        demander = select_demand_parameters()
+        new_stations = select_new_stations() if aggregation != 'Bezirke' else 0
+    if new_stations > 0:
+        df_proposals = propose_stations(df_merged, compute_demand(demand_model, df_merged, demander), new_stations)
+
+    def render():
+        return render_layer(layer_selection, df_population_copy, df_merged, map_location, map_zoom, tile_server, demander,
+                            demand_model, df_proposals)
+
+    if map_cache is None:
+        map_html = render()
+    else:
+        layer_frame = df_population_copy if layer_selection in ("Residents", "Coverage", "Suggestions") else df_merged
+        key = map_artifact_key(layer_selection, layer_frame, location=map_location, zoom=map_zoom,
+                               tile_server=None if tile_server is None else tile_server.port,
+                               ev_per_resident=demander.ev_per_resident,
+                               ev_per_charging_station=demander.ev_per_charging_station, demand_model=demand_model,
+                               new_stations=new_stations)
+        map_html = map_cache.get_or_render(key, render)
+        stats = map_cache.stats()
+        st.sidebar.caption(f"Map cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} layers cached")
+
+    if layer_selection == "Demand":
+        write_demand_formula_to_screen(demander.latex_formula, demander.latex_variables)
+        write_demand_model_to_screen(demand_model)
+    show_map_html(map_html, width=800, height=600)
+    if df_proposals is not None:
+        st.text(f"Proposed new charging stations ({df_proposals['Served'].max() if len(df_proposals) else 0} "
+                f"missing charging stations served)")
+        st.dataframe(df_proposals, hide_index=True)
+    if layer_selection == "Demand":
+        show_demand_scenarios(df_merged, demander)
     
 
     
@@ -204,29 +451,23 @@ def make_streamlit_electric_Charging_resid(df_charging_stations, df_population,
     # Suggestions section - Continue debugging after interim submission feedback
     # ---------------------------------------------------------------------------------------------------------------------
 
-    VALID_POSTAL_CODES = df_charging_stations_copy['PLZ'].astype(str).tolist()
+    # Built once per dataset version and shared by all sessions
+    VALID_POSTAL_CODES = get_postal_code_index(df_charging_stations)
     
     
-    # Call the init file method (creates the file if it doesn't yet exist)
-    initialize_suggestions_file(suggestions_file)
-    
-    # Load suggestions into memory
-    if "suggestions" not in st.session_state:
-        st.session_state["suggestions"] = load_suggestions(suggestions_file)
-
     # Sidebar menu
     option = st.sidebar.radio("Choose an option:", ["Submit a Suggestion", "View Suggestions", "Clear Suggestions"])
 
     if option == "Submit a Suggestion":
         
-        submit_a_suggestion(VALID_POSTAL_CODES)
+        submit_a_suggestion(VALID_POSTAL_CODES, store)
 
     elif option == "View Suggestions":
         
-        view_suggestions()
+        view_suggestions(store)
     
     elif option == "Clear Suggestions":
 
-        clear_suggestions()
+        clear_suggestions(store)
         st.sidebar.empty()
         
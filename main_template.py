@@ -6,6 +6,16 @@ import os
 import logging
 import pandas                        as pd
 import core.infrastructure.methods as m1
+from core.infrastructure import DatasetCache        as dc
+from core.infrastructure import GeometryPyramid     as gp
+from core.infrastructure import SpatialJoin         as sj
+from core.infrastructure import PipelineCache       as pc
+from core.infrastructure import AsyncLogging        as al
+from core.infrastructure import Tracing             as tr
+from core.infrastructure import Coverage            as cv
+from core.infrastructure import HexGrid             as hg
+from core.infrastructure import Crosswalk           as cw
+from core.application.presentation.PerformanceStreamlitMethods import show_performance_panel
 from core.infrastructure import HelperTools         as ht
 from config                          import pdict
 
@@ -24,28 +34,61 @@ def main():
     Outputs: None
     Postconditions: Data is read in, processed, and the streamlit app is generated, logging is applied to various functions
     """
-    # Setup logging
-    logging.basicConfig(
+    # Setup logging, the log file is written by a background thread
+    al.setup_async_logging(
+        filename='/mount/src/berlinevchargingstationvisualizer/datasets/app.log',
         level=logging.INFO, 
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        filename='/mount/src/berlinevchargingstationvisualizer/datasets/app.log'
+        log_format='%(asctime)s - %(levelname)s - %(message)s'
     )
+    al.configure_call_logging(pdict['log_sample_rate'], pdict['log_max_chars'])
+    tr.configure_tracing(memory=pdict['trace_memory'])
 
-    # Load in the respective datasets
-    df_geodat_plz   = pd.read_csv(os.path.join(os.getcwd(), 'datasets', 'geodata_berlin_plz.csv'), delimiter=';')  #
+    # Load in the respective datasets from the columnar cache (rebuilt automatically when a csv changes)
+    cache_dir       = os.path.join(os.getcwd(), 'datasets', pdict['cachefolder'])
+    pc.configure_pipeline_cache(os.path.join(cache_dir, 'pipeline'), pdict)
+    datasets        = dc.load_dataset_cache(os.path.join(os.getcwd(), 'datasets'), cache_dir, pdict)
+    df_geodat_plz   = datasets['geodat_plz']
+    plz_pyramid     = gp.load_or_build_pyramid(df_geodat_plz, cache_dir, 'geodat_plz')
     
-    df_lstat        = pd.read_csv(os.path.join(os.getcwd(), 'datasets', 'Ladesaeulenregister.csv'), delimiter=';')
-    df_lstat2       = m1.preprop_lstat(df_lstat, df_geodat_plz, pdict)
-    gdf_lstat3      = m1.count_plz_occurrences(df_lstat2)
-    
-    df_residents    = pd.read_csv(os.path.join(os.getcwd(), 'datasets', 'plz_einwohner.csv'), delimiter=',')  #
+    df_lstat        = sj.assign_stations_to_plz(datasets['lstat'], df_geodat_plz, pdict)
+    df_residents    = datasets['residents']
+
+    # Preprocessing per Bundesland partition of the configured region, the result is cached by the pipeline cache.
+    # In incremental mode only the PLZ that changed since the last ingested register are recomputed
+    if pdict['incremental_updates']:
+        gdf_lstat3, gdf_residents2 = m1.process_regions_incremental(df_lstat, df_residents, df_geodat_plz, pdict, cache_dir)
+    else:
+        gdf_lstat3, gdf_residents2 = m1.process_regions(df_lstat, df_residents, df_geodat_plz, pdict)
+
+    # Distance of the residents of each PLZ to their nearest charging stations, shown as the Coverage layer
+    df_coverage     = cv.plz_coverage(gdf_residents2, df_lstat, pdict['coverage_k'], pdict['coverage_grid_km']) \
+                      if pdict['coverage_layer'] else None
+
+    # Hexagon levels the map can be aggregated on instead of the PLZ polygons
+    hex_hierarchy   = hg.build_hex_hierarchy(gdf_residents2, df_lstat, pdict['hex_sizes_km']) \
+                      if pdict['hex_grid'] else None
 
-    gdf_residents2  = m1.preprop_resid(df_residents, df_geodat_plz, pdict)
+    # Area weights of the PLZ in the Berlin districts, the map can then be rolled up to the districts
+    districts       = (cw.build_crosswalk(df_geodat_plz, datasets['geodat_dis']), datasets['geodat_dis']) \
+                      if pdict['districts'] else None
     
     
     
+    # Optional local vector tile server, started once per process
+    tile_server     = m1.get_tile_server(os.path.join(cache_dir, pdict['tilefolder']), pdict['tile_server_port']) \
+                      if pdict['tile_server'] else None
+    
+    # Rendered map layers, shared by all sessions of the process
+    map_cache       = m1.get_map_artifact_cache(pdict['map_cache_entries'])
+    
     # Run the app creator
-    m1.make_streamlit_electric_Charging_resid(gdf_lstat3, gdf_residents2)
+    m1.make_streamlit_electric_Charging_resid(gdf_lstat3, gdf_residents2, geometry_pyramid=plz_pyramid, tile_server=tile_server,
+                                              map_cache=map_cache, df_coverage=df_coverage,
+                                              hex_hierarchy=hex_hierarchy, districts=districts)
+    
+    # Optional sidebar panel with the spans of this run
+    if pdict['performance_panel']:
+        show_performance_panel(tr.get_tracer())
     
 # -----------------------------------------------------------------------------------------------------------------------
 